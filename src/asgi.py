@@ -0,0 +1,93 @@
+"""ASGI serving mode: the same HTTP contract as app.py, served on the worker's own event loop.
+
+Each worker process runs one event loop for its whole lifetime. The shared services are built by
+the lifespan startup hook and closed by the shutdown hook, so the pooled async clients (Cosmos, OpenAI)
+and every in-process cache live on the loop that serves the requests. Run from the src folder:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8000 --workers 4
+"""
+
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+from config import AppConfig
+from services.app_services import AppServices
+from services.utterance_service import InvalidSpeakerError, normalize_speaker
+from setup_logging import set_up_telemetry
+from sse import SSE_HEADERS, format_sse_event
+
+config = AppConfig()
+set_up_telemetry(config)
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    services = AppServices(config)
+    await services.astartup()
+    app.state.services = services
+    try:
+        yield
+    finally:
+        await services.ashutdown()
+
+
+async def health_check(request: Request):
+    return PlainTextResponse("OK")
+
+
+async def stats(request: Request):
+    return JSONResponse(request.app.state.services.stats())
+
+
+async def receive_event_v2(request: Request):
+    body = await request.json()
+    try:
+        content = await request.app.state.services.utterance_service.aprocess_utterance(
+            body["callAgent"], body["callId"], body["speaker"], body["utterance"]
+        )
+    except InvalidSpeakerError as e:
+        return PlainTextResponse(str(e), status_code=400)
+    return PlainTextResponse(content)
+
+
+async def receive_event_batch(request: Request):
+    events = await request.json()
+    if not isinstance(events, list):
+        return PlainTextResponse("Expected a JSON array of utterance events", status_code=400)
+    if len(events) > config.utterance_batch_max_events:
+        return PlainTextResponse(f"At most {config.utterance_batch_max_events} events per batch", status_code=413)
+    return JSONResponse(await request.app.state.services.utterance_service.aprocess_batch(events))
+
+
+async def receive_event_stream(request: Request):
+    body = await request.json()
+    try:
+        speaker = normalize_speaker(body["speaker"])
+    except InvalidSpeakerError as e:
+        return PlainTextResponse(str(e), status_code=400)
+    stream = request.app.state.services.utterance_service.astream_utterance(
+        body["callAgent"], body["callId"], speaker, body["utterance"]
+    )
+
+    async def events():
+        try:
+            async for event in stream:
+                yield format_sse_event(event)
+        except Exception as e:
+            yield format_sse_event({"type": "error", "error": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+app = Starlette(
+    routes=[
+        Route("/", health_check, methods=["GET"]),
+        Route("/stats", stats, methods=["GET"]),
+        Route("/utterance", receive_event_v2, methods=["POST"]),
+        Route("/utterances", receive_event_batch, methods=["POST"]),
+        Route("/utterance/stream", receive_event_stream, methods=["POST"]),
+    ],
+    lifespan=lifespan,
+)
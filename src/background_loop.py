@@ -0,0 +1,40 @@
+import asyncio
+import threading
+
+
+class BackgroundEventLoop:
+    """A single long-lived event loop running on a daemon thread.
+
+    Flask runs ``async def`` views on a brand new event loop per request, which means async clients
+    (aiohttp sessions, httpx pools) cannot be reused across requests. Synchronous views instead hand
+    their coroutines to this loop so the shared clients always live on the same loop.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="background-event-loop", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro, timeout: float = None):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def iterate(self, agen):
+        """Drive an async generator on the loop from synchronous code, e.g. a streaming Flask response."""
+        try:
+            while True:
+                try:
+                    yield self.run(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            # runs when the client disconnects too, so the generator's own cleanup always happens
+            self.run(agen.aclose())
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
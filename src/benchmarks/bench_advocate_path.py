@@ -0,0 +1,80 @@
+"""Latency and RU cost of persisting an advocate utterance, against the configured Cosmos container.
+
+Compares the previous advocate path, which read (and decoded) the call's whole history and then
+dropped the message, with the append-only write used now. A synthetic call of ``--messages``
+messages is written first under a throwaway callId and deleted at the end.
+
+Run from the src folder:
+
+    python -m benchmarks.bench_advocate_path --messages 200 --iterations 50
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+from benchmarks.bench_chat_history_codec import synthetic_transcript
+from benchmarks.bench_serving_modes import percentile
+from config import AppConfig
+from services.chat_history_codec import to_chat_history
+from services.chat_history_cosmos_service import ChatHistoryCosmosService
+
+
+async def atime(func, iterations: int) -> list[float]:
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def abench(args, config: AppConfig):
+    service = ChatHistoryCosmosService(
+        endpoint=config.db_endpoint,
+        db_name=config.db_name,
+        container_name=config.db_container,
+        key=config.db_key,
+        partition_key_path=config.db_partition_key_path,
+        history_mode=config.db_history_mode,
+        codec_version=config.db_history_codec_version,
+        compress_threshold=config.db_history_compress_threshold,
+    )
+    call_agent, call_id = "bench-advocate", f"bench-{uuid.uuid4()}"
+    container = await service.aget_container()
+    try:
+        await service.asave_chat_history(call_agent, call_id, to_chat_history(synthetic_transcript(args.messages)))
+        message = ChatMessageContent(role=AuthorRole.ASSISTANT, content="Let me pull up your plan details, one moment.")
+
+        rows = [
+            ("read full history (previous)", "read_chat_history" if config.db_history_mode != "turns" else "read_chat_turns",
+             lambda: service.aread_chat_history(call_agent, call_id)),
+            ("append message (current)", "append_chat_message", lambda: service.aappend_message(call_agent, call_id, message)),
+        ]
+        print(f"{args.messages} message history, {args.iterations} iterations, {config.db_history_mode} mode")
+        print(f"{'path':<30} {'p50 ms':>8} {'p95 ms':>8} {'avg RU':>8}")
+        for label, operation, func in rows:
+            service.operation_stats.pop(operation, None)
+            latencies = await atime(func, args.iterations)
+            stats = service.operation_stats.get(operation, {"count": 1, "request_charge": 0.0})
+            print(f"{label:<30} {percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f} {stats['request_charge'] / stats['count']:>8.2f}")
+    finally:
+        partition_key = service.partition_key(call_agent, call_id)
+        query = "SELECT c.id FROM c WHERE c.id = @id OR c.callId = @id"
+        async for item in container.query_items(query=query, parameters=[{"name": "@id", "value": call_id}], partition_key=partition_key):
+            await container.delete_item(item["id"], partition_key=partition_key)
+        await service.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="advocate path latency benchmark")
+    parser.add_argument("--messages", type=int, default=200, help="size of the synthetic call history")
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(abench(args, AppConfig()))
+
+
+if __name__ == "__main__":
+    main()
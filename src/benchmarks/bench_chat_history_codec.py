@@ -0,0 +1,131 @@
+"""Micro-benchmark of the chat history codec over synthetic transcripts.
+
+Compares the previous rebuild loop (which scanned every tool call for each tool result) with the
+codec's single-pass decode, and the stored size of the version 1 and version 2 formats.
+
+Run from the src folder:
+
+    python -m benchmarks.bench_chat_history_codec
+"""
+
+import argparse
+import json
+import timeit
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.function_call_content import FunctionCallContent
+from semantic_kernel.contents.function_result_content import FunctionResultContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+from services.chat_history_codec import decode_messages, encode_messages, to_chat_history
+from services.utterance_service import SYSTEM_MESSAGE
+
+
+def synthetic_transcript(message_count: int) -> list[dict]:
+    """System prompt followed by repeating advocate / customer / tool-call / tool-result / answer turns."""
+    messages = [{"role": "system", "content": SYSTEM_MESSAGE}]
+    turn = 0
+    while len(messages) < message_count:
+        call_ids = [f"call_{turn}_{i}" for i in range(2)]
+        tool_result = str(
+            {
+                "intent": "Plan",
+                "aisearch_data": f" in AI Search service with query question {turn} " + "lorem ipsum " * 40,
+                "benefitsearch_data": f" in Benefits Search service with query: question {turn} " + "dolor sit " * 60,
+            }
+        )
+        messages.append({"role": "assistant", "content": f"Advocate utterance {turn}, how can I help?"})
+        messages.append({"role": "user", "content": f"I have a question number {turn} about my copay and deductible."})
+        messages.append(
+            {
+                "role": "assistant",
+                "tool_calls": [
+                    {
+                        "id": call_id,
+                        "type": "function",
+                        "function": {
+                            "name": "KnowledgePlugin-retrieve_benefits_response",
+                            "arguments": json.dumps({"user_query": f"question {turn}"}),
+                        },
+                    }
+                    for call_id in call_ids
+                ],
+            }
+        )
+        messages.extend({"role": "tool", "content": tool_result, "tool_call_id": call_id} for call_id in call_ids)
+        messages.append({"role": "assistant", "content": f"User question: question {turn}\nInformation: ...\nIntent: Plan"})
+        turn += 1
+    return messages[:message_count]
+
+
+def legacy_to_chat_history(messages: list[dict]) -> ChatHistory:
+    # the rebuild loop ChatHistoryCosmosService used before the codec, kept here as the baseline
+    chat = ChatHistory()
+    ChatMessageContent(role=AuthorRole.SYSTEM, content="Welcome to the chat")
+    tool_calls = [m["tool_calls"] for m in messages if "tool_calls" in m]
+    tool_call_map = [{"id": item["id"], "name": item["function"]["name"]} for sublist in tool_calls for item in sublist]
+    for msg in messages:
+        if msg["role"] == "system":
+            chat.add_system_message(msg["content"])
+        elif msg["role"] == "user":
+            chat.add_user_message(msg["content"])
+        elif msg["role"] == "assistant":
+            if "content" in msg:
+                chat.add_assistant_message(msg["content"])
+            elif "tool_calls" in msg:
+                chat.add_message(
+                    ChatMessageContent(
+                        role=AuthorRole.ASSISTANT,
+                        items=[
+                            FunctionCallContent(
+                                name=func_call["function"]["name"],
+                                id=func_call["id"],
+                                arguments=func_call["function"]["arguments"],
+                            )
+                            for func_call in msg["tool_calls"]
+                        ],
+                    )
+                )
+        elif msg["role"] == "tool":
+            chat.add_message(
+                ChatMessageContent(
+                    role=AuthorRole.TOOL,
+                    items=[
+                        FunctionResultContent(
+                            name=next((r["name"] for r in tool_call_map if r["id"] == msg["tool_call_id"]), None),
+                            id=msg["tool_call_id"],
+                            result=msg["content"],
+                        )
+                    ],
+                )
+            )
+    return chat
+
+
+def best_ms(func, repeat: int) -> float:
+    return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="chat history codec micro-benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'messages':>8} {'v1 KB':>8} {'v2 KB':>8} {'encode ms':>10} {'decode ms':>10} {'legacy rebuild ms':>18} {'rebuild ms':>11}")
+    for size in args.sizes:
+        messages = synthetic_transcript(size)
+        # start from real to_dict() output so the round trip is checked against what is persisted
+        messages = [msg.to_dict() for msg in to_chat_history(messages).messages]
+        v1 = json.dumps(encode_messages(messages, version=1))
+        v2 = json.dumps(encode_messages(messages, version=2))
+        assert decode_messages(json.loads(v2)) == messages, "codec round trip mismatch"
+
+        encode = best_ms(lambda: json.dumps(encode_messages(messages, version=2)), args.repeat)
+        decode = best_ms(lambda: decode_messages(json.loads(v2)), args.repeat)
+        legacy = best_ms(lambda: legacy_to_chat_history(messages), args.repeat)
+        rebuild = best_ms(lambda: to_chat_history(messages), args.repeat)
+        print(f"{size:>8} {len(v1) / 1024:>8.1f} {len(v2) / 1024:>8.1f} {encode:>10.2f} {decode:>10.2f} {legacy:>18.2f} {rebuild:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Offline load test of the utterance pipeline, with local stand-ins for every Azure dependency.
+
+The services are wired by AppServices exactly as the app does, from the same configuration, but with
+the in-memory chat history store, scripted chat completion and delayed search/CRM stubs from
+benchmarks/fakes.py. Each simulated call replays the turns of sample_requests.http under its own callId,
+``--concurrency`` calls at a time. Reports latency percentiles, throughput and the time spent per stage.
+Run from the src folder:
+
+    python -m benchmarks.bench_offline --calls 100 --concurrency 32
+    python -m benchmarks.bench_offline --set question_gate_mode=off --set utterance_debounce_ms=0 --json results.json
+
+With ``--telemetry`` the pipeline's own stage histograms (telemetry.py) are recorded in memory and
+reported too. Stage times overlap (a turn's sources run concurrently), so they do not add up to the
+request latency.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+from benchmarks.bench_serving_modes import SAMPLE_REQUESTS, load_turns, percentile
+from benchmarks.fakes import (
+    DelayedAiSearchService,
+    DelayedBenefitsSearchService,
+    DelayedCrmService,
+    InMemoryChatHistoryStore,
+    Latency,
+    ScriptedChatCompletion,
+    StageTimer,
+)
+from config import AppConfig
+from services.app_services import AppServices
+from setup_logging import set_up_telemetry
+
+
+def apply_overrides(config: AppConfig, overrides: list[str]):
+    """``name=value`` pairs set on the AppConfig attributes, converted to the type of the current value."""
+    for override in overrides:
+        name, _, value = override.partition("=")
+        if not hasattr(config, name):
+            raise SystemExit(f"unknown setting {name}")
+        current = getattr(config, name)
+        if isinstance(current, bool):
+            value = value.lower() == "true"
+        elif isinstance(current, (int, float)):
+            value = type(current)(value)
+        setattr(config, name, value)
+
+
+def build_services(args, timer: StageTimer) -> AppServices:
+    rng = random.Random(args.seed)
+    config = AppConfig()
+    # the shared retrieval cache backend needs Cosmos
+    config.retrieval_cache_backend = "memory" if config.retrieval_cache_backend == "cosmos" else config.retrieval_cache_backend
+    apply_overrides(config, args.set)
+    if args.telemetry:
+        # the pipeline's own stage histograms, summarized in the services' stats
+        config.telemetry_exporter = "memory"
+        set_up_telemetry(config)
+    chat_completion = ScriptedChatCompletion(timer, Latency(args.model_ms, args.jitter, rng), args.tokens_per_second)
+    services = AppServices(
+        config,
+        chat_history_service=InMemoryChatHistoryStore(
+            timer, Latency(args.store_read_ms, args.jitter, rng), Latency(args.store_write_ms, args.jitter, rng)
+        ),
+        chat_completion=chat_completion,
+        aisearch_service=DelayedAiSearchService(timer, Latency(args.search_ms, args.jitter, rng)),
+        benefits_search_service=DelayedBenefitsSearchService(timer, Latency(args.benefits_ms, args.jitter, rng)),
+        crm_service=DelayedCrmService(timer, Latency(args.crm_ms, args.jitter, rng)),
+    )
+    # the scripted model has no HTTP client for the scheduler to sit in; it waits for admission itself
+    chat_completion.scheduler = services.openai_scheduler
+    return services
+
+
+async def arun(args) -> dict:
+    turns = load_turns(args.requests_file)
+    timer = StageTimer()
+    services = build_services(args, timer)
+    # keep the per-request logging of the services out of the measurements
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("kernel").setLevel(logging.WARNING)
+    await services.astartup()
+
+    latencies = {"customer": [], "advocate": []}
+    ttfts: list[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def aprocess(call_id: str, turn: dict):
+        speaker = turn["speaker"].lower()
+        if args.stream and speaker == "customer":
+            async for event in services.utterance_service.astream_utterance(turn["callAgent"], call_id, speaker, turn["utterance"]):
+                if event["type"] == "done":
+                    ttfts.append(event["ttft_ms"])
+            return
+        await services.utterance_service.aprocess_utterance(turn["callAgent"], call_id, speaker, turn["utterance"])
+
+    async def asimulate_call():
+        nonlocal errors
+        async with semaphore:
+            call_id = str(uuid.uuid4())
+            for turn in turns:
+                start = time.perf_counter()
+                try:
+                    await aprocess(call_id, turn)
+                except Exception:
+                    logging.getLogger(__name__).exception("turn failed")
+                    errors += 1
+                    continue
+                latencies[turn["speaker"].lower()].append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(asimulate_call() for _ in range(args.calls)))
+        elapsed = time.perf_counter() - start
+        service_stats = services.stats()
+    finally:
+        await services.ashutdown()
+
+    every = latencies["customer"] + latencies["advocate"]
+    requests = len(every) + errors
+    summary = lambda values: {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+    }
+    return {
+        "calls": args.calls,
+        "concurrency": args.concurrency,
+        "turns_per_call": len(turns),
+        "requests": requests,
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "rps": len(every) / elapsed if elapsed else 0.0,
+        "latency_ms": {"all": summary(every), "customer": summary(latencies["customer"]), "advocate": summary(latencies["advocate"])},
+        "ttft_ms": summary(ttfts) if args.stream else None,
+        "stages": {
+            stage: {**stats, "ms_per_request": stats["total_ms"] / requests if requests else 0.0}
+            for stage, stats in timer.stats().items()
+        },
+        "services": service_stats,
+    }
+
+
+def print_report(result: dict):
+    print(
+        f"{result['calls']} calls x {result['turns_per_call']} turns, concurrency {result['concurrency']}: "
+        f"{result['requests']} requests, {result['errors']} errors, {result['rps']:.1f} req/s"
+    )
+    print(f"{'latency':<10} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = dict(result["latency_ms"])
+    if result["ttft_ms"] is not None:
+        rows["ttft"] = result["ttft_ms"]
+    for label, stats in rows.items():
+        print(f"{label:<10} {stats['count']:>7} {stats['p50']:>9.1f} {stats['p95']:>9.1f} {stats['p99']:>9.1f}")
+    print(f"{'stage':<14} {'count':>7} {'avg ms':>9} {'ms/request':>11}")
+    for stage, stats in result["stages"].items():
+        print(f"{stage:<14} {stats['count']:>7} {stats['avg_ms']:>9.1f} {stats['ms_per_request']:>11.1f}")
+    scheduler = result["services"].get("openai_scheduler")
+    if scheduler:
+        print(f"{'openai queue':<14} {'admitted':>9} {'shed':>7} {'avg wait ms':>12}")
+        for priority, admitted in scheduler["admitted"].items():
+            print(f"{priority:<14} {admitted:>9} {scheduler['shed'][priority]:>7} {scheduler['avg_wait_ms'][priority]:>12.1f}")
+    pipeline_stages = (result["services"].get("telemetry") or {}).get("pipeline.stage.duration")
+    if pipeline_stages:
+        print(f"{'pipeline stage':<44} {'count':>7} {'avg ms':>9} {'max ms':>9}")
+        for label, stats in sorted(pipeline_stages.items()):
+            print(f"{label:<44} {stats['count']:>7} {stats['avg']:>9.1f} {stats['max']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="offline load test of the utterance pipeline with local stand-ins")
+    parser.add_argument("--calls", type=int, default=50, help="simulated calls")
+    parser.add_argument("--concurrency", type=int, default=16, help="calls in flight at a time")
+    parser.add_argument("--requests-file", default=SAMPLE_REQUESTS)
+    parser.add_argument("--stream", action="store_true", help="send customer turns through the streaming path")
+    parser.add_argument("--store-read-ms", type=float, default=8)
+    parser.add_argument("--store-write-ms", type=float, default=12)
+    parser.add_argument("--model-ms", type=float, default=600, help="model latency per request before output")
+    parser.add_argument("--tokens-per-second", type=float, default=80)
+    parser.add_argument("--search-ms", type=float, default=150)
+    parser.add_argument("--benefits-ms", type=float, default=250)
+    parser.add_argument("--crm-ms", type=float, default=200)
+    parser.add_argument("--jitter", type=float, default=0.25, help="latency spread as a fraction of the mean")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--set", action="append", default=[], help="override a setting, e.g. question_gate_mode=off")
+    parser.add_argument("--telemetry", action="store_true", help="also report the pipeline's own stage histograms")
+    parser.add_argument("--json", help="also write the results (with the services' /stats) to this file")
+    args = parser.parse_args()
+
+    result = asyncio.run(arun(args))
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Concurrent load against running instances of the service, to compare serving modes.
+
+Start the service in each mode (against the same backing services), for example:
+
+    gunicorn app:app --workers 2 --threads 8 --bind 0.0.0.0:8001
+    uvicorn asgi:app --workers 2 --port 8002
+
+then drive both with the same load from the src folder:
+
+    python -m benchmarks.bench_serving_modes --target flask=http://localhost:8001 --target asgi=http://localhost:8002
+
+Each simulated call replays the customer/advocate turns of sample_requests.http under its own callId,
+with ``--concurrency`` calls in flight at a time. Reports throughput, latency percentiles and errors.
+"""
+
+import argparse
+import json
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+SAMPLE_REQUESTS = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "sample_requests.http")
+
+
+def load_turns(path: str = SAMPLE_REQUESTS) -> list[dict]:
+    """The JSON bodies of the POST /utterance requests in an .http file, in order."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    turns = []
+    for block in text.split("###"):
+        if not re.search(r"^POST \S+/utterance\s*$", block, re.M):
+            continue
+        body = block[re.search(r"^\{", block, re.M).start():block.rindex("}") + 1]
+        turns.append(json.loads(body))
+    return turns
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def post(url: str, body: dict, timeout: float) -> float:
+    request = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"), headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+    return (time.perf_counter() - start) * 1000
+
+
+def run_load(base_url: str, turns: list[dict], calls: int, concurrency: int, timeout: float) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+
+    def simulate_call(_):
+        nonlocal errors
+        call_id = str(uuid.uuid4())
+        for turn in turns:
+            try:
+                latency = post(f"{base_url}/utterance", {**turn, "callId": call_id}, timeout)
+                with lock:
+                    latencies.append(latency)
+            except (urllib.error.URLError, TimeoutError, ConnectionError):
+                with lock:
+                    errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(simulate_call, range(calls)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="compare serving modes under concurrent load")
+    parser.add_argument("--target", action="append", required=True, help="label=base url, e.g. asgi=http://localhost:8002")
+    parser.add_argument("--calls", type=int, default=50, help="simulated calls per target")
+    parser.add_argument("--concurrency", type=int, default=16, help="calls in flight at a time")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--requests-file", default=SAMPLE_REQUESTS)
+    args = parser.parse_args()
+
+    turns = load_turns(args.requests_file)
+    print(f"{len(turns)} turns per call, {args.calls} calls, concurrency {args.concurrency}")
+    print(f"{'target':<10} {'requests':>8} {'errors':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for target in args.target:
+        label, _, url = target.partition("=")
+        result = run_load(url.rstrip("/"), turns, args.calls, args.concurrency, args.timeout)
+        print(
+            f"{label:<10} {result['requests']:>8} {result['errors']:>7} {result['rps']:>8.1f} "
+            f"{result['p50']:>9.1f} {result['p95']:>9.1f} {result['p99']:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
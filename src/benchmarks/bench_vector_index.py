@@ -0,0 +1,111 @@
+"""Query latency of the local vector index against corpus size.
+
+For each corpus size a throwaway index of random row-normalized vectors is written to a temporary
+folder and mapped the way the workers map it. Top-k queries are then timed one at a time and in
+batches: the first query against a fresh mapping (which faults the rows in, from the page cache when
+the file was just written) and then warm. The embedding of the questions is timed separately with the
+local hashing embedder.
+
+Run from the src folder:
+
+    python -m benchmarks.bench_vector_index --sizes 1000 10000 100000 --dimensions 512
+"""
+
+import argparse
+import json
+import tempfile
+import time
+import numpy as np
+from benchmarks.bench_serving_modes import percentile
+from services.vector_index import INDEX_FORMAT_VERSION, HashingEmbedder, VectorIndex
+
+QUESTIONS = [
+    "What is my deductible for this year?",
+    "How much is a specialist copay?",
+    "Does my plan cover a continuous glucose monitor?",
+    "How does the Monthly Challenge work?",
+    "When will my claim be processed?",
+    "Is a prior authorization needed for an MRI?",
+    "How do I order a mail-order prescription?",
+    "What rewards can I earn for logging steps?",
+]
+
+
+def write_random_index(path: str, rows: int, dimensions: int, seed: int) -> None:
+    """An index of ``rows`` random unit vectors, written in the layout ``VectorIndex`` maps."""
+    rng = np.random.default_rng(seed)
+    files = VectorIndex.generation_files(path, 1)
+    block = 65536
+    with open(files["vectors"], "wb") as f:
+        for start in range(0, rows, block):
+            vectors = rng.standard_normal((min(block, rows - start), dimensions), dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            f.write(vectors.tobytes())
+    line = (json.dumps({"source": "synthetic.md", "text": "x"}) + "\n").encode("utf-8")
+    with open(files["chunks"], "wb") as f:
+        f.write(line * rows)
+    (np.arange(rows + 1, dtype=np.uint64) * len(line)).tofile(files["offsets"])
+    manifest = {
+        "version": INDEX_FORMAT_VERSION,
+        "embedder": f"random-{dimensions}",
+        "dimensions": dimensions,
+        "generation": 1,
+        "count": rows,
+        "chunks_bytes": len(line) * rows,
+        "documents": {},
+    }
+    with open(VectorIndex.manifest_path(path), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+
+def time_queries(index: VectorIndex, queries: np.ndarray, batch: int, k: int, iterations: int) -> list[float]:
+    """Milliseconds per ``lookup`` of ``batch`` queries at a time."""
+    latencies = []
+    for i in range(iterations):
+        start = (i * batch) % len(queries)
+        batch_queries = np.take(queries, range(start, start + batch), axis=0, mode="wrap")
+        began = time.perf_counter()
+        index.lookup(batch_queries, k)
+        latencies.append((time.perf_counter() - began) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="corpus sizes in chunks")
+    parser.add_argument("--dimensions", type=int, default=512)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 16], help="queries per search")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    embedder = HashingEmbedder(args.dimensions)
+    began = time.perf_counter()
+    for i in range(args.iterations):
+        embedder.embed([QUESTIONS[i % len(QUESTIONS)]])
+    print(f"hashing embedder: {(time.perf_counter() - began) * 1000 / args.iterations:.3f} ms per question")
+
+    rng = np.random.default_rng(args.seed + 1)
+    queries = rng.standard_normal((256, args.dimensions), dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    print(f"{'rows':>9} {'MB':>8} {'batch':>6} {'cold ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'ms/query':>9}")
+    for rows in args.sizes:
+        with tempfile.TemporaryDirectory() as path:
+            write_random_index(path, rows, args.dimensions, args.seed)
+            megabytes = rows * args.dimensions * 4 / 1e6
+            for batch in args.batches:
+                # a fresh mapping for each table row so its first query pays for faulting the rows in
+                index = VectorIndex(path)
+                cold = time_queries(index, queries, batch, args.k, 1)[0]
+                latencies = time_queries(index, queries, batch, args.k, args.iterations)
+                p50 = percentile(latencies, 50)
+                print(
+                    f"{rows:>9} {megabytes:>8.1f} {batch:>6} {cold:>9.2f} {p50:>8.2f} "
+                    f"{percentile(latencies, 95):>8.2f} {p50 / batch:>9.3f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
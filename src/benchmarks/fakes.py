@@ -0,0 +1,335 @@
+"""In-process stand-ins for Cosmos DB, Azure OpenAI, AI Search, Benefits Search and the CRM.
+
+Each one waits for a configurable latency (with jitter) instead of calling Azure and records the time
+spent in its stage on a shared ``StageTimer``, so a benchmark can run the real service wiring offline
+and break its latency down per stage.
+"""
+
+import asyncio
+import json
+import random
+import re
+import time
+from collections import defaultdict
+from typing import Any, ClassVar
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+from semantic_kernel.connectors.ai.function_calling_utils import update_settings_from_function_call_configuration
+from semantic_kernel.connectors.ai.open_ai.prompt_execution_settings.azure_chat_prompt_execution_settings import (
+    AzureChatPromptExecutionSettings,
+)
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.function_call_content import FunctionCallContent
+from semantic_kernel.contents.function_result_content import FunctionResultContent
+from semantic_kernel.contents.streaming_chat_message_content import StreamingChatMessageContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+from services.aisearch_service import AiSearchService
+from services.benefits_search_service import BenefitsSearchService
+from services.chat_history_codec import decode_messages, encode_messages, to_chat_history
+from services.crm_service import CrmService
+from services.keyword_intent_classifier import KeywordIntentClassifier
+from services.question_gate import QUESTION, heuristic_verdict
+
+# categories whose questions the scripted model sends to retrieve_benefits_response
+BENEFITS_CATEGORIES = {"Plan", "Pharmacy", "Claim"}
+
+_LEDGER_LINE = re.compile(r"^- (.+?) \(Intent: [^)]*\)$", re.M)
+
+
+class StageTimer:
+    """Total time and count per stage, shared by every stand-in of a run."""
+
+    def __init__(self):
+        self.durations_ms: dict[str, float] = defaultdict(float)
+        self.counts: dict[str, int] = defaultdict(int)
+
+    def add(self, stage: str, duration_ms: float):
+        self.durations_ms[stage] += duration_ms
+        self.counts[stage] += 1
+
+    def stats(self) -> dict:
+        return {
+            stage: {"count": self.counts[stage], "total_ms": total, "avg_ms": total / self.counts[stage]}
+            for stage, total in sorted(self.durations_ms.items())
+        }
+
+
+class Latency:
+    """``mean_ms`` give or take ``jitter`` (a fraction of the mean), drawn from a seeded generator."""
+
+    def __init__(self, mean_ms: float, jitter: float = 0.25, rng: random.Random = None):
+        self.mean_ms = mean_ms
+        self.jitter = jitter
+        self.rng = rng or random.Random(0)
+
+    def sample_ms(self) -> float:
+        return max(0.0, self.mean_ms * (1 + self.rng.uniform(-self.jitter, self.jitter)))
+
+    async def await_stage(self, timer: StageTimer, stage: str, extra_ms: float = 0.0):
+        start = time.perf_counter()
+        await asyncio.sleep((self.sample_ms() + extra_ms) / 1000)
+        timer.add(stage, (time.perf_counter() - start) * 1000)
+
+
+class InMemoryChatHistoryStore:
+    """Stand-in for ChatHistoryCosmosService: histories are kept encoded in a dict, one per call.
+
+    Messages go through the same codec as the Cosmos documents so serialization cost is included. The
+    attributes AppServices reads for ``/stats`` are provided; writes never conflict because every
+    request of the benchmark runs in this process under the call locks.
+    """
+
+    def __init__(self, timer: StageTimer, read_latency: Latency, write_latency: Latency):
+        self.timer = timer
+        self.read_latency = read_latency
+        self.write_latency = write_latency
+        # (callAgent, callId) -> [encoded chat, version]
+        self.documents: dict[tuple[str, str], list] = {}
+        self.history_mode = "document"
+
+        self.operation_stats: dict[str, dict[str, float]] = {}
+        self.write_conflict_merges = 0
+        self.write_conflicts_unresolved = 0
+
+    async def aget_container(self):
+        return None
+
+    async def aget_chat_history(self, call_agent: str, call_id: str) -> ChatHistory:
+        chat_history, _ = await self.aread_chat_history(call_agent, call_id)
+        return chat_history
+
+    async def aread_chat_history(self, call_agent: str, call_id: str) -> tuple[ChatHistory, str]:
+        await self.read_latency.await_stage(self.timer, "history_read")
+        document = self.documents.get((call_agent, call_id))
+        if document is None:
+            return None, None
+        return to_chat_history(decode_messages(document[0])), str(document[1])
+
+    async def aread_chat_history_if_modified(
+        self, call_agent: str, call_id: str, etag: str
+    ) -> tuple[bool, ChatHistory, str]:
+        await self.read_latency.await_stage(self.timer, "history_version")
+        document = self.documents.get((call_agent, call_id))
+        if document is not None and str(document[1]) == etag:
+            return False, None, etag
+        if document is None:
+            return True, None, None
+        return True, to_chat_history(decode_messages(document[0])), str(document[1])
+
+    async def aread_version(self, call_agent: str, call_id: str) -> str:
+        await self.read_latency.await_stage(self.timer, "history_version")
+        document = self.documents.get((call_agent, call_id))
+        return str(document[1]) if document is not None else None
+
+    async def aappend_chat_history(
+        self, call_agent: str, call_id: str, chat_history: ChatHistory, start_index: int = 0, etag: str = None
+    ) -> tuple[ChatHistory, dict]:
+        await self.write_latency.await_stage(self.timer, "history_write")
+        document = self.documents.get((call_agent, call_id))
+        new_messages = [msg.to_dict() for msg in chat_history.messages[start_index:]]
+        if document is None or start_index == 0:
+            document = [encode_messages([msg.to_dict() for msg in chat_history.messages]), 0]
+        else:
+            document[0] = encode_messages(decode_messages(document[0]) + new_messages)
+        document[1] += 1
+        self.documents[(call_agent, call_id)] = document
+        return chat_history, {"id": call_id, "_etag": str(document[1])}
+
+    async def aappend_message(self, call_agent: str, call_id: str, message: ChatMessageContent) -> dict:
+        await self.write_latency.await_stage(self.timer, "history_write")
+        document = self.documents.setdefault((call_agent, call_id), [encode_messages([]), 0])
+        document[0] = encode_messages(decode_messages(document[0]) + [message.to_dict()])
+        document[1] += 1
+        return {"id": call_id, "chat": document[0], "_etag": str(document[1])}
+
+    async def aclose(self):
+        pass
+
+
+class DelayedAiSearchService(AiSearchService):
+    def __init__(self, timer: StageTimer, latency: Latency, result_chars: int = 1500):
+        self.timer = timer
+        self.latency = latency
+        self.result_chars = result_chars
+
+    async def get_data(self, user_query):
+        await self.latency.await_stage(self.timer, "aisearch")
+        return f"Top results for {user_query}: " + "x" * self.result_chars
+
+
+class DelayedBenefitsSearchService(BenefitsSearchService):
+    def __init__(self, timer: StageTimer, latency: Latency, result_chars: int = 800):
+        self.timer = timer
+        self.latency = latency
+        self.result_chars = result_chars
+
+    async def get_data(self, user_query, plan_type, plan_system_type_id, benefit_plan_id, date_of_service):
+        await self.latency.await_stage(self.timer, "benefits")
+        return f"Benefits for {user_query} on {benefit_plan_id}: " + "x" * self.result_chars
+
+
+class DelayedCrmService(CrmService):
+    def __init__(self, timer: StageTimer, latency: Latency):
+        super().__init__()
+        self.timer = timer
+        self.latency = latency
+
+    async def aget_plan(self, call_agent: str, call_id: str) -> dict:
+        await self.latency.await_stage(self.timer, "crm")
+        return await super().aget_plan(call_agent, call_id)
+
+
+def _text(msg: ChatMessageContent) -> str:
+    return msg.content or ""
+
+
+def _last_input(prompt: str) -> str:
+    # prompt plugins end with "Input: {{$input}}"
+    return prompt.rsplit("Input:", 1)[-1].strip()
+
+
+class ScriptedChatCompletion(ChatCompletionClientBase):
+    """Chat completion stand-in that behaves like the model does with the utterance system prompt.
+
+    A turn asks for every customer question in the conversation that is not listed as already
+    answered, one KnowledgePlugin tool call each, in a single parallel tool call message; once the tool
+    results are in it answers with one "User question / Information / Intent" block per question.
+    Prompt functions get the answer the keyword classifier or the question heuristics would give.
+    Each request waits ``latency_ms`` plus the time to generate its output at ``tokens_per_second``
+    (roughly four characters per token). With a ``scheduler`` set, each request first waits for
+    admission like the requests of the real client do.
+    """
+
+    SUPPORTS_FUNCTION_CALLING: ClassVar[bool] = True
+
+    timer: Any = None
+    latency: Any = None
+    tokens_per_second: float = 80.0
+    classifier: Any = None
+    scheduler: Any = None
+
+    def __init__(self, timer: StageTimer, latency: Latency, tokens_per_second: float = 80.0):
+        super().__init__(
+            ai_model_id="scripted",
+            service_id="azure_oai",
+            timer=timer,
+            latency=latency,
+            tokens_per_second=tokens_per_second,
+            classifier=KeywordIntentClassifier.from_prompt_file(),
+        )
+
+    def get_prompt_execution_settings_class(self):
+        return AzureChatPromptExecutionSettings
+
+    def _update_function_choice_settings_callback(self):
+        return update_settings_from_function_call_configuration
+
+    def _reset_function_choice_settings(self, settings):
+        settings.tool_choice = None
+        settings.tools = None
+
+    def _generation_ms(self, text: str) -> float:
+        return len(text) / 4 / self.tokens_per_second * 1000
+
+    def _script(self, chat_history: ChatHistory, settings) -> ChatMessageContent:
+        messages = chat_history.messages
+        last = messages[-1]
+        if not getattr(settings, "tools", None):
+            prompt = _text(last)
+            utterance = _last_input(prompt)
+            if "YES OR NO" in prompt:
+                answer = "YES" if heuristic_verdict(utterance, self.classifier) != "no_question" else "NO"
+            else:
+                answer = self.classifier.classify(utterance)[0]
+            return ChatMessageContent(role=AuthorRole.ASSISTANT, content=answer)
+
+        if last.role == AuthorRole.TOOL:
+            return ChatMessageContent(role=AuthorRole.ASSISTANT, content=self._answer(messages))
+
+        answered = {
+            question
+            for msg in messages
+            if msg.role == AuthorRole.SYSTEM
+            for question in _LEDGER_LINE.findall(_text(msg))
+        }
+        questions = [
+            _text(msg)
+            for msg in messages
+            if msg.role == AuthorRole.USER and heuristic_verdict(_text(msg), self.classifier) == QUESTION
+        ]
+        pending = [question for question in dict.fromkeys(questions) if question not in answered]
+        if not pending:
+            content = "No questions found" if not questions else self._answer(messages)
+            return ChatMessageContent(role=AuthorRole.ASSISTANT, content=content)
+
+        calls = []
+        for question in pending:
+            category, _ = self.classifier.classify(question)
+            function = "retrieve_benefits_response" if category in BENEFITS_CATEGORIES else "retrieve_kc_response"
+            calls.append(
+                FunctionCallContent(
+                    id=f"call_{len(messages)}_{len(calls)}",
+                    plugin_name="KnowledgePlugin",
+                    function_name=function,
+                    arguments=json.dumps({"user_query": question}),
+                )
+            )
+        return ChatMessageContent(role=AuthorRole.ASSISTANT, items=calls)
+
+    @staticmethod
+    def _answer(messages: list[ChatMessageContent]) -> str:
+        calls = {
+            item.id: item
+            for msg in messages
+            for item in msg.items
+            if isinstance(item, FunctionCallContent)
+        }
+        blocks = []
+        for msg in messages:
+            for item in msg.items:
+                if isinstance(item, FunctionResultContent) and item.id in calls:
+                    question = json.loads(calls[item.id].arguments)["user_query"]
+                    blocks.append(f"User question: {question}\nInformation: {str(item.result)[:200]}\nIntent: General")
+        return "\n".join(dict.fromkeys(blocks)) or "No questions found"
+
+    async def _aadmit(self, chat_history: ChatHistory) -> bool:
+        if self.scheduler is None:
+            return False
+        await self.scheduler.aacquire(sum(len(_text(msg)) for msg in chat_history.messages) // 4)
+        return True
+
+    async def _inner_get_chat_message_contents(self, chat_history: ChatHistory, settings) -> list[ChatMessageContent]:
+        admitted = await self._aadmit(chat_history)
+        try:
+            reply = self._script(chat_history, settings)
+            await self.latency.await_stage(self.timer, "model", self._generation_ms(str(reply.to_dict())))
+            return [reply]
+        finally:
+            if admitted:
+                self.scheduler.release()
+
+    async def _inner_get_streaming_chat_message_contents(self, chat_history: ChatHistory, settings, function_invoke_attempt: int = 0):
+        admitted = await self._aadmit(chat_history)
+        try:
+            reply = self._script(chat_history, settings)
+            start = time.perf_counter()
+            await asyncio.sleep(self.latency.sample_ms() / 1000)
+            if any(isinstance(item, FunctionCallContent) for item in reply.items):
+                await asyncio.sleep(self._generation_ms(str(reply.to_dict())) / 1000)
+                yield [
+                    StreamingChatMessageContent(
+                        role=AuthorRole.ASSISTANT, choice_index=0, items=reply.items, function_invoke_attempt=function_invoke_attempt
+                    )
+                ]
+            else:
+                for word in re.findall(r"\S+\s*", reply.content):
+                    await asyncio.sleep(self._generation_ms(word) / 1000)
+                    yield [
+                        StreamingChatMessageContent(
+                            role=AuthorRole.ASSISTANT, choice_index=0, content=word, function_invoke_attempt=function_invoke_attempt
+                        )
+                    ]
+            self.timer.add("model", (time.perf_counter() - start) * 1000)
+        finally:
+            if admitted:
+                self.scheduler.release()
@@ -8,13 +8,77 @@ class AppConfig:
 
         self.app_insights_instrumentation_key = os.getenv("AZURE_APP_INSIGHTS_INSTRUMENTATION_KEY")
         self.app_insights_connstr = os.getenv("AZURE_APP_INSIGHTS_CONN_STR")
+        # azure_monitor, console, memory (summarized at GET /stats) or none
+        self.telemetry_exporter = os.getenv("TELEMETRY_EXPORTER", "azure_monitor")
+        self.telemetry_export_interval_ms = int(os.getenv("TELEMETRY_EXPORT_INTERVAL_MS", "10000"))
         self.db_endpoint = os.getenv("AZURE_COSMOSDB_ENDPOINT")
         self.db_name = os.getenv("AZURE_COSMOSDB_DATABASE")
         self.db_container = os.getenv("AZURE_COSMOSDB_CONTAINER")
         self.db_chat_history_container = os.getenv("AZURE_COSMOSDB_CHATHISTORY_CONTAINER")
         self.db_key = os.getenv("AZURE_COSMOSDB_KEY")
+        self.db_partition_key_path = os.getenv("AZURE_COSMOSDB_PARTITION_KEY_PATH", "/callId")
+        self.db_throughput_mode = os.getenv("AZURE_COSMOSDB_THROUGHPUT_MODE", "serverless")
+        self.db_max_throughput = int(os.getenv("AZURE_COSMOSDB_MAX_THROUGHPUT", "0")) or None
+        self.db_history_mode = os.getenv("AZURE_COSMOSDB_HISTORY_MODE", "document")
+        self.db_history_codec_version = int(os.getenv("AZURE_COSMOSDB_HISTORY_CODEC_VERSION", "1"))
+        self.db_history_compress_threshold = int(os.getenv("AZURE_COSMOSDB_HISTORY_COMPRESS_THRESHOLD", "1024"))
+        # conditional writes that lose a race with another worker or instance are merged and retried
+        self.db_max_write_attempts = int(os.getenv("AZURE_COSMOSDB_MAX_WRITE_ATTEMPTS", "4"))
+        self.chat_history_cache_max_calls = int(os.getenv("CHAT_HISTORY_CACHE_MAX_CALLS", "1000"))
+        self.chat_history_cache_idle_ttl_seconds = float(os.getenv("CHAT_HISTORY_CACHE_IDLE_TTL_SECONDS", "900"))
+        self.chat_history_cache_max_mb = float(os.getenv("CHAT_HISTORY_CACHE_MAX_MB", "256"))
+        self.chat_history_cache_write_mode = os.getenv("CHAT_HISTORY_CACHE_WRITE_MODE", "through")
+        self.chat_history_cache_flush_interval_seconds = float(os.getenv("CHAT_HISTORY_CACHE_FLUSH_INTERVAL_SECONDS", "1"))
+        self.chat_history_cache_revalidate = os.getenv("CHAT_HISTORY_CACHE_REVALIDATE", "false").lower() == "true"
         self.ai_deployment = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT_NAME")
         self.ai_endpoint = os.getenv("AZURE_OPENAI_BASE_URL")
         self.ai_api_version = os.getenv("AZURE_OPENAI_API_VERSION")
         self.ai_api_key = os.getenv("AZURE_OPENAI_API_KEY")
+        self.intent_cache_max_entries = int(os.getenv("INTENT_CACHE_MAX_ENTRIES", "5000"))
+        self.intent_cache_ttl_seconds = float(os.getenv("INTENT_CACHE_TTL_SECONDS", "3600"))
+        self.intent_local_classifier_enabled = os.getenv("INTENT_LOCAL_CLASSIFIER_ENABLED", "true").lower() == "true"
+        self.intent_confidence_threshold = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.6"))
+        self.intent_agreement_sample_rate = float(os.getenv("INTENT_AGREEMENT_SAMPLE_RATE", "0.05"))
+        self.utterance_debounce_ms = int(os.getenv("UTTERANCE_DEBOUNCE_MS", "300"))
+        self.utterance_batch_concurrency = int(os.getenv("UTTERANCE_BATCH_CONCURRENCY", "16"))
+        self.utterance_batch_max_events = int(os.getenv("UTTERANCE_BATCH_MAX_EVENTS", "1000"))
+        self.question_gate_mode = os.getenv("QUESTION_GATE_MODE", "shadow")
+        self.question_gate_min_words = int(os.getenv("QUESTION_GATE_MIN_WORDS", "3"))
+        self.intent_timeout_seconds = float(os.getenv("INTENT_TIMEOUT_SECONDS", "5"))
+        self.aisearch_timeout_seconds = float(os.getenv("AISEARCH_TIMEOUT_SECONDS", "5"))
+        self.benefits_search_timeout_seconds = float(os.getenv("BENEFITS_SEARCH_TIMEOUT_SECONDS", "5"))
+        # knowledge-center search: stub (placeholder AiSearchService) or local (memory-mapped vector index)
+        self.aisearch_backend = os.getenv("AISEARCH_BACKEND", "stub")
+        self.local_vector_index_path = os.getenv("LOCAL_VECTOR_INDEX_PATH", "vector_index")
+        self.local_vector_index_documents_path = os.getenv("LOCAL_VECTOR_INDEX_DOCUMENTS_PATH", "kc_documents")
+        self.local_vector_index_top_k = int(os.getenv("LOCAL_VECTOR_INDEX_TOP_K", "5"))
+        self.local_vector_index_chunk_chars = int(os.getenv("LOCAL_VECTOR_INDEX_CHUNK_CHARS", "1200"))
+        self.local_vector_index_embedding_deployment = os.getenv("LOCAL_VECTOR_INDEX_EMBEDDING_DEPLOYMENT")
+        self.local_vector_index_dimensions = int(os.getenv("LOCAL_VECTOR_INDEX_DIMENSIONS", "512"))
+        # results of AI Search and Benefits Search lookups, optionally matched by similarity to earlier questions
+        self.retrieval_cache_backend = os.getenv("RETRIEVAL_CACHE_BACKEND", "memory")
+        self.retrieval_cache_max_entries = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "5000"))
+        self.retrieval_cache_ttl_seconds = float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "3600"))
+        self.retrieval_cache_cosmos_container = os.getenv("RETRIEVAL_CACHE_COSMOS_CONTAINER", "retrievalcache")
+        self.retrieval_cache_similarity_threshold = float(os.getenv("RETRIEVAL_CACHE_SIMILARITY_THRESHOLD", "0"))
+        self.retrieval_cache_embedding_deployment = os.getenv("RETRIEVAL_CACHE_EMBEDDING_DEPLOYMENT")
+        # CRM plan context of active calls, fetched at a call's first utterance
+        self.call_context_max_calls = int(os.getenv("CALL_CONTEXT_MAX_CALLS", "1000"))
+        self.call_context_idle_ttl_seconds = float(os.getenv("CALL_CONTEXT_IDLE_TTL_SECONDS", "900"))
+        # questions already answered in a call are answered from its ledger instead of searched again
+        self.question_ledger_enabled = os.getenv("QUESTION_LEDGER_ENABLED", "true").lower() == "true"
+        self.question_ledger_similarity_threshold = float(os.getenv("QUESTION_LEDGER_SIMILARITY_THRESHOLD", "0.9"))
+        self.question_ledger_information_max_chars = int(os.getenv("QUESTION_LEDGER_INFORMATION_MAX_CHARS", "800"))
+        self.history_token_budget = int(os.getenv("HISTORY_TOKEN_BUDGET", "8000"))
+        self.history_keep_turns = int(os.getenv("HISTORY_KEEP_TURNS", "4"))
+        self.history_tool_result_max_chars = int(os.getenv("HISTORY_TOOL_RESULT_MAX_CHARS", "500"))
+        # admission control for the chat deployment, shared by every request of the process
+        self.openai_scheduler_enabled = os.getenv("OPENAI_SCHEDULER_ENABLED", "true").lower() == "true"
+        self.openai_scheduler_max_concurrency = int(os.getenv("OPENAI_SCHEDULER_MAX_CONCURRENCY", "32"))
+        self.openai_scheduler_requests_per_minute = float(os.getenv("OPENAI_SCHEDULER_REQUESTS_PER_MINUTE", "0"))
+        self.openai_scheduler_tokens_per_minute = float(os.getenv("OPENAI_SCHEDULER_TOKENS_PER_MINUTE", "0"))
+        self.openai_scheduler_max_queue_seconds = float(os.getenv("OPENAI_SCHEDULER_MAX_QUEUE_SECONDS", "10"))
+        self.openai_scheduler_max_throttle_retries = int(os.getenv("OPENAI_SCHEDULER_MAX_THROTTLE_RETRIES", "3"))
+        # Azure AD tokens for OpenAI and Cosmos (when their keys are blank) are renewed this long before they expire
+        self.azure_token_refresh_margin_seconds = float(os.getenv("AZURE_TOKEN_REFRESH_MARGIN_SECONDS", "600"))
         
\ No newline at end of file
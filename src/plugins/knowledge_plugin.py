@@ -1,20 +1,98 @@
+import asyncio
+import logging
+import time
 from typing import Annotated
+from opentelemetry import trace
 from semantic_kernel import Kernel
 from semantic_kernel.functions import kernel_function
+from telemetry import stage
 from services.benefits_search_service import BenefitsSearchService
 from services.aisearch_service import AiSearchService
+from services.call_context import CallContextService, current_call
 from services.crm_service import CrmService
 from services.intent_service import IntentService
+from services.openai_scheduler import was_shed
+from services.question_ledger import current_ledger
 
 import json
 import os
 
+logger = logging.getLogger(__name__)
+
+# returned in place of a source's result when it timed out or failed, so the model still gets the others
+NONE_FOUND = "none found"
+
+DEFAULT_SOURCE_TIMEOUTS = {"intent": 5.0, "aisearch": 5.0, "benefits": 5.0}
+
 class KnowledgePlugin:
-    def __init__(self, kernel: Kernel, aisearch_service: AiSearchService, benefits_search_service: BenefitsSearchService, intent_service: IntentService):
+    def __init__(self, kernel: Kernel, aisearch_service: AiSearchService, benefits_search_service: BenefitsSearchService, intent_service: IntentService, source_timeouts: dict[str, float] = None, call_context: CallContextService = None):
         self.aisearch_service = aisearch_service
         self.benefits_search_service = benefits_search_service
         self.kernel = kernel
         self.intent_service = intent_service
+        # seconds each source may take before its result is replaced with NONE_FOUND
+        self.source_timeouts = {**DEFAULT_SOURCE_TIMEOUTS, **(source_timeouts or {})}
+        self.source_stats: dict[str, dict[str, float]] = {}
+        # per-call CRM plan context; without it the plan is looked up on every benefits question
+        self.call_context = call_context
+
+    async def _afetch(self, source: str, coro):
+        """Await one source under its own timeout; a slow or failing source yields NONE_FOUND."""
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            # the span records the timeout or error before it is turned into NONE_FOUND below
+            with stage("source", source=source):
+                return await asyncio.wait_for(coro, timeout=self.source_timeouts.get(source))
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            logger.warning("%s source timed out after %ss", source, self.source_timeouts.get(source))
+            return NONE_FOUND
+        except Exception as e:
+            if was_shed(e):
+                outcome = "shed"
+                logger.warning("%s source shed by the OpenAI scheduler", source)
+                return NONE_FOUND
+            outcome = "error"
+            logger.exception("%s source failed", source)
+            return NONE_FOUND
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            stats = self.source_stats.setdefault(
+                source, {"count": 0, "duration_ms": 0.0, "max_duration_ms": 0.0, "timeouts": 0, "errors": 0, "shed": 0}
+            )
+            stats["count"] += 1
+            stats["duration_ms"] += duration_ms
+            stats["max_duration_ms"] = max(stats["max_duration_ms"], duration_ms)
+            if outcome == "timeout":
+                stats["timeouts"] += 1
+            elif outcome == "error":
+                stats["errors"] += 1
+            elif outcome == "shed":
+                stats["shed"] += 1
+
+    async def _aget_plan(self) -> dict:
+        call = current_call.get()
+        if self.call_context is not None and call is not None:
+            return await self.call_context.aget_plan(*call)
+        # pull in crm payload example
+        return CrmService().get_sample_data()["crm"]["plan"]
+
+    async def _abenefits_search(self, user_query: str) -> str:
+        plan = await self._aget_plan()
+        return await self.benefits_search_service.get_data(
+            user_query,
+            plan_type=plan["PlanType"],
+            plan_system_type_id=plan["PlanSystemTypeID"],
+            benefit_plan_id=plan["BenefitPlanID"],
+            date_of_service=plan["DateOfService"],
+        )
+
+    def stats(self) -> dict:
+        return {
+            source: {**stats, "avg_duration_ms": stats["duration_ms"] / stats["count"] if stats["count"] else 0.0}
+            for source, stats in self.source_stats.items()
+        }
 
     @kernel_function(
         name="retrieve_kc_response",
@@ -27,12 +105,25 @@ class KnowledgePlugin:
         #Get the raw vector for the given question
         #Invoke the AI search to get the Top5 results
         #Format the response and return the context
-        determined_intent = await self.intent_service.determine_intent(self.kernel, user_query)
-        aisearch_data = await self.aisearch_service.get_data(user_query)
-        return {
+        ledger = current_ledger.get()
+        if ledger is not None:
+            # answered earlier in the call: reuse the information instead of searching again
+            information = ledger.answer("retrieve_kc_response", user_query)
+            if information is not None:
+                trace.get_current_span().add_event("answered from ledger", {"function": "retrieve_kc_response"})
+                return information
+        # the sources are independent, so they run concurrently and the turn waits for the slowest one only
+        determined_intent, aisearch_data = await asyncio.gather(
+            self._afetch("intent", self.intent_service.determine_intent(self.kernel, user_query)),
+            self._afetch("aisearch", self.aisearch_service.get_data(user_query)),
+        )
+        result = {
                 "intent": determined_intent,
                 "aisearch_data": aisearch_data
             }
+        if ledger is not None:
+            ledger.add(user_query, "retrieve_kc_response", result)
+        return result
         
     @kernel_function(
         name="retrieve_benefits_response",
@@ -42,22 +133,26 @@ class KnowledgePlugin:
         self,
         user_query:Annotated[str," A searchable need or question related to health care posed by the USER in the conversation"]
     ) -> Annotated[str, "the output is the benefits api response for the given user_query and current plan details and the determined intent."]:
-        
-        determined_intent = await self.intent_service.determine_intent(self.kernel, user_query)
-       
-        # pull in crm payload example 
-        crm_service = CrmService()
-        crm_payload = crm_service.get_sample_data()
-        plan_system_type_id = crm_payload["crm"]["plan"]["PlanSystemTypeID"]
-        benefit_play_id = crm_payload["crm"]["plan"]["BenefitPlanID"]
-        date_of_service = crm_payload["crm"]["plan"]["DateOfService"]
-        plan_type = crm_payload["crm"]["plan"]["PlanType"]
-        #search benefits service for specific benefit information
-        aisearch_data = await self.aisearch_service.get_data(user_query)
-        benefitsearch_data = await self.benefits_search_service.get_data(user_query, plan_type = plan_type, plan_system_type_id = plan_system_type_id, benefit_plan_id = benefit_play_id, date_of_service = date_of_service)
-        return {
+        ledger = current_ledger.get()
+        if ledger is not None:
+            information = ledger.answer("retrieve_benefits_response", user_query)
+            if information is not None:
+                trace.get_current_span().add_event("answered from ledger", {"function": "retrieve_benefits_response"})
+                return information
+
+        #search benefits service for specific benefit information, concurrently with intent and AI Search;
+        #the call's CRM plan context is usually already prefetched, and counts against the benefits timeout
+        determined_intent, aisearch_data, benefitsearch_data = await asyncio.gather(
+            self._afetch("intent", self.intent_service.determine_intent(self.kernel, user_query)),
+            self._afetch("aisearch", self.aisearch_service.get_data(user_query)),
+            self._afetch("benefits", self._abenefits_search(user_query)),
+        )
+        result = {
                 "intent": determined_intent,
                 "aisearch_data": aisearch_data,
                 "benefitsearch_data": benefitsearch_data
             }
+        if ledger is not None:
+            ledger.add(user_query, "retrieve_benefits_response", result)
+        return result
  
\ No newline at end of file
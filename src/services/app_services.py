@@ -0,0 +1,291 @@
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
+import telemetry
+from config import AppConfig
+from services.call_context import CallContextService
+from services.call_debouncer import CallDebouncer
+from services.chat_history_cosmos_service import ChatHistoryCosmosService
+from services.chat_history_cache_service import CachedChatHistoryService
+from services.credential_manager import COGNITIVE_SERVICES_SCOPE, CredentialManager
+from services.crm_service import CrmService
+from services.aisearch_service import AiSearchService
+from services.benefits_search_service import BenefitsSearchService
+from services.intent_service import IntentService
+from services.keyword_intent_classifier import KeywordIntentClassifier
+from services.history_reducer import TokenBudgetHistoryReducer
+from services.kernel_service import KernelService
+from services.openai_scheduler import OpenAIRequestScheduler
+from services.question_gate import QuestionGate
+from services.question_ledger import QuestionLedgerService
+from services.retrieval_cache import (
+    AzureOpenAIEmbedder,
+    CachedAiSearchService,
+    CachedBenefitsSearchService,
+    CosmosRetrievalCacheBackend,
+    KeywordEmbedder,
+    MemoryRetrievalCacheBackend,
+    RetrievalCache,
+)
+from services.utterance_service import UtteranceService
+from services.vector_index import LocalVectorSearchService, VectorIndex, build_embedder
+
+
+class AppServices:
+    """Process-wide container for the clients and services shared by every request.
+
+    Everything here is built once per worker process. Call ``astartup`` before serving and
+    ``ashutdown`` when the worker stops so the pooled async HTTP clients are closed cleanly.
+    The backing services can be passed in to run the same wiring against local stand-ins (see
+    benchmarks/bench_offline.py).
+    """
+
+    def __init__(
+        self,
+        config: AppConfig,
+        chat_history_service: ChatHistoryCosmosService = None,
+        chat_completion: ChatCompletionClientBase = None,
+        aisearch_service: AiSearchService = None,
+        benefits_search_service: BenefitsSearchService = None,
+        crm_service: CrmService = None,
+    ):
+        self.config = config
+        # one Azure AD credential for OpenAI and Cosmos when their keys are blank; tokens are renewed in the background
+        self.credentials = CredentialManager(refresh_margin_seconds=config.azure_token_refresh_margin_seconds)
+
+        self.chat_history_service = chat_history_service or ChatHistoryCosmosService(
+            endpoint=config.db_endpoint,
+            db_name=config.db_name,
+            container_name=config.db_container,
+            key=config.db_key,
+            partition_key_path=config.db_partition_key_path,
+            throughput_mode=config.db_throughput_mode,
+            max_throughput=config.db_max_throughput,
+            history_mode=config.db_history_mode,
+            codec_version=config.db_history_codec_version,
+            compress_threshold=config.db_history_compress_threshold,
+            max_write_attempts=config.db_max_write_attempts,
+            credential=self.credentials,
+        )
+
+        # active calls are served from the per-process cache; Cosmos stays the source of truth
+        if config.chat_history_cache_max_calls > 0:
+            self.chat_history_cache_service = CachedChatHistoryService(
+                chat_history_service=self.chat_history_service,
+                max_calls=config.chat_history_cache_max_calls,
+                idle_ttl_seconds=config.chat_history_cache_idle_ttl_seconds,
+                max_bytes=int(config.chat_history_cache_max_mb * 1024 * 1024),
+                write_mode=config.chat_history_cache_write_mode,
+                flush_interval_seconds=config.chat_history_cache_flush_interval_seconds,
+                revalidate=config.chat_history_cache_revalidate,
+            )
+        else:
+            self.chat_history_cache_service = None
+
+        self.aisearch_service = aisearch_service or self._build_aisearch_service(config)
+        self.local_vector_search = self.aisearch_service if isinstance(self.aisearch_service, LocalVectorSearchService) else None
+        self.benefits_search_service = benefits_search_service or BenefitsSearchService()
+        # the same questions recur across calls; their search results are reused until the TTL passes
+        self.retrieval_cache = self._build_retrieval_cache(config)
+        if self.retrieval_cache is not None:
+            self.aisearch_service = CachedAiSearchService(self.aisearch_service, self.retrieval_cache)
+            self.benefits_search_service = CachedBenefitsSearchService(self.benefits_search_service, self.retrieval_cache)
+        # built once from the CategoryDetector prompt and shared by the intent fast path and the question gate
+        keyword_classifier = KeywordIntentClassifier.from_prompt_file()
+        self.intent_service = IntentService(
+            cache_max_entries=config.intent_cache_max_entries,
+            cache_ttl_seconds=config.intent_cache_ttl_seconds,
+            local_classifier=keyword_classifier if config.intent_local_classifier_enabled else None,
+            confidence_threshold=config.intent_confidence_threshold,
+            agreement_sample_rate=config.intent_agreement_sample_rate,
+        )
+
+        self.call_context = CallContextService(
+            crm_service=crm_service or CrmService(),
+            max_calls=config.call_context_max_calls,
+            idle_ttl_seconds=config.call_context_idle_ttl_seconds,
+        )
+
+        # long calls are compacted to a token budget before every completion
+        if config.history_token_budget > 0:
+            self.history_reducer = TokenBudgetHistoryReducer(
+                token_budget=config.history_token_budget,
+                keep_turns=config.history_keep_turns,
+                tool_result_max_chars=config.history_tool_result_max_chars,
+            )
+        else:
+            self.history_reducer = None
+
+        # completions, intent and question classifications share the deployment's quota through one queue
+        if config.openai_scheduler_enabled:
+            self.openai_scheduler = OpenAIRequestScheduler(
+                max_concurrency=config.openai_scheduler_max_concurrency,
+                requests_per_minute=config.openai_scheduler_requests_per_minute,
+                tokens_per_minute=config.openai_scheduler_tokens_per_minute,
+                max_queue_seconds=config.openai_scheduler_max_queue_seconds,
+                max_throttle_retries=config.openai_scheduler_max_throttle_retries,
+            )
+        else:
+            self.openai_scheduler = None
+
+        # built once per process: the kernel, its plugins and the pooled OpenAI client are shared by every call
+        with telemetry.stage("kernel_construction"):
+            self.kernel_service = KernelService(
+                deployment=config.ai_deployment,
+                endpoint=config.ai_endpoint,
+                api_version=config.ai_api_version,
+                key=config.ai_api_key,
+                aisearch_service=self.aisearch_service,
+                benefits_search_service=self.benefits_search_service,
+                intent_service=self.intent_service,
+                history_reducer=self.history_reducer,
+                source_timeouts={
+                    "intent": config.intent_timeout_seconds,
+                    "aisearch": config.aisearch_timeout_seconds,
+                    "benefits": config.benefits_search_timeout_seconds,
+                },
+                call_context=self.call_context,
+                chat_completion=chat_completion,
+                scheduler=self.openai_scheduler,
+                credentials=self.credentials,
+            )
+        self.chat_completion = chat_completion
+
+        self.question_gate = QuestionGate(
+            mode=config.question_gate_mode,
+            kernel=self.kernel_service.kernel,
+            classifier=keyword_classifier,
+            min_words=config.question_gate_min_words,
+        )
+
+        if config.question_ledger_enabled:
+            self.question_ledger_service = QuestionLedgerService(
+                similarity_threshold=config.question_ledger_similarity_threshold,
+                max_calls=config.call_context_max_calls,
+                idle_ttl_seconds=config.call_context_idle_ttl_seconds,
+                information_max_chars=config.question_ledger_information_max_chars,
+            )
+        else:
+            self.question_ledger_service = None
+
+        # speech-to-text fragments of one question arriving within the window share one run
+        self.debouncer = CallDebouncer(config.utterance_debounce_ms / 1000) if config.utterance_debounce_ms > 0 else None
+
+        self.utterance_service = UtteranceService(
+            chat_history_service=self.chat_history_cache_service or self.chat_history_service,
+            kernel_service=self.kernel_service,
+            question_gate=self.question_gate,
+            debouncer=self.debouncer,
+            batch_concurrency=config.utterance_batch_concurrency,
+            call_context=self.call_context,
+            question_ledger_service=self.question_ledger_service,
+        )
+
+    def _build_aisearch_service(self, config: AppConfig) -> AiSearchService:
+        backend_name = (config.aisearch_backend or "stub").strip().lower()
+        if backend_name == "stub":
+            return AiSearchService()
+        if backend_name != "local":
+            raise ValueError(f"Unsupported AI Search backend {backend_name}; use stub or local")
+        index = VectorIndex(config.local_vector_index_path)
+        if index.manifest is None:
+            raise ValueError(
+                f"No vector index at {config.local_vector_index_path}; build it with python -m tools.build_vector_index"
+            )
+        embedder = build_embedder(
+            deployment=config.local_vector_index_embedding_deployment,
+            endpoint=config.ai_endpoint,
+            api_version=config.ai_api_version,
+            key=config.ai_api_key,
+            dimensions=config.local_vector_index_dimensions,
+            credentials=self.credentials,
+        )
+        return LocalVectorSearchService(index, embedder, top_k=config.local_vector_index_top_k)
+
+    def _build_retrieval_cache(self, config: AppConfig) -> RetrievalCache:
+        backend_name = (config.retrieval_cache_backend or "off").strip().lower()
+        if backend_name == "off":
+            return None
+        if backend_name == "memory":
+            backend = MemoryRetrievalCacheBackend(
+                max_entries=config.retrieval_cache_max_entries, ttl_seconds=config.retrieval_cache_ttl_seconds
+            )
+        elif backend_name == "cosmos":
+            backend = CosmosRetrievalCacheBackend(
+                cosmos_client=self.chat_history_service.cosmos_client,
+                db_name=config.db_name,
+                container_name=config.retrieval_cache_cosmos_container,
+                ttl_seconds=config.retrieval_cache_ttl_seconds,
+            )
+        else:
+            raise ValueError(f"Unsupported retrieval cache backend {backend_name}; use memory, cosmos or off")
+
+        embedder = None
+        if config.retrieval_cache_similarity_threshold > 0:
+            if config.retrieval_cache_embedding_deployment:
+                embedder = AzureOpenAIEmbedder.from_deployment(
+                    deployment=config.retrieval_cache_embedding_deployment,
+                    endpoint=config.ai_endpoint,
+                    api_version=config.ai_api_version,
+                    key=config.ai_api_key,
+                    credentials=self.credentials,
+                )
+            else:
+                embedder = KeywordEmbedder()
+        return RetrievalCache(
+            backend=backend,
+            embedder=embedder,
+            similarity_threshold=config.retrieval_cache_similarity_threshold,
+            max_entries=config.retrieval_cache_max_entries,
+            ttl_seconds=config.retrieval_cache_ttl_seconds,
+        )
+
+    async def astartup(self):
+        # the first completion should not wait for a token; Cosmos fetches its own with the container check below
+        if self.chat_completion is None and not (self.config.ai_api_key or "").strip():
+            await self.credentials.astartup(COGNITIVE_SERVICES_SCOPE)
+        # run the Cosmos database/container provisioning check once, before the first utterance
+        await self.chat_history_service.aget_container()
+        if self.chat_history_cache_service is not None:
+            await self.chat_history_cache_service.astartup()
+
+    async def ashutdown(self):
+        await self.kernel_service.aclose()
+        if self.retrieval_cache is not None:
+            await self.retrieval_cache.aclose()
+        # flush write-behind entries before the Cosmos client goes away
+        if self.chat_history_cache_service is not None:
+            await self.chat_history_cache_service.aclose()
+        await self.chat_history_service.aclose()
+        await self.credentials.close()
+
+    def stats(self) -> dict:
+        stats = {
+            "cosmos": self.chat_history_service.operation_stats,
+            "cosmos_write_conflicts": {
+                "merged": self.chat_history_service.write_conflict_merges,
+                "unresolved": self.chat_history_service.write_conflicts_unresolved,
+            },
+            "calls_in_progress": len(self.utterance_service.call_locks),
+        }
+        stats["streaming"] = self.utterance_service.stats()
+        if self.chat_history_cache_service is not None:
+            stats["chat_history_cache"] = self.chat_history_cache_service.stats()
+        stats["intent"] = self.intent_service.stats()
+        stats["question_gate"] = self.question_gate.stats()
+        if self.debouncer is not None:
+            stats["debouncer"] = self.debouncer.stats()
+        stats["call_context"] = self.call_context.stats()
+        if self.question_ledger_service is not None:
+            stats["question_ledger"] = self.question_ledger_service.stats()
+        stats["knowledge_sources"] = self.kernel_service.knowledge_plugin.stats()
+        if self.local_vector_search is not None:
+            stats["local_vector_search"] = self.local_vector_search.stats()
+        if self.retrieval_cache is not None:
+            stats["retrieval_cache"] = self.retrieval_cache.stats()
+        if self.openai_scheduler is not None:
+            stats["openai_scheduler"] = self.openai_scheduler.stats()
+        if self.history_reducer is not None:
+            stats["history_reducer"] = self.history_reducer.stats()
+        stats["credentials"] = self.credentials.stats()
+        if telemetry.memory_reader is not None:
+            stats["telemetry"] = telemetry.snapshot()
+        return stats
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from services.crm_service import CrmService
+from services.lru_ttl_cache import LruTtlCache
+
+logger = logging.getLogger(__name__)
+
+# (callAgent, callId) of the turn being processed; set by UtteranceService, read by the plugins it invokes
+current_call: ContextVar[tuple[str, str]] = ContextVar("current_call", default=None)
+
+
+class CallContextService:
+    """CRM plan context of each active call, fetched once and kept for the call's lifetime.
+
+    ``prefetch`` starts the lookup in the background as soon as a call's first utterance arrives, so it
+    usually completes while the turn is still loading its history or waiting on the model. Every later
+    ``aget_plan`` of the call is served from memory. Calls idle for ``idle_ttl_seconds`` are forgotten; a
+    failed lookup is dropped so the next turn of the call retries it.
+    """
+
+    def __init__(self, crm_service: CrmService, max_calls: int = 1000, idle_ttl_seconds: float = 900):
+        self.crm_service = crm_service
+        # (callAgent, callId) -> task resolving to the plan dict
+        self.plans = LruTtlCache(max_entries=max_calls, ttl_seconds=idle_ttl_seconds)
+
+        self.fetches = 0
+        self.fetch_errors = 0
+        self.fetch_ms = 0.0
+
+    def prefetch(self, call_agent: str, call_id: str) -> asyncio.Task:
+        key = (call_agent, call_id)
+        # every utterance of the call passes here, which also keeps its entry from going idle
+        task = self.plans.get(key)
+        if task is None:
+            task = asyncio.create_task(self._afetch(call_agent, call_id))
+            # nobody may await a prefetch that fails; its error is already logged
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self.plans.set(key, task)
+        return task
+
+    async def aget_plan(self, call_agent: str, call_id: str) -> dict:
+        task = self.prefetch(call_agent, call_id)
+        # a turn that times out must not cancel the lookup the rest of the call shares
+        return await asyncio.shield(task)
+
+    async def _afetch(self, call_agent: str, call_id: str) -> dict:
+        self.fetches += 1
+        start = time.perf_counter()
+        try:
+            return await self.crm_service.aget_plan(call_agent, call_id)
+        except Exception:
+            self.fetch_errors += 1
+            if self.plans.peek((call_agent, call_id)) is asyncio.current_task():
+                self.plans.pop((call_agent, call_id))
+            logger.exception("CRM lookup for call %s failed", call_id)
+            raise
+        finally:
+            self.fetch_ms += (time.perf_counter() - start) * 1000
+
+    def stats(self) -> dict:
+        cache = self.plans.stats()
+        return {
+            "calls": cache["entries"],
+            "hits": cache["hits"],
+            "misses": cache["misses"],
+            "fetches": self.fetches,
+            "fetch_errors": self.fetch_errors,
+            "avg_fetch_ms": self.fetch_ms / self.fetches if self.fetches else 0.0,
+        }
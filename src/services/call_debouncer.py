@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Hashable
+from services.keyed_locks import KeyedLocks
+
+logger = logging.getLogger(__name__)
+
+# process(fragments, begin_commit) -> result; begin_commit() must be called right before the run persists anything
+ProcessFragments = Callable[[list[str], Callable[[], None]], Awaitable]
+
+# a sentence end, optionally followed by closing quotes or brackets
+_COMPLETE = re.compile(r"[.?!\u2026][\"'\u2019\u201d)\]]*\s*$")
+
+
+def looks_complete(fragment: str) -> bool:
+    """Whether a transcribed fragment ends like a finished sentence: "What is my copay?" but not "What is my"."""
+    return bool(_COMPLETE.search(fragment or ""))
+
+
+@dataclass
+class _Batch:
+    fragments: list[str] = field(default_factory=list)
+    result: asyncio.Future = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+    task: asyncio.Task = None
+    process: ProcessFragments = None
+    # the run is past the window, waiting for the call or processing
+    started: bool = False
+    # once the run starts saving it can no longer be cancelled; later fragments start a new batch
+    committing: bool = False
+
+
+class CallDebouncer:
+    """Coalesces fragments of one utterance that arrive for the same call within ``window_seconds``.
+
+    A fragment that does not look complete (no sentence-ending punctuation) restarts the window; a
+    complete one starts the run right away. Either way one run processes every fragment collected so
+    far and all of their requests receive its result. A fragment arriving while that run is still
+    loading or waiting on the model cancels it and the batch is run again with the new fragment; once
+    the run has begun saving it finishes, and the new fragment starts the next batch, which waits for
+    it so the runs of a call never overlap. ``aflush`` runs a call's pending fragments without waiting
+    out the window, for a turn of the other speaker that must be stored after them.
+    """
+
+    def __init__(self, window_seconds: float = 0.3):
+        self.window_seconds = window_seconds
+        self._batches: dict[Hashable, _Batch] = {}
+        # the batches of a call run in order
+        self._locks = KeyedLocks()
+
+        self.fragments = 0
+        self.runs = 0
+        self.runs_cancelled = 0
+        self.flushes = 0
+        self.immediate = 0
+
+    async def asubmit(self, key: Hashable, fragment: str, process: ProcessFragments):
+        self.fragments += 1
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = _Batch()
+            self._batches[key] = batch
+        elif batch.task is not None:
+            # superseded: the run restarts below with this fragment included
+            batch.task.cancel()
+        batch.fragments.append(fragment)
+        batch.process = process
+        batch.started = False
+        delay = self.window_seconds
+        if looks_complete(fragment):
+            # nothing more is expected; a fragment that still follows cancels the run like any other
+            self.immediate += 1
+            delay = 0
+        batch.task = asyncio.create_task(self._arun(key, batch, process, delay))
+        # a request that disconnects must not cancel the run shared with the other fragments
+        return await asyncio.shield(batch.result)
+
+    async def aflush(self, key: Hashable):
+        """Run the call's pending fragments now and wait until that run has finished.
+
+        Fragments submitted from here on start a new batch, so they neither join nor cancel the flushed run.
+        The run's own error is left to the fragments' requests.
+        """
+        batch = self._batches.pop(key, None)
+        if batch is None:
+            return
+        self.flushes += 1
+        if not batch.started:
+            # still in its window
+            batch.task.cancel()
+            batch.task = asyncio.create_task(self._arun(key, batch, batch.process, 0))
+        await asyncio.wait([batch.result])
+
+    async def _arun(self, key: Hashable, batch: _Batch, process: ProcessFragments, delay: float):
+        started = False
+        try:
+            await asyncio.sleep(delay)
+            batch.started = True
+            async with self._locks.hold(key):
+                started = True
+                self.runs += 1
+
+                def begin_commit():
+                    batch.committing = True
+                    if self._batches.get(key) is batch:
+                        del self._batches[key]
+
+                result = await process(list(batch.fragments), begin_commit)
+                if not batch.committing:
+                    begin_commit()
+            batch.result.set_result(result)
+        except asyncio.CancelledError:
+            if started:
+                self.runs_cancelled += 1
+            if batch.committing:
+                # only happens at shutdown; the batch will not be retried
+                batch.result.cancel()
+            raise
+        except Exception as e:
+            if self._batches.get(key) is batch:
+                del self._batches[key]
+            batch.result.set_exception(e)
+            # every fragment's request may already be gone; don't log it as never retrieved
+            batch.result.exception()
+
+    def stats(self) -> dict:
+        return {
+            "window_seconds": self.window_seconds,
+            "fragments": self.fragments,
+            "runs": self.runs,
+            "runs_cancelled": self.runs_cancelled,
+            "flushes": self.flushes,
+            "immediate": self.immediate,
+            # each fragment used to get its own load, completion and save
+            "llm_invocations_saved": self.fragments - self.runs,
+        }
@@ -0,0 +1,283 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from services.chat_history_codec import message_count
+from services.chat_history_cosmos_service import ChatHistoryCosmosService
+from services.lru_ttl_cache import LruTtlCache
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedCall:
+    chat_history: ChatHistory
+    # how many of chat_history.messages are already in Cosmos, and the ETag they were read/written with
+    persisted_count: int
+    etag: str = None
+    # what ChatHistoryCosmosService.aread_version returned for the persisted messages; None when unknown
+    version: str = None
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def dirty(self) -> bool:
+        return len(self.chat_history.messages) > self.persisted_count
+
+
+def estimate_size(call: CachedCall) -> int:
+    # rough in-memory footprint: the serialized size of each message
+    return sum(len(str(msg.to_dict())) for msg in call.chat_history.messages)
+
+
+class CachedChatHistoryService:
+    """Per-process hot cache of active call histories in front of ChatHistoryCosmosService.
+
+    Entries are keyed by (callAgent, callId) and evicted by LRU order, idle TTL and an overall size cap.
+    With ``write_mode="through"`` every save is written to Cosmos before returning; with ``"behind"``
+    saves only update the cache and dirty entries are flushed every ``flush_interval_seconds``, on
+    eviction and at shutdown. Writes carry the ETag of the cached copy, so when another instance changed
+    the call in the meantime the latest history is reloaded and the unpersisted messages re-applied on top.
+    A cached read can miss messages another worker or instance wrote since; they are not lost, because
+    the ETag-conditional write merges them, but the turn's completion does not see them. With
+    ``revalidate`` every cached read first checks the stored call: a conditional point read of the
+    document (a 304 without a body while it is unchanged), or its item count in turns mode.
+    """
+
+    def __init__(
+        self,
+        chat_history_service: ChatHistoryCosmosService,
+        max_calls: int = 1000,
+        idle_ttl_seconds: float = 900,
+        max_bytes: int = None,
+        write_mode: str = "through",
+        flush_interval_seconds: float = 1.0,
+        revalidate: bool = False,
+    ):
+        self.chat_history_service = chat_history_service
+        self.write_mode = (write_mode or "through").strip().lower()
+        if self.write_mode not in ("through", "behind"):
+            raise ValueError(f"Unsupported cache write mode {self.write_mode}; use through or behind")
+        self.flush_interval_seconds = flush_interval_seconds
+        self.revalidate = revalidate
+        self.turns_mode = chat_history_service.history_mode == "turns"
+
+        self.cache = LruTtlCache(
+            max_entries=max_calls,
+            ttl_seconds=idle_ttl_seconds,
+            max_weight=max_bytes,
+            weigher=estimate_size,
+            on_evict=self._on_evict,
+        )
+        self.flushes = 0
+        self.conflicts = 0
+        self.stale_reloads = 0
+
+        self._flush_task: asyncio.Task = None
+        # flushes of evicted entries still in flight, kept referenced until they finish
+        self._eviction_flushes: set[asyncio.Task] = set()
+
+    async def astartup(self):
+        if self.write_mode == "behind":
+            self._flush_task = asyncio.create_task(self._aflush_loop())
+
+    async def aget_chat_history(self, call_agent: str, call_id: str) -> ChatHistory:
+        chat_history, _ = await self.aread_chat_history(call_agent, call_id)
+        return chat_history
+
+    async def aread_chat_history(self, call_agent: str, call_id: str) -> tuple[ChatHistory, str]:
+        """Same shape as ChatHistoryCosmosService.aread_chat_history."""
+        key = (call_agent, call_id)
+        entry = self.cache.get(key)
+        if entry is not None and self.revalidate:
+            entry = await self._arevalidate(key, entry)
+        if entry is None:
+            entry = await self._aload(call_agent, call_id)
+            if entry is None:
+                return None, None
+            self.cache.set(key, entry)
+
+        # callers get their own message list so a failed turn never leaks into the cached copy
+        return ChatHistory(messages=list(entry.chat_history.messages)), entry.etag
+
+    async def _arevalidate(self, key: tuple[str, str], entry: CachedCall) -> CachedCall:
+        """The cached entry while the stored history is unchanged, otherwise the reloaded one (or None to load)."""
+        call_agent, call_id = key
+        reloaded = None
+        if self.turns_mode:
+            version = await self.chat_history_service.aread_version(call_agent, call_id)
+            if version is not None and version == entry.version:
+                return entry
+        elif entry.etag is not None:
+            # a conditional point read: a 304 without a body while unchanged, the new document otherwise
+            modified, chat_history, etag = await self.chat_history_service.aread_chat_history_if_modified(
+                call_agent, call_id, entry.etag
+            )
+            if not modified:
+                return entry
+            if chat_history is not None:
+                reloaded = CachedCall(
+                    chat_history=chat_history, persisted_count=len(chat_history.messages), etag=etag, version=etag
+                )
+
+        # written by another worker or instance since it was cached
+        self.stale_reloads += 1
+        if entry.dirty:
+            # the flush merges the unflushed messages into the stored history before it is reloaded
+            await self._aflush(key, entry)
+            reloaded = None
+        self.cache.pop(key)
+        if reloaded is not None:
+            self.cache.set(key, reloaded)
+        return reloaded
+
+    async def _aload(self, call_agent: str, call_id: str) -> CachedCall:
+        # turn items carry no ETag; the count is read first so a turn appended in between only costs a reload
+        version = await self.chat_history_service.aread_version(call_agent, call_id) if self.turns_mode else None
+        chat_history, etag = await self.chat_history_service.aread_chat_history(call_agent, call_id)
+        if chat_history is None:
+            return None
+        return CachedCall(
+            chat_history=chat_history,
+            persisted_count=len(chat_history.messages),
+            etag=etag,
+            version=version if self.turns_mode else etag,
+        )
+
+    async def asave_chat_history(
+        self, call_agent: str, call_id: str, chat_history: ChatHistory, start_index: int = 0, etag: str = None
+    ):
+        """Add ``chat_history.messages[start_index:]`` to the call; ``etag`` is the one ``aread_chat_history`` returned."""
+        key = (call_agent, call_id)
+        new_messages = chat_history.messages[start_index:]
+
+        entry = self.cache.peek(key)
+        if entry is None and start_index > 0 and etag is None and not self.turns_mode:
+            # evicted while the turn was running, and the caller has no ETag to guard the write with:
+            # start from the stored history so the flush never overwrites another writer's messages
+            latest, etag = await self.chat_history_service.aread_chat_history(call_agent, call_id)
+            base = list(latest.messages) if latest is not None else []
+            entry = CachedCall(
+                chat_history=ChatHistory(messages=base + list(new_messages)), persisted_count=len(base), etag=etag, version=etag
+            )
+        elif entry is None:
+            # new call, or the entry was evicted while the turn was running; the flush is conditional on the
+            # caller's ETag and merges when the call changed since it was read
+            entry = CachedCall(
+                chat_history=ChatHistory(messages=list(chat_history.messages)),
+                persisted_count=start_index,
+                etag=etag,
+                # a new call has no turn items yet
+                version="0" if self.turns_mode and start_index == 0 else None,
+            )
+        else:
+            # appending (rather than replacing) keeps messages saved by an overlapping turn of the same call
+            entry.chat_history.messages.extend(new_messages)
+        self.cache.set(key, entry)
+
+        if self.write_mode == "through":
+            try:
+                await self._aflush(key, entry)
+            except Exception:
+                self.cache.pop(key)
+                raise
+
+    async def aappend_chat_history(
+        self, call_agent: str, call_id: str, chat_history: ChatHistory, start_index: int = 0, etag: str = None
+    ) -> tuple[ChatHistory, dict]:
+        # the cached entry carries its own ETag and merges on flush; the caller's is used when it was evicted
+        await self.asave_chat_history(call_agent, call_id, chat_history, start_index=start_index, etag=etag)
+        return chat_history, None
+
+    async def aappend_message(self, call_agent: str, call_id: str, message: ChatMessageContent):
+        key = (call_agent, call_id)
+        entry = self.cache.peek(key)
+        if entry is None:
+            await self.chat_history_service.aappend_message(call_agent, call_id, message)
+            return
+        if entry.dirty:
+            # earlier messages are still waiting for a write-behind flush; this one goes out with them
+            entry.chat_history.messages.append(message)
+            self.cache.set(key, entry)
+            return
+
+        async with entry.lock:
+            item = await self.chat_history_service.aappend_message(call_agent, call_id, message)
+            if item.get("type") != "turn" and message_count(item["chat"]) != entry.persisted_count + 1:
+                # the document also has messages this process has not seen; reload it next time
+                self.cache.pop(key)
+                return
+            entry.chat_history.messages.append(message)
+            entry.persisted_count += 1
+            entry.etag = item.get("_etag", entry.etag)
+            entry.version = self._next_version(entry)
+        self.cache.set(key, entry)
+
+    async def _aflush(self, key: tuple[str, str], entry: CachedCall):
+        call_agent, call_id = key
+        async with entry.lock:
+            count = len(entry.chat_history.messages)
+            if count <= entry.persisted_count:
+                return
+
+            snapshot = ChatHistory(messages=entry.chat_history.messages[:count])
+            # another instance may have written to this call since it was cached: the save then reloads
+            # the latest history and re-applies our unpersisted messages on top of it
+            persisted, item = await self.chat_history_service.aappend_chat_history(
+                call_agent, call_id, snapshot, start_index=entry.persisted_count, etag=entry.etag
+            )
+            merged = persisted is not snapshot
+            if merged:
+                self.conflicts += 1
+                entry.chat_history = ChatHistory(messages=persisted.messages + entry.chat_history.messages[count:])
+                count = len(persisted.messages)
+
+            entry.persisted_count = count
+            if item is not None:
+                entry.etag = item.get("_etag")
+            # after a merge in turns mode the number of items written by others is not known
+            entry.version = None if merged and self.turns_mode else self._next_version(entry)
+            self.flushes += 1
+
+    def _next_version(self, entry: CachedCall) -> str:
+        """The stored version after this process wrote one more item (turns mode) or document (document mode)."""
+        if not self.turns_mode:
+            return entry.etag
+        return str(int(entry.version) + 1) if entry.version is not None else None
+
+    async def _aflush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            self.cache.expire()
+            await self.aflush_all()
+
+    async def aflush_all(self):
+        for key, entry in self.cache.items():
+            if entry.dirty:
+                try:
+                    await self._aflush(key, entry)
+                except Exception:
+                    logger.exception("write-behind flush of chat history for %s failed; will retry", key[1])
+
+    def _on_evict(self, key: tuple[str, str], entry: CachedCall):
+        if entry.dirty:
+            task = asyncio.get_running_loop().create_task(self._aflush(key, entry))
+            self._eviction_flushes.add(task)
+            task.add_done_callback(self._eviction_flushes.discard)
+
+    def stats(self) -> dict:
+        return {
+            **self.cache.stats(),
+            "write_mode": self.write_mode,
+            "dirty": sum(1 for _, entry in self.cache.items() if entry.dirty),
+            "flushes": self.flushes,
+            "conflicts": self.conflicts,
+            "stale_reloads": self.stale_reloads,
+        }
+
+    async def aclose(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        await self.aflush_all()
+        if self._eviction_flushes:
+            await asyncio.gather(*self._eviction_flushes, return_exceptions=True)
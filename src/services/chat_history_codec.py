@@ -0,0 +1,153 @@
+"""Versioned serializer for the persisted ``chat`` array of a call.
+
+Version 1 is the plain list of ``ChatMessageContent.to_dict()`` dicts written by earlier releases.
+Version 2 wraps a compact form of the same dicts, ``{"v": 2, "m": [...]}``, with short keys and role
+codes, and zlib-compresses large string contents (tool results mostly). Decoding either version
+returns exactly the ``to_dict()`` dicts that were encoded.
+"""
+
+import base64
+import zlib
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.function_call_content import FunctionCallContent
+from semantic_kernel.contents.function_result_content import FunctionResultContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+
+# the format written by default. Readers of every release decode version 1, while only this release and
+# later decode version 2, so version 2 is opt-in until every instance of a deployment can read it
+CODEC_VERSION = 1
+DEFAULT_COMPRESS_THRESHOLD = 1024
+
+ROLE_CODES = {"system": "s", "user": "u", "assistant": "a", "tool": "t"}
+ROLES = {code: role for role, code in ROLE_CODES.items()}
+KEYS = {"content": "c", "tool_call_id": "ti", "name": "n"}
+FIELDS = {short: key for key, short in KEYS.items()}
+
+
+def _encode_tool_call(tool_call: dict) -> dict:
+    function = tool_call.get("function")
+    if (
+        tool_call.keys() == {"id", "type", "function"}
+        and tool_call["type"] == "function"
+        and isinstance(function, dict)
+        and function.keys() == {"name", "arguments"}
+    ):
+        return {"i": tool_call["id"], "n": function["name"], "a": function["arguments"]}
+    # anything unexpected is stored verbatim so it still round-trips
+    return {"raw": tool_call}
+
+
+def _decode_tool_call(tool_call: dict) -> dict:
+    if "raw" in tool_call:
+        return tool_call["raw"]
+    return {"id": tool_call["i"], "type": "function", "function": {"name": tool_call["n"], "arguments": tool_call["a"]}}
+
+
+def encode_message(message: dict, compress_threshold: int = DEFAULT_COMPRESS_THRESHOLD) -> dict:
+    role = message.get("role")
+    encoded = {"r": ROLE_CODES.get(role, role)}
+    extra = {}
+    for key, value in message.items():
+        if key == "role":
+            continue
+        if key == "content" and isinstance(value, str) and compress_threshold and len(value) > compress_threshold:
+            encoded["z"] = base64.b64encode(zlib.compress(value.encode("utf-8"))).decode("ascii")
+        elif key == "tool_calls" and isinstance(value, list):
+            encoded["tc"] = [_encode_tool_call(tool_call) for tool_call in value]
+        elif key in KEYS:
+            encoded[KEYS[key]] = value
+        else:
+            extra[key] = value
+    if extra:
+        encoded["x"] = extra
+    return encoded
+
+
+def decode_message(encoded: dict) -> dict:
+    role = encoded.get("r")
+    message = {"role": ROLES.get(role, role)}
+    for short, value in encoded.items():
+        if short == "z":
+            message["content"] = zlib.decompress(base64.b64decode(value)).decode("utf-8")
+        elif short == "tc":
+            message["tool_calls"] = [_decode_tool_call(tool_call) for tool_call in value]
+        elif short == "x":
+            message.update(value)
+        elif short in FIELDS:
+            message[FIELDS[short]] = value
+    return message
+
+
+def encode_messages(messages: list[dict], version: int = CODEC_VERSION, compress_threshold: int = DEFAULT_COMPRESS_THRESHOLD):
+    if version == 1:
+        return messages
+    if version != 2:
+        raise ValueError(f"Unsupported chat history codec version {version}")
+    return {"v": 2, "m": [encode_message(message, compress_threshold) for message in messages]}
+
+
+def decode_messages(chat) -> list[dict]:
+    if isinstance(chat, list):
+        # version 1: the to_dict() output as written by earlier releases
+        return chat
+    if chat.get("v") == 2:
+        return [decode_message(encoded) for encoded in chat["m"]]
+    raise ValueError(f"Unsupported chat history codec version {chat.get('v')}")
+
+
+def message_count(chat) -> int:
+    """Number of messages in a persisted chat array of any version, without decoding them."""
+    return len(chat) if isinstance(chat, list) else len(chat["m"])
+
+
+def to_chat_history(messages: list[dict]) -> ChatHistory:
+    """Rebuild a ChatHistory from ``to_dict()`` dicts in a single pass."""
+    chat = ChatHistory()
+    # tool call id -> function name, filled as the assistant tool-call messages go by, so each tool
+    # result resolves its function name with a dict lookup instead of scanning every tool call
+    function_names: dict[str, str] = {}
+
+    for msg in messages:
+        role = msg["role"]
+        if role == "system":
+            chat.add_system_message(msg["content"])
+        elif role == "user":
+            chat.add_user_message(msg["content"])
+        elif role == "assistant":
+            if "content" in msg:
+                chat.add_assistant_message(msg["content"])
+            elif "tool_calls" in msg:
+                items = []
+                for func_call in msg["tool_calls"]:
+                    function_names[func_call["id"]] = func_call["function"]["name"]
+                    items.append(
+                        FunctionCallContent(
+                            name=func_call["function"]["name"],
+                            id=func_call["id"],
+                            arguments=func_call["function"]["arguments"],
+                        )
+                    )
+                chat.add_message(ChatMessageContent(role=AuthorRole.ASSISTANT, items=items))
+        elif role == "tool":
+            if "tool_call_id" in msg:
+                chat.add_message(
+                    ChatMessageContent(
+                        role=AuthorRole.TOOL,
+                        items=[
+                            FunctionResultContent(
+                                name=function_names.get(msg["tool_call_id"]),
+                                id=msg["tool_call_id"],
+                                result=msg["content"],
+                            )
+                        ],
+                    )
+                )
+            elif "content" in msg:
+                chat.add_tool_message(msg["content"])
+        else:
+            print(f"skipped {msg} as it is an unhandled role")
+
+    # https://github.com/microsoft/semantic-kernel/issues/7903
+    # return ChatHistory.restore_chat_history(json_chat)
+    return chat
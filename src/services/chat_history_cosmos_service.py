@@ -1,27 +1,167 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from azure.core import MatchConditions
 from azure.cosmos.aio import CosmosClient
-from azure.cosmos import PartitionKey, exceptions
-from azure.identity import DefaultAzureCredential
+from azure.cosmos import PartitionKey, ThroughputProperties, exceptions
+from azure.core.credentials_async import AsyncTokenCredential
 from azure.cosmos.aio import ContainerProxy, DatabaseProxy
 from semantic_kernel.contents.chat_history import ChatHistory
 from semantic_kernel.contents.chat_message_content import ChatMessageContent
 from semantic_kernel.contents.utils.author_role import AuthorRole
-from semantic_kernel.contents.function_call_content import FunctionCallContent
-from semantic_kernel.contents.function_result_content import FunctionResultContent
+from telemetry import record_document_size, stage
+from services.credential_manager import CredentialManager
+from services.chat_history_codec import (
+    CODEC_VERSION,
+    DEFAULT_COMPRESS_THRESHOLD,
+    decode_messages,
+    encode_message,
+    encode_messages,
+    to_chat_history,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PARTITION_KEY_PATH = "/callId"
+
+# document fields a chat history container may be partitioned on, and the call attribute each holds.
+# "PartitionKey" is the original layout (partitioned by call agent) and is still written for compatibility.
+PARTITION_KEY_FIELDS = {
+    "callId": lambda call_agent, call_id: call_id,
+    "callAgent": lambda call_agent, call_id: call_agent,
+    "PartitionKey": lambda call_agent, call_id: call_agent,
+}
+
+
+def parse_partition_key_paths(partition_key_path: str) -> list[str]:
+    # "/callAgent,/callId" configures a hierarchical (MultiHash) key
+    return [path.strip() for path in partition_key_path.split(",") if path.strip()]
+
+
+def partition_key_value(partition_key_paths: list[str], call_agent: str, call_id: str):
+    values = []
+    for path in partition_key_paths:
+        field = path.lstrip("/")
+        if field not in PARTITION_KEY_FIELDS:
+            raise ValueError(
+                f"Unsupported chat history partition key path {path}; supported paths are "
+                f"{', '.join('/' + f for f in PARTITION_KEY_FIELDS)}. "
+                "Use tools/migrate_chat_history.py to copy the data into a correctly partitioned container."
+            )
+        values.append(PARTITION_KEY_FIELDS[field](call_agent, call_id))
+    return values[0] if len(values) == 1 else values
+
+
+def chat_history_document(call_agent: str, call_id: str, chat: list[dict]) -> dict:
+    return {"PartitionKey": call_agent, "callAgent": call_agent, "callId": call_id, "id": call_id, "chat": chat}
+
+
+def chat_turn_document(call_agent: str, call_id: str, start_index: int, chat: list[dict], seq: int = None) -> dict:
+    # one item per persisted turn, holding only the messages added since the previous save. The id is
+    # derived from the position of the turn's first message so saving the same turn twice is idempotent.
+    # Items appended without reading the history first (start_index None) are identified by their sequence.
+    # ``seq`` orders the items of a call; host clocks (``ts``) differ between instances and only order the
+    # items written before the sequence was introduced.
+    ts = time.time_ns()
+    return {
+        "PartitionKey": call_agent,
+        "callAgent": call_agent,
+        "callId": call_id,
+        "id": f"{call_id}:{start_index:06d}" if start_index is not None else f"{call_id}:a{seq:09d}",
+        "type": "turn",
+        "start": start_index if start_index is not None else -1,
+        "seq": seq,
+        "ts": ts,
+        "chat": chat,
+    }
+
+
+def chat_sequence_document(call_agent: str, call_id: str) -> dict:
+    # the per-call counter the sequence numbers of turn items are taken from
+    return {
+        "PartitionKey": call_agent,
+        "callAgent": call_agent,
+        "callId": call_id,
+        "id": f"{call_id}:seq",
+        "type": "sequence",
+        "value": 1,
+    }
+
+
+def turn_order(item: dict) -> tuple:
+    # a whole-document history first, then turn items by sequence; those written before items carried
+    # one come first, by time and then position as they always were
+    seq = item.get("seq")
+    return (item.get("type") == "turn", seq is not None, seq if seq is not None else item.get("ts", 0), item.get("start", 0))
+
+
+class ChatHistoryConflictError(Exception):
+    """Another writer changed the call's history since it was read (ETag mismatch or turn already written)."""
+
+
+@dataclass
+class CosmosOperationMetrics:
+    operation: str
+    request_charge: float
+    duration_ms: float
 
 
 # could potentially clean up this pattern to be more DRY but out of scope this late in the game
 class ChatHistoryCosmosService:
     def __init__(
-        self, endpoint: str, db_name: str, container_name: str, key: str = None
+        self,
+        endpoint: str,
+        db_name: str,
+        container_name: str,
+        key: str = None,
+        partition_key_path: str = DEFAULT_PARTITION_KEY_PATH,
+        throughput_mode: str = "serverless",
+        max_throughput: int = None,
+        history_mode: str = "document",
+        codec_version: int = CODEC_VERSION,
+        compress_threshold: int = DEFAULT_COMPRESS_THRESHOLD,
+        max_write_attempts: int = 4,
+        credential: AsyncTokenCredential = None,
     ):
+        # the app shares its CredentialManager; standalone tools get one of their own, closed with the client
+        self._owned_credential = None
         if key is None or key.strip() == "":
-            credential = DefaultAzureCredential()
+            if credential is None:
+                credential = self._owned_credential = CredentialManager()
             self.cosmos_client = CosmosClient(endpoint, credential=credential)
         else:
             self.cosmos_client = CosmosClient(endpoint, credential=key)
         self.db_name = db_name
         self.container_name = container_name
 
+        # partition key of containers created by this service; an existing container keeps its own
+        # definition, which is read back when the container handle is first resolved
+        self.partition_key_paths = parse_partition_key_paths(partition_key_path or DEFAULT_PARTITION_KEY_PATH)
+        self.throughput_mode = (throughput_mode or "serverless").strip().lower()
+        self.max_throughput = max_throughput
+
+        # "document" rewrites one document per call on every save; "turns" appends one item per turn
+        self.history_mode = (history_mode or "document").strip().lower()
+        if self.history_mode not in ("document", "turns"):
+            raise ValueError(f"Unsupported history mode {self.history_mode}; use document or turns")
+
+        # format of the persisted chat array; every version can always be read back
+        self.codec_version = codec_version
+        self.compress_threshold = compress_threshold
+
+        # the database/container provisioning check runs once; the handles are reused afterwards
+        self._container: ContainerProxy = None
+        self._container_lock = asyncio.Lock()
+
+        # running totals per operation name: count, request charge (RU) and latency
+        self.operation_stats: dict[str, dict[str, float]] = {}
+
+        # writes that lost a race to another writer are merged and retried up to this many writes in total
+        self.max_write_attempts = max(1, max_write_attempts)
+        self.write_conflict_merges = 0
+        self.write_conflicts_unresolved = 0
+
     async def __get_or_create_db__(self, database_name: str) -> DatabaseProxy:
         try:
             database_obj = self.cosmos_client.get_database_client(database_name)
@@ -35,115 +175,356 @@ class ChatHistoryCosmosService:
         self, database_obj: DatabaseProxy, container_name: str
     ) -> ContainerProxy:
         try:
-            todo_items_container = database_obj.get_container_client(container_name)
-            await todo_items_container.read()
-            return todo_items_container
+            container = database_obj.get_container_client(container_name)
+            properties = await container.read()
+            self.partition_key_paths = properties["partitionKey"]["paths"]
+            # fail fast on a layout the service cannot address (e.g. the old /lastName containers)
+            partition_key_value(self.partition_key_paths, "", "")
+            return container
         except exceptions.CosmosResourceNotFoundError:
-            print("Creating container with lastName as partition key")
+            print(f"Creating container with {','.join(self.partition_key_paths)} as partition key")
             return await database_obj.create_container(
                 id=container_name,
-                partition_key=PartitionKey(path="/lastName"),
-                offer_throughput=400,
+                partition_key=self.__partition_key__(),
+                **self.__throughput_options__(),
             )
         except exceptions.CosmosHttpResponseError:
             raise
 
+    def __partition_key__(self) -> PartitionKey:
+        partition_key_value(self.partition_key_paths, "", "")
+        if len(self.partition_key_paths) == 1:
+            return PartitionKey(path=self.partition_key_paths[0])
+        return PartitionKey(path=self.partition_key_paths, kind="MultiHash")
+
+    def __throughput_options__(self) -> dict:
+        if self.throughput_mode == "serverless":
+            # serverless accounts reject provisioned throughput
+            return {}
+        if self.throughput_mode == "autoscale":
+            return {"offer_throughput": ThroughputProperties(auto_scale_max_throughput=self.max_throughput or 1000)}
+        if self.throughput_mode == "manual":
+            return {"offer_throughput": self.max_throughput or 400}
+        raise ValueError(f"Unsupported throughput mode {self.throughput_mode}; use serverless, autoscale or manual")
+
+    def partition_key(self, call_agent: str, call_id: str):
+        return partition_key_value(self.partition_key_paths, call_agent, call_id)
+
+    async def aget_container(self) -> ContainerProxy:
+        if self._container is None:
+            async with self._container_lock:
+                if self._container is None:
+                    db = await self.__get_or_create_db__(self.db_name)
+                    self._container = await self.__get_or_create_container__(db, self.container_name)
+        return self._container
+
+    async def _arun_operation(self, operation: str, func, *args, **kwargs):
+        headers = {}
+        start = time.perf_counter()
+        if "body" in kwargs:
+            record_document_size(operation, kwargs["body"])
+        elif "patch_operations" in kwargs:
+            record_document_size(operation, kwargs["patch_operations"])
+        try:
+            with stage("cosmos", operation=operation) as span:
+                try:
+                    return await func(*args, response_hook=lambda h, _: headers.update(h), **kwargs)
+                finally:
+                    span.set_attribute("cosmos.request_charge", float(headers.get("x-ms-request-charge", 0)))
+        except exceptions.CosmosHttpResponseError as e:
+            headers.update(e.headers or {})
+            raise
+        finally:
+            self._record_operation(
+                CosmosOperationMetrics(
+                    operation=operation,
+                    request_charge=float(headers.get("x-ms-request-charge", 0)),
+                    duration_ms=(time.perf_counter() - start) * 1000,
+                )
+            )
+
+    def _record_operation(self, metrics: CosmosOperationMetrics):
+        logger.info(
+            "cosmos %s: %.2f RU in %.1f ms", metrics.operation, metrics.request_charge, metrics.duration_ms
+        )
+        stats = self.operation_stats.setdefault(
+            metrics.operation, {"count": 0, "request_charge": 0.0, "duration_ms": 0.0}
+        )
+        stats["count"] += 1
+        stats["request_charge"] += metrics.request_charge
+        stats["duration_ms"] += metrics.duration_ms
+
     async def aget_chat_history(self, call_agent: str, call_id: str) -> ChatHistory:
-        db = await self.__get_or_create_db__(self.db_name)
-        container = await self.__get_or_create_container__(db, self.container_name)
-        query = f"SELECT VALUE c.chat FROM c WHERE c.PartitionKey = @partition_key AND c.id = @id"
-        parameters = [
-            {"name": "@partition_key", "value": call_agent},
-            {"name": "@id", "value": call_id},
-        ]
+        chat_history, _ = await self.aread_chat_history(call_agent, call_id)
+        return chat_history
 
-        items = [
-            x async for x in container.query_items(query=query, parameters=parameters)
-        ]
+    async def aread_chat_history(self, call_agent: str, call_id: str) -> tuple[ChatHistory, str]:
+        """Load a call's history together with the ETag to pass back to ``asave_chat_history``.
 
-        if not items:
-            return None
+        Returns ``(None, None)`` for an unknown call. In turns mode the ETag is always None; concurrent
+        appends are detected by the turn item ids instead.
+        """
+        if self.history_mode == "turns":
+            messages, etag = await self._aread_turns(call_agent, call_id), None
+        else:
+            messages, etag = await self._aread_document(call_agent, call_id)
+
+        if messages is None:
+            return None, None
+
+        return to_chat_history(messages), etag
 
-        # how to convert items to ChatHistory object
-        chat = ChatHistory()
+    async def aread_chat_history_if_modified(
+        self, call_agent: str, call_id: str, etag: str
+    ) -> tuple[bool, ChatHistory, str]:
+        """Document mode: reload a call's history only if its document no longer has ``etag``.
 
-        ChatMessageContent(
-            role=AuthorRole.SYSTEM,
-            content="Welcome to the chat",
+        One point read with If-None-Match, answered with a 304 and no body while the document is unchanged.
+        Returns ``(False, None, etag)`` then, otherwise ``(True, history, etag)`` as ``aread_chat_history``
+        would (``(True, None, None)`` for a call that no longer exists).
+        """
+        container = await self.aget_container()
+
+        try:
+            item = await self._arun_operation(
+                "read_chat_history_if_modified",
+                container.read_item,
+                item=call_id,
+                partition_key=self.partition_key(call_agent, call_id),
+                etag=etag,
+                match_condition=MatchConditions.IfModified,
+            )
+        except exceptions.CosmosResourceNotFoundError:
+            return True, None, None
+
+        if not item:
+            # 304 Not Modified
+            return False, None, etag
+        return True, to_chat_history(decode_messages(item["chat"])), item.get("_etag")
+
+    async def aread_version(self, call_agent: str, call_id: str) -> str:
+        """A cheap check of whether the call's stored history changed, or None for an unknown call.
+
+        In document mode this is the document's ETag. In turns mode it is the number of items, since turn
+        items are only ever added.
+        """
+        container = await self.aget_container()
+        if self.history_mode == "turns":
+            query = (
+                "SELECT VALUE COUNT(1) FROM c WHERE (c.id = @id OR c.callId = @id) "
+                "AND (NOT IS_DEFINED(c.type) OR c.type = 'turn')"
+            )
+        else:
+            query = "SELECT VALUE c._etag FROM c WHERE c.id = @id"
+        values = await self._arun_operation(
+            "read_chat_version",
+            self._aquery_items,
+            container,
+            query=query,
+            parameters=[{"name": "@id", "value": call_id}],
+            partition_key=self.partition_key(call_agent, call_id),
         )
+        if not values or not values[0]:
+            return None
+        return str(values[0])
 
-        tool_calls = [m["tool_calls"] for m in items[0] if "tool_calls" in m]
-        tool_call_map = [
-            {"id": item["id"], "name": item["function"]["name"]}
-            for sublist in tool_calls
-            for item in sublist
-        ]
+    async def _aread_document(self, call_agent: str, call_id: str) -> tuple[list[dict], str]:
+        container = await self.aget_container()
 
-        # tool_calls = [m for m in items[0] if "tool_calls" in m]
-        for msg in items[0]:
-            if msg["role"] == "system":
-                chat.add_system_message(msg["content"])
-            elif msg["role"] == "user":
-                chat.add_user_message(msg["content"])
-            elif msg["role"] == "assistant":
-                if "content" in msg:
-                    chat.add_assistant_message(msg["content"])
-                elif "tool_calls" in msg:
-                    chat.add_message(
-                        ChatMessageContent(
-                            role=AuthorRole.ASSISTANT,
-                            items=[
-                                FunctionCallContent(
-                                    name=func_call["function"]["name"],
-                                    id=func_call["id"],
-                                    arguments=func_call["function"]["arguments"],
-                                )
-                                for func_call in msg["tool_calls"]
-                            ],
-                        )
-                    )
-            elif msg["role"] == "tool":
-                if "tool_call_id" in msg:
-                    chat.add_message(
-                        ChatMessageContent(
-                            role=AuthorRole.TOOL,
-                            items=[
-                                FunctionResultContent(
-                                    # find the name from the FunctionCallContent using the id
-                                    name=next(
-                                        (
-                                            record["name"]
-                                            for record in tool_call_map
-                                            if record["id"] == msg["tool_call_id"]
-                                        ),
-                                        None,
-                                    ),
-                                    id=msg["tool_call_id"],
-                                    result=msg["content"],
-                                )
-                            ],
-                        )
-                    )
-                elif "content" in msg:
-                    chat.add_tool_message(msg["content"])
-            else:
-                print(f"skipped {msg} as it is an unhandled role")
+        try:
+            item = await self._arun_operation(
+                "read_chat_history",
+                container.read_item,
+                item=call_id,
+                partition_key=self.partition_key(call_agent, call_id),
+            )
+        except exceptions.CosmosResourceNotFoundError:
+            return None, None
 
-        # https://github.com/microsoft/semantic-kernel/issues/7903
-        # return ChatHistory.restore_chat_history(json_chat)
-        return chat
+        return decode_messages(item["chat"]), item.get("_etag")
+
+    async def _aread_turns(self, call_agent: str, call_id: str) -> list[dict]:
+        container = await self.aget_container()
+
+        # a single-partition query returns the whole-document history written before turns mode was
+        # enabled (id == callId) together with every turn item appended since
+        query = "SELECT * FROM c WHERE c.id = @id OR c.callId = @id"
+        items = await self._arun_operation(
+            "read_chat_turns",
+            self._aquery_items,
+            container,
+            query=query,
+            parameters=[{"name": "@id", "value": call_id}],
+            partition_key=self.partition_key(call_agent, call_id),
+        )
+
+        # the sequence counter of the call shares its partition
+        items = [item for item in items if item.get("type") != "sequence"]
+        if not items:
+            return None
+        items.sort(key=turn_order)
+        return [msg for item in items for msg in decode_messages(item["chat"])]
+
+    @staticmethod
+    async def _aquery_items(container: ContainerProxy, **kwargs) -> list[dict]:
+        return [x async for x in container.query_items(**kwargs)]
 
     async def asave_chat_history(
-        self, call_agent: str, call_id: str, chat_history
-    ) -> bool:
-        db = await self.__get_or_create_db__(self.db_name)
-        container = await self.__get_or_create_container__(db, self.container_name)
+        self, call_agent: str, call_id: str, chat_history, start_index: int = 0, etag: str = None
+    ) -> dict:
+        """Persist the chat history of a call and return the stored item.
+
+        ``start_index`` is the number of messages already persisted (the length of the history when it
+        was loaded, 0 for a new call). In turns mode only the messages from that position on are written.
+        In document mode the whole history is rewritten; when ``etag`` (from ``aread_chat_history``) is
+        given the write only succeeds if the document is unchanged, and a new call's document is only
+        created if nobody else created it first. Either kind of lost race raises ChatHistoryConflictError.
+        """
+        container = await self.aget_container()
+
+        if self.history_mode == "turns":
+            chat = [msg.to_dict() for msg in chat_history.messages[start_index:]]
+            if not chat:
+                return None
+            chat = encode_messages(chat, self.codec_version, self.compress_threshold)
+            seq = await self._anext_sequence(container, call_agent, call_id)
+            return await self._asave_guarded(
+                "save_chat_turn",
+                container.create_item,
+                body=chat_turn_document(call_agent, call_id, start_index, chat, seq),
+            )
 
         # https://github.com/microsoft/semantic-kernel/issues/7903
         chat = [
             msg.to_dict() for msg in chat_history.messages
         ]  # chat_history.serialize()
+        body = chat_history_document(call_agent, call_id, encode_messages(chat, self.codec_version, self.compress_threshold))
 
-        return await container.upsert_item(
-            body={"PartitionKey": call_agent, "id": call_id, "chat": chat}
-        )
+        if etag is not None:
+            return await self._asave_guarded(
+                "save_chat_history",
+                container.upsert_item,
+                body=body,
+                etag=etag,
+                match_condition=MatchConditions.IfNotModified,
+            )
+        if start_index == 0:
+            return await self._asave_guarded("save_chat_history", container.create_item, body=body)
+        return await self._arun_operation("save_chat_history", container.upsert_item, body=body)
+
+    async def aappend_chat_history(
+        self, call_agent: str, call_id: str, chat_history: ChatHistory, start_index: int = 0, etag: str = None
+    ) -> tuple[ChatHistory, dict]:
+        """Persist ``chat_history.messages[start_index:]`` on top of whatever is stored for the call.
+
+        The first write is conditional on ``etag`` (or on the turn/document not existing yet). When another
+        writer got there first, the latest history is reloaded, the new messages are re-applied after it
+        and the write is retried, up to ``max_write_attempts`` writes in total. Returns the history as it
+        was persisted (which includes the other writer's messages after a merge) and the stored item.
+        """
+        new_messages = chat_history.messages[start_index:]
+        for attempt in range(1, self.max_write_attempts + 1):
+            try:
+                item = await self.asave_chat_history(call_agent, call_id, chat_history, start_index=start_index, etag=etag)
+                return chat_history, item
+            except ChatHistoryConflictError:
+                if attempt == self.max_write_attempts:
+                    self.write_conflicts_unresolved += 1
+                    raise
+                self.write_conflict_merges += 1
+                logger.info("chat history for %s changed concurrently; merging (attempt %d)", call_id, attempt)
+                latest, etag = await self.aread_chat_history(call_agent, call_id)
+                if latest is None:
+                    base = []
+                else:
+                    base = list(latest.messages)
+                    if start_index == 0:
+                        # both writers started the call; keep the stored system prompt only
+                        new_messages = [msg for msg in new_messages if msg.role != AuthorRole.SYSTEM]
+                chat_history = ChatHistory(messages=base + list(new_messages))
+                start_index = len(base)
+
+    async def aappend_message(self, call_agent: str, call_id: str, message: ChatMessageContent) -> dict:
+        """Append one message to a call's stored history without reading it first; returns the written item.
+
+        Document mode patches the message onto the end of the document's chat array (creating the document
+        if the call is new); turns mode writes it as its own time-stamped turn item.
+        """
+        container = await self.aget_container()
+        msg = message.to_dict()
+
+        if self.history_mode == "turns":
+            chat = encode_messages([msg], self.codec_version, self.compress_threshold)
+            seq = await self._anext_sequence(container, call_agent, call_id)
+            return await self._arun_operation(
+                "append_chat_message", container.create_item, body=chat_turn_document(call_agent, call_id, None, chat, seq)
+            )
+
+        # the chat array of version 2 documents sits under "m"; version 1 documents are the array itself. Each
+        # patch only applies to its own layout: an "add" to /chat/- on a version 2 document would not fail but
+        # add a "-" property to the object, so a document written by the other codec version fails the filter
+        # (412) and gets the other patch
+        layouts = [
+            ("/chat/m/-", encode_message(msg, self.compress_threshold), "FROM c WHERE IS_DEFINED(c.chat.m)"),
+            ("/chat/-", msg, "FROM c WHERE IS_ARRAY(c.chat)"),
+        ]
+        if self.codec_version == 1:
+            layouts.reverse()
+        partition_key = self.partition_key(call_agent, call_id)
+        for path, value, filter_predicate in layouts:
+            try:
+                return await self._arun_operation(
+                    "append_chat_message",
+                    container.patch_item,
+                    item=call_id,
+                    partition_key=partition_key,
+                    patch_operations=[{"op": "add", "path": path, "value": value}],
+                    filter_predicate=filter_predicate,
+                )
+            except exceptions.CosmosResourceNotFoundError:
+                break
+            except exceptions.CosmosAccessConditionFailedError:
+                continue
+        else:
+            raise ValueError(f"chat history for {call_id} has an unknown layout")
+
+        body = chat_history_document(call_agent, call_id, encode_messages([msg], self.codec_version, self.compress_threshold))
+        try:
+            return await self._arun_operation("append_chat_message", container.create_item, body=body)
+        except exceptions.CosmosResourceExistsError:
+            # created by another writer in the meantime: append to it instead
+            return await self.aappend_message(call_agent, call_id, message)
+
+    async def _anext_sequence(self, container: ContainerProxy, call_agent: str, call_id: str) -> int:
+        """Turns mode: the next number of the call's item sequence, from an atomic increment of its counter item."""
+        partition_key = self.partition_key(call_agent, call_id)
+        try:
+            counter = await self._arun_operation(
+                "next_chat_sequence",
+                container.patch_item,
+                item=f"{call_id}:seq",
+                partition_key=partition_key,
+                patch_operations=[{"op": "incr", "path": "/value", "value": 1}],
+            )
+            return counter["value"]
+        except exceptions.CosmosResourceNotFoundError:
+            pass
+        try:
+            counter = await self._arun_operation(
+                "next_chat_sequence", container.create_item, body=chat_sequence_document(call_agent, call_id)
+            )
+            return counter["value"]
+        except exceptions.CosmosResourceExistsError:
+            # another writer created the counter first
+            return await self._anext_sequence(container, call_agent, call_id)
+
+    async def _asave_guarded(self, operation: str, func, **kwargs) -> dict:
+        try:
+            return await self._arun_operation(operation, func, **kwargs)
+        except (exceptions.CosmosResourceExistsError, exceptions.CosmosAccessConditionFailedError) as e:
+            raise ChatHistoryConflictError(f"chat history for {kwargs['body']['callId']} changed concurrently") from e
+
+    async def aclose(self):
+        await self.cosmos_client.close()
+        if self._owned_credential is not None:
+            await self._owned_credential.close()
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import time
+from azure.core.credentials import AccessToken
+from azure.core.credentials_async import AsyncTokenCredential
+from azure.identity.aio import DefaultAzureCredential
+from telemetry import token_acquisition
+
+logger = logging.getLogger(__name__)
+
+COGNITIVE_SERVICES_SCOPE = "https://cognitiveservices.azure.com/.default"
+
+
+class CredentialManager:
+    """The process's Azure AD credential, with a token cache per scope refreshed ahead of expiry.
+
+    One async credential is shared by the OpenAI and Cosmos clients. The first token of each scope is
+    fetched at startup (``astartup``, and the Cosmos container check). From then on a background task
+    per scope asks for a new token from ``refresh_margin_seconds`` before the cached one expires, every
+    ``retry_seconds`` until it gets one; the credential may keep serving its own cached token for a
+    while. Requests are served from the cache and only fetch a token themselves once it has expired.
+    Implements ``AsyncTokenCredential``, so it can be passed to Azure SDK clients as their credential;
+    their own refresh window (5 minutes before expiry) falls after ours.
+    """
+
+    def __init__(self, credential: AsyncTokenCredential = None, refresh_margin_seconds: float = 600, retry_seconds: float = 30):
+        self.credential = credential or DefaultAzureCredential()
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.retry_seconds = retry_seconds
+        # scopes -> cached token
+        self._tokens: dict[tuple[str, ...], AccessToken] = {}
+        # token requests in progress, so concurrent misses of a scope share one
+        self._fetches: dict[tuple[str, ...], asyncio.Task] = {}
+        self._refresh_tasks: dict[tuple[str, ...], asyncio.Task] = {}
+
+        self.acquisitions = 0
+        self.acquisition_ms = 0.0
+        self.acquisition_errors = 0
+        self.on_demand = 0
+        self.cache_hits = 0
+
+    async def astartup(self, *scopes: str):
+        """Fetch the tokens of ``scopes`` before the first request needs them."""
+        for scope in scopes:
+            await self._aget((scope,), "startup")
+
+    async def get_token(self, *scopes: str, claims: str = None, tenant_id: str = None, **kwargs) -> AccessToken:
+        if claims or tenant_id:
+            # a claims challenge or another tenant needs a token of its own; it is not cached
+            return await self.credential.get_token(*scopes, claims=claims, tenant_id=tenant_id, **kwargs)
+        token = self._tokens.get(scopes)
+        if token is not None and token.expires_on > time.time():
+            self.cache_hits += 1
+            return token
+        self.on_demand += 1
+        return await self._aget(scopes, "on_demand")
+
+    def token_provider(self, scope: str = COGNITIVE_SERVICES_SCOPE):
+        """Async callable returning a bearer token, as the OpenAI client's ``azure_ad_token_provider``."""
+
+        async def aprovide() -> str:
+            return (await self.get_token(scope)).token
+
+        return aprovide
+
+    async def _aget(self, scopes: tuple[str, ...], trigger: str) -> AccessToken:
+        task = self._fetches.get(scopes)
+        if task is None:
+            task = asyncio.create_task(self._afetch(scopes, trigger))
+            self._fetches[scopes] = task
+            task.add_done_callback(lambda _: self._fetches.pop(scopes, None))
+        # a caller giving up must not cancel the fetch other callers share
+        return await asyncio.shield(task)
+
+    async def _afetch(self, scopes: tuple[str, ...], trigger: str) -> AccessToken:
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            token = await self.credential.get_token(*scopes)
+        except Exception:
+            outcome = "error"
+            self.acquisition_errors += 1
+            raise
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            self.acquisitions += 1
+            self.acquisition_ms += duration_ms
+            token_acquisition.record(duration_ms, {"scope": " ".join(scopes), "trigger": trigger, "outcome": outcome})
+        self._tokens[scopes] = token
+        if scopes not in self._refresh_tasks:
+            self._refresh_tasks[scopes] = asyncio.create_task(self._arefresh(scopes))
+        return token
+
+    async def _arefresh(self, scopes: tuple[str, ...]):
+        while True:
+            token = self._tokens[scopes]
+            await asyncio.sleep(max(0.0, token.expires_on - self.refresh_margin_seconds - time.time()))
+            try:
+                refreshed = await self._aget(scopes, "refresh")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # the cached token stays in use until it expires; after that requests fetch their own
+                logger.warning("refreshing the token for %s failed; retrying in %ss", " ".join(scopes), self.retry_seconds, exc_info=True)
+                await asyncio.sleep(self.retry_seconds)
+                continue
+            if refreshed.expires_on <= token.expires_on:
+                # the credential served its own cached token; it renews closer to the expiry
+                await asyncio.sleep(self.retry_seconds)
+
+    async def close(self):
+        for task in self._refresh_tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._refresh_tasks.values(), return_exceptions=True)
+        self._refresh_tasks.clear()
+        await self.credential.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            "scopes": {" ".join(scopes): {"expires_in_s": token.expires_on - now} for scopes, token in self._tokens.items()},
+            "acquisitions": self.acquisitions,
+            "acquisition_errors": self.acquisition_errors,
+            "avg_acquisition_ms": self.acquisition_ms / self.acquisitions if self.acquisitions else 0.0,
+            "cache_hits": self.cache_hits,
+            "on_demand": self.on_demand,
+        }
@@ -20,4 +20,7 @@ class CrmService:
 
     def get_sample_data(self):
         return self.sample_data[0]
-    
+
+    async def aget_plan(self, call_agent: str, call_id: str) -> dict:
+        # plan context of the member on the call; replace with the CRM API lookup
+        return self.get_sample_data()["crm"]["plan"]
@@ -0,0 +1,154 @@
+import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.function_call_content import FunctionCallContent
+from semantic_kernel.contents.function_result_content import FunctionResultContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_HEADER = "Summary of the earlier part of the conversation (older turns condensed, earlier search results omitted):"
+
+
+def estimate_tokens(message: ChatMessageContent) -> int:
+    # ~4 characters per token plus per-message overhead; close enough for budgeting without a tokenizer
+    text = str(message.to_dict())
+    return len(text) // 4 + 4
+
+
+@dataclass
+class HistoryReduction:
+    chat_history: ChatHistory
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def reduced(self) -> bool:
+        return self.tokens_after < self.tokens_before
+
+
+class HistoryReducer(ABC):
+    """Shrinks the chat history sent to the model; the full history is still what gets persisted."""
+
+    @abstractmethod
+    def reduce(self, chat_history: ChatHistory) -> HistoryReduction: ...
+
+
+class TokenBudgetHistoryReducer(HistoryReducer):
+    """Keeps a call's prompt under ``token_budget`` estimated tokens.
+
+    The leading system message(s) and the last ``keep_turns`` customer turns are kept verbatim, except
+    that tool results outside the newest turn are cut to ``tool_result_max_chars`` when needed. Older
+    turns collapse into one summary message holding their customer and assistant utterances (trimmed,
+    oldest lines dropped past ``summary_max_chars``) but none of their tool calls or results, so every
+    tool call that is sent still has its result. Fewer turns are kept verbatim if the budget still
+    cannot be met.
+    """
+
+    def __init__(
+        self,
+        token_budget: int,
+        keep_turns: int = 4,
+        tool_result_max_chars: int = 500,
+        utterance_max_chars: int = 300,
+        summary_max_chars: int = 4000,
+        token_counter: Callable[[ChatMessageContent], int] = estimate_tokens,
+    ):
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.tool_result_max_chars = tool_result_max_chars
+        self.utterance_max_chars = utterance_max_chars
+        self.summary_max_chars = summary_max_chars
+        self.token_counter = token_counter
+
+        self.reductions = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    def reduce(self, chat_history: ChatHistory) -> HistoryReduction:
+        messages = chat_history.messages
+        tokens_before = self._count(messages)
+        if tokens_before <= self.token_budget:
+            return HistoryReduction(chat_history, tokens_before, tokens_before)
+
+        system_end = 0
+        # a summary from an earlier reduction follows the system message(s) but is condensed with the old turns
+        while (
+            system_end < len(messages)
+            and messages[system_end].role == AuthorRole.SYSTEM
+            and not (messages[system_end].content or "").startswith(SUMMARY_HEADER)
+        ):
+            system_end += 1
+        turn_starts = [i for i in range(system_end, len(messages)) if messages[i].role == AuthorRole.USER]
+        if not turn_starts:
+            return HistoryReduction(chat_history, tokens_before, tokens_before)
+
+        candidate, tokens_after = messages, tokens_before
+        for keep in range(min(self.keep_turns, len(turn_starts)), 0, -1):
+            keep_start = turn_starts[-keep]
+            last_turn_start = turn_starts[-1]
+            summary = self._summarize(messages[system_end:keep_start])
+            kept = [
+                self._truncate_tool_result(msg) if i < last_turn_start else msg
+                for i, msg in enumerate(messages[keep_start:], start=keep_start)
+            ]
+            candidate = list(messages[:system_end]) + ([summary] if summary else []) + kept
+            tokens_after = self._count(candidate)
+            if tokens_after <= self.token_budget:
+                break
+
+        self.reductions += 1
+        self.tokens_before += tokens_before
+        self.tokens_after += tokens_after
+        logger.info("history reduced from %d to %d estimated prompt tokens", tokens_before, tokens_after)
+        return HistoryReduction(ChatHistory(messages=candidate), tokens_before, tokens_after)
+
+    def _count(self, messages: list[ChatMessageContent]) -> int:
+        return sum(self.token_counter(msg) for msg in messages)
+
+    def _summarize(self, messages: list[ChatMessageContent]) -> ChatMessageContent:
+        lines = []
+        for msg in messages:
+            # tool calls and their results are dropped together, older answers are represented by their text
+            if any(isinstance(item, (FunctionCallContent, FunctionResultContent)) for item in msg.items):
+                continue
+            if msg.role == AuthorRole.USER:
+                lines.append(f"USER: {self._trim(msg.content, self.utterance_max_chars)}")
+            elif msg.role == AuthorRole.ASSISTANT:
+                lines.append(f"ASSISTANT: {self._trim(msg.content, self.utterance_max_chars)}")
+            elif msg.role == AuthorRole.SYSTEM and msg.content.startswith(SUMMARY_HEADER):
+                # a summary from an earlier reduction: fold its lines into this one
+                lines.extend(msg.content[len(SUMMARY_HEADER):].strip().splitlines())
+        # the summary rolls forward: once it is over its cap the oldest lines fall off first
+        while lines and sum(len(line) + 1 for line in lines) > self.summary_max_chars:
+            lines.pop(0)
+        if not lines:
+            return None
+        return ChatMessageContent(role=AuthorRole.SYSTEM, content="\n".join([SUMMARY_HEADER, *lines]))
+
+    def _truncate_tool_result(self, msg: ChatMessageContent) -> ChatMessageContent:
+        if msg.role != AuthorRole.TOOL:
+            return msg
+        items = [
+            item.model_copy(update={"result": self._trim(str(item.result), self.tool_result_max_chars)})
+            if isinstance(item, FunctionResultContent)
+            else item
+            for item in msg.items
+        ]
+        return msg.model_copy(update={"items": items})
+
+    @staticmethod
+    def _trim(text: str, max_chars: int) -> str:
+        text = text or ""
+        return text if len(text) <= max_chars else text[:max_chars] + "...[truncated]"
+
+    def stats(self) -> dict:
+        return {
+            "token_budget": self.token_budget,
+            "reductions": self.reductions,
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+        }
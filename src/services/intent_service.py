@@ -1,14 +1,135 @@
+import asyncio
+import logging
 import os
+import random
+from opentelemetry import trace
 from semantic_kernel import Kernel
 from semantic_kernel.functions.kernel_arguments import KernelArguments
+from semantic_kernel.functions.kernel_function import KernelFunction
+from services.keyword_intent_classifier import KeywordIntentClassifier
+from services.lru_ttl_cache import LruTtlCache
+from services.openai_scheduler import PRIORITY_BACKGROUND, PRIORITY_CLASSIFICATION, request_priority
+from services.query_normalizer import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# resolved from this file rather than the working directory so it works however the app is started
+PLUGINS_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "plugins")
 
 
 class IntentService:
-    def __init__(self):
-        pass
+    def __init__(
+        self,
+        cache_max_entries: int = 5000,
+        cache_ttl_seconds: float = 3600,
+        local_classifier: KeywordIntentClassifier = None,
+        confidence_threshold: float = 0.6,
+        agreement_sample_rate: float = 0.0,
+    ):
+        # normalized query -> category, shared by every call handled by this process
+        self.cache = LruTtlCache(max_entries=cache_max_entries, ttl_seconds=cache_ttl_seconds)
+        # classifications currently running, so concurrent identical questions share one LLM call
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+        # optional in-process fast path: confident local classifications skip the LLM entirely
+        self.local_classifier = local_classifier
+        self.confidence_threshold = confidence_threshold
+        # fraction of fast-path answers also sent to the LLM in the background to measure agreement
+        self.agreement_sample_rate = agreement_sample_rate
+        self._shadow_checks: set[asyncio.Task] = set()
+
+        self.fast_path = 0
+        self.llm_path = 0
+        self.agreement_checks = 0
+        self.agreements = 0
+
+    def get_category_detector(self, kernel: Kernel) -> KernelFunction:
+        # the prompt plugin is read from disk and parsed once per kernel, not once per classification
+        plugin = kernel.plugins.get("CategoryPlugin")
+        if plugin is None:
+            plugin = kernel.add_plugin(parent_directory=PLUGINS_DIRECTORY, plugin_name="CategoryPlugin")
+        return plugin["CategoryDetector"]
 
     async def determine_intent(self, kernel: Kernel, query):
-        pluginsloc = os.path.join(os.getcwd(), "src", "plugins")
-        category_plugin=kernel.add_plugin(parent_directory=pluginsloc, plugin_name="CategoryPlugin")        
-        category_intent = await kernel.invoke(category_plugin["CategoryDetector"], KernelArguments(input=query))
-        return category_intent.value[0].content
+        key = normalize_query(query)
+        # which path answered, on the span of the intent source (see KnowledgePlugin._afetch)
+        span = trace.get_current_span()
+        category = self.cache.get(key)
+        if category is not None:
+            span.set_attribute("intent.path", "cache")
+            return category
+
+        local_category = None
+        if self.local_classifier is not None:
+            local_category, confidence = self.local_classifier.classify(query)
+            span.set_attribute("intent.local_confidence", confidence)
+            if confidence >= self.confidence_threshold:
+                span.set_attribute("intent.path", "local")
+                self.fast_path += 1
+                if self.agreement_sample_rate and random.random() < self.agreement_sample_rate:
+                    task = asyncio.create_task(self._ashadow_check(kernel, query, key, local_category))
+                    self._shadow_checks.add(task)
+                    task.add_done_callback(self._shadow_checks.discard)
+                return local_category
+
+        span.set_attribute("intent.path", "llm")
+        # the turn's own completion goes first when the deployment is busy
+        with request_priority(PRIORITY_CLASSIFICATION):
+            category = await self._aclassify_with_llm(kernel, query, key)
+        if local_category is not None:
+            self._record_agreement(local_category, category)
+        return category
+
+    async def _aclassify_with_llm(self, kernel: Kernel, query, key: str) -> str:
+        while key in self._in_flight:
+            future = self._in_flight[key]
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # the caller that owned the LLM call was cancelled (e.g. by its source timeout), not us:
+                # join or start another classification instead of surfacing its cancellation
+                if asyncio.current_task().cancelling() or not future.cancelled():
+                    raise
+
+        self.llm_path += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            category_intent = await kernel.invoke(self.get_category_detector(kernel), KernelArguments(input=query))
+            category = category_intent.value[0].content
+            self.cache.set(key, category)
+            future.set_result(category)
+            return category
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # nobody may be waiting on it; don't let asyncio log the exception as never retrieved
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def _ashadow_check(self, kernel: Kernel, query, key: str, local_category: str):
+        try:
+            with request_priority(PRIORITY_BACKGROUND):
+                self._record_agreement(local_category, await self._aclassify_with_llm(kernel, query, key))
+        except Exception:
+            logger.exception("background intent agreement check failed")
+
+    def _record_agreement(self, local_category: str, llm_category: str):
+        self.agreement_checks += 1
+        if local_category.strip().lower() == (llm_category or "").strip().lower():
+            self.agreements += 1
+
+    def stats(self) -> dict:
+        classifications = self.fast_path + self.llm_path
+        return {
+            "cache": self.cache.stats(),
+            "fast_path": self.fast_path,
+            "llm_path": self.llm_path,
+            "fast_path_rate": self.fast_path / classifications if classifications else 0.0,
+            "agreement_checks": self.agreement_checks,
+            "agreement_rate": self.agreements / self.agreement_checks if self.agreement_checks else None,
+        }
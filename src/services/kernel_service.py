@@ -2,8 +2,11 @@ import os
 import logging
 from semantic_kernel import Kernel
 from semantic_kernel.utils.logging import setup_logging
+from semantic_kernel.connectors.ai.chat_completion_client_base import ChatCompletionClientBase
 from semantic_kernel.connectors.ai.open_ai import AzureChatCompletion
 from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.function_call_content import FunctionCallContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
 from plugins.knowledge_plugin import KnowledgePlugin
 from semantic_kernel.connectors.ai.function_choice_behavior import (
     FunctionChoiceBehavior,
@@ -11,38 +14,53 @@ from semantic_kernel.connectors.ai.function_choice_behavior import (
 from semantic_kernel.connectors.ai.open_ai.prompt_execution_settings.azure_chat_prompt_execution_settings import (
     AzureChatPromptExecutionSettings,
 )
-from azure.identity import DefaultAzureCredential
 
+from telemetry import prompt_tokens
 from services.aisearch_service import AiSearchService
 from services.benefits_search_service import BenefitsSearchService
+from services.call_context import CallContextService
+from services.credential_manager import CredentialManager
 from services.intent_service import IntentService
-
-default_credential = DefaultAzureCredential()
+from services.history_reducer import HistoryReducer
+from services.openai_scheduler import OpenAIRequestScheduler, scheduled_async_client
 
 
 class KernelService:
     def __init__(
-        self, deployment: str, endpoint: str, api_version: str, aisearch_service: AiSearchService, benefits_search_service: BenefitsSearchService, intent_service: IntentService, key: str = None
+        self, deployment: str, endpoint: str, api_version: str, aisearch_service: AiSearchService, benefits_search_service: BenefitsSearchService, intent_service: IntentService, key: str = None, history_reducer: HistoryReducer = None, source_timeouts: dict[str, float] = None, call_context: CallContextService = None, chat_completion: ChatCompletionClientBase = None, scheduler: OpenAIRequestScheduler = None, credentials: CredentialManager = None
     ):
         self.kernel = Kernel()
+        self.history_reducer = history_reducer
         service_id = "azure_oai"
-        if key is None or key.strip() == "":
-            credential = DefaultAzureCredential()
-            token = credential.get_token("https://cognitiveservices.azure.com/.default")
-            self.chat_completion = AzureChatCompletion(
-                service_id=service_id,
-                deployment_name=deployment,
-                endpoint=endpoint,
-                api_key=token.token,
-                api_version=api_version,
-            )
+        # a chat completion service passed in (e.g. the benchmarks' scripted model) is closed by its owner
+        self._owns_chat_completion = chat_completion is None
+        if chat_completion is not None:
+            self.chat_completion = chat_completion
         else:
+            auth = {"api_key": key}
+            if key is None or key.strip() == "":
+                if credentials is None:
+                    raise ValueError("Azure OpenAI needs an API key or a CredentialManager")
+                # tokens come from the shared cache, which refreshes them before they expire
+                auth = {"ad_token_provider": credentials.token_provider()}
+            async_client = None
+            if scheduler is not None:
+                # every request to the deployment waits for admission, including each tool-calling round trip
+                async_client = scheduled_async_client(
+                    scheduler,
+                    azure_endpoint=endpoint,
+                    azure_deployment=deployment,
+                    api_version=api_version,
+                    api_key=auth.get("api_key"),
+                    azure_ad_token_provider=auth.get("ad_token_provider"),
+                )
             self.chat_completion = AzureChatCompletion(
                 service_id=service_id,
                 deployment_name=deployment,
                 endpoint=endpoint,
-                api_key=key,
                 api_version=api_version,
+                async_client=async_client,
+                **auth,
             )
         self.kernel.add_service(self.chat_completion)
 
@@ -52,7 +70,8 @@ class KernelService:
 
         # Add a plugin (the LightsPlugin class is defined below)
         #self.kernel.add_plugin(LightsPlugin(context_service=context_service), "Lights")
-        self.kernel.add_plugin(KnowledgePlugin(kernel=self.kernel, aisearch_service=aisearch_service, benefits_search_service=benefits_search_service, intent_service=intent_service), "KnowledgePlugin")
+        self.knowledge_plugin = KnowledgePlugin(kernel=self.kernel, aisearch_service=aisearch_service, benefits_search_service=benefits_search_service, intent_service=intent_service, source_timeouts=source_timeouts, call_context=call_context)
+        self.kernel.add_plugin(self.knowledge_plugin, "KnowledgePlugin")
        
         # Add a prompt plugin from folder
         # plugins_directory = os.getcwd() + "\\src\\plugins"
@@ -89,11 +108,63 @@ class KernelService:
             FunctionChoiceBehavior.Auto()
         )  # filter out plugins that are not to be used automatically
 
-    async def achat(self, chat_history: ChatHistory):
+    def _prompt_history(self, chat_history: ChatHistory, instructions: str = None) -> ChatHistory:
+        # send a compacted copy of long histories; the full history is what gets persisted
+        prompt_history = chat_history
+        if self.history_reducer is not None:
+            prompt_history = self.history_reducer.reduce(chat_history).chat_history
+        if instructions:
+            # turn-specific guidance is sent with this completion only
+            if prompt_history is chat_history:
+                prompt_history = ChatHistory(messages=list(chat_history.messages))
+            prompt_history.add_system_message(instructions)
+        return prompt_history
+
+    async def achat(self, chat_history: ChatHistory, instructions: str = None):
+        prompt_history = self._prompt_history(chat_history, instructions)
+        sent_count = len(prompt_history.messages)
+
         result = await self.chat_completion.get_chat_message_content(
-            chat_history=chat_history,
+            chat_history=prompt_history,
             settings=self.execution_settings,
             kernel=self.kernel,
         )
 
+        if prompt_history is not chat_history:
+            # auto function calling appended its tool call and result messages to the copy
+            chat_history.messages.extend(prompt_history.messages[sent_count:])
+
+        usage = result.metadata.get("usage") if result is not None else None
+        if usage is not None:
+            logging.getLogger(__name__).info("prompt tokens reported by the model: %s", usage.prompt_tokens)
+            prompt_tokens.record(usage.prompt_tokens)
+
         return result
+
+    async def astream_chat(self, chat_history: ChatHistory, instructions: str = None):
+        """Stream the answer text of a completion, running tool calls as they are requested.
+
+        Tool call and tool result messages are added to ``chat_history`` like ``achat`` does; the final
+        answer is not, the caller adds it once the stream has ended.
+        """
+        prompt_history = self._prompt_history(chat_history, instructions)
+        sent_count = len(prompt_history.messages)
+
+        async for messages in self.chat_completion.get_streaming_chat_message_contents(
+            chat_history=prompt_history,
+            settings=self.execution_settings,
+            kernel=self.kernel,
+        ):
+            for msg in messages:
+                # skip tool call deltas and the tool results the auto function calling loop streams back
+                if msg.role != AuthorRole.ASSISTANT or any(isinstance(item, FunctionCallContent) for item in msg.items):
+                    continue
+                if msg.content:
+                    yield msg.content
+
+        if prompt_history is not chat_history:
+            chat_history.messages.extend(prompt_history.messages[sent_count:])
+
+    async def aclose(self):
+        if self._owns_chat_completion:
+            await self.chat_completion.client.close()
@@ -0,0 +1,106 @@
+import math
+import os
+import re
+from collections import Counter
+from services.query_normalizer import normalize_query
+
+CATEGORY_DETECTOR_PROMPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "plugins", "CategoryPlugin", "CategoryDetector", "skprompt.txt"
+)
+
+STOP_WORDS = set(
+    """a about also an and any are as at be been but by can could do does for from get have help how i id if im
+    in into is it its ive just know like me my need of on or our please so tell that the their them there these
+    this to up us want was we what when where which who why will with would you your""".split()
+)
+
+_CATEGORY_HEADER = re.compile(r"^\s*([A-Z][A-Za-z]+)\s*:\s*(.*)$")
+_EXAMPLE = re.compile(r"Input:\s*(.+?)\n\s*\n\s*([A-Z][A-Za-z]+)\s*\n", re.S)
+_QUOTED = re.compile(r'"([^"]+)"')
+
+
+def _stem(word: str) -> str:
+    # crude plural folding so "claims"/"claim" and "benefits"/"benefit" share a feature
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> list[str]:
+    words = [_stem(word) for word in normalize_query(text).split() if word not in STOP_WORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def parse_category_prompt(prompt: str) -> tuple[dict[str, list[str]], list[tuple[str, str]]]:
+    """Extract {category: [keyword phrases]} and [(example input, category)] from the CategoryDetector prompt."""
+    vocabulary: dict[str, list[str]] = {}
+    keywords_section = prompt.split("Here are key words", 1)[-1].split("ONLY RETURN", 1)[0]
+    current = None
+    for line in keywords_section.splitlines()[1:]:
+        header = _CATEGORY_HEADER.match(line)
+        if header:
+            current = header.group(1)
+            vocabulary[current] = []
+            line = header.group(2)
+        if current is None or not line.strip():
+            continue
+        # Conversation is described in prose; its quoted phrases are the useful keywords
+        phrases = _QUOTED.findall(line) or line.split(",")
+        vocabulary[current].extend(phrase.strip(" .") for phrase in phrases if phrase.strip(" ."))
+    examples = [(text.strip(), category) for text, category in _EXAMPLE.findall(prompt) if category in vocabulary]
+    return vocabulary, examples
+
+
+class KeywordIntentClassifier:
+    """In-process TF-IDF classifier over the CategoryDetector keyword vocabulary and few-shot examples.
+
+    Each category is one sparse, L2-normalized TF-IDF vector of unigram and bigram features built from its
+    keyword phrases and examples. A query is scored by cosine similarity against every category and the
+    confidence is the softmax probability of the best one, so it is high only when one category clearly wins.
+    """
+
+    def __init__(self, vocabulary: dict[str, list[str]], examples: list[tuple[str, str]] = (), sharpness: float = 12.0):
+        self.sharpness = sharpness
+        documents: dict[str, Counter] = {category: Counter() for category in vocabulary}
+        for category, phrases in vocabulary.items():
+            for phrase in phrases:
+                documents[category].update(tokenize(phrase))
+        for text, category in examples:
+            documents[category].update(tokenize(text))
+
+        document_frequency = Counter(feature for counts in documents.values() for feature in counts)
+        category_count = len(documents)
+        self.idf = {feature: math.log((1 + category_count) / (1 + df)) + 1 for feature, df in document_frequency.items()}
+        self.category_vectors = {category: self._normalize(self._weigh(counts)) for category, counts in documents.items()}
+
+    @classmethod
+    def from_prompt_file(cls, path: str = CATEGORY_DETECTOR_PROMPT, **kwargs) -> "KeywordIntentClassifier":
+        with open(path, encoding="utf-8") as f:
+            vocabulary, examples = parse_category_prompt(f.read())
+        return cls(vocabulary, examples, **kwargs)
+
+    def _weigh(self, counts: Counter) -> dict[str, float]:
+        return {feature: (1 + math.log(count)) * self.idf[feature] for feature, count in counts.items() if feature in self.idf}
+
+    @staticmethod
+    def _normalize(vector: dict[str, float]) -> dict[str, float]:
+        norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+        return {feature: weight / norm for feature, weight in vector.items()} if norm else {}
+
+    def scores(self, text: str) -> dict[str, float]:
+        query = self._normalize(self._weigh(Counter(tokenize(text))))
+        return {
+            category: sum(weight * vector.get(feature, 0.0) for feature, weight in query.items())
+            for category, vector in self.category_vectors.items()
+        }
+
+    def classify(self, text: str) -> tuple[str, float]:
+        """Return (category, confidence in [0, 1]); confidence is 0 when no known feature matched."""
+        scores = self.scores(text)
+        best = max(scores, key=scores.get)
+        if scores[best] <= 0:
+            return best, 0.0
+        exps = {category: math.exp(self.sharpness * score) for category, score in scores.items()}
+        return best, exps[best] / sum(exps.values())
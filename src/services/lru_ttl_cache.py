@@ -0,0 +1,124 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class LruTtlCache:
+    """Bounded in-process cache with least-recently-used and idle-TTL eviction.
+
+    ``max_entries`` caps the number of entries and ``max_weight`` (optional) caps the sum of the
+    entries' weights as computed by ``weigher`` (e.g. an estimated size in bytes). An entry that has
+    not been read or written for ``ttl_seconds`` is expired. ``on_evict(key, value)`` is called for
+    every entry removed by eviction or expiry, but not for explicit ``pop``/``clear``.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float = None,
+        max_weight: int = None,
+        weigher: Callable[[Any], int] = None,
+        on_evict: Callable[[Hashable, Any], None] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_weight = max_weight
+        self.weigher = weigher or (lambda value: 1)
+        self.on_evict = on_evict
+
+        # key -> [value, weight, last access time]; ordered from least to most recently used
+        self._entries: OrderedDict[Hashable, list] = OrderedDict()
+        self.weight = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries and not self._is_expired(self._entries[key])
+
+    def get(self, key: Hashable, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        if self._is_expired(entry):
+            self._remove(key, expired=True)
+            self.misses += 1
+            return default
+        entry[2] = time.monotonic()
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def peek(self, key: Hashable, default=None):
+        """Look up an entry without touching its recency, expiry or the hit/miss counters."""
+        entry = self._entries.get(key)
+        if entry is None or self._is_expired(entry):
+            return default
+        return entry[0]
+
+    def set(self, key: Hashable, value):
+        if key in self._entries:
+            self.weight -= self._entries.pop(key)[1]
+        weight = self.weigher(value)
+        self._entries[key] = [value, weight, time.monotonic()]
+        self.weight += weight
+        self._enforce_limits()
+
+    def pop(self, key: Hashable, default=None):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return default
+        self.weight -= entry[1]
+        return entry[0]
+
+    def clear(self):
+        self._entries.clear()
+        self.weight = 0
+
+    def items(self) -> list[tuple[Hashable, Any]]:
+        return [(key, entry[0]) for key, entry in self._entries.items()]
+
+    def expire(self):
+        """Evict every idle entry now instead of waiting for it to be looked up."""
+        if self.ttl_seconds is None:
+            return
+        for key in [key for key, entry in self._entries.items() if self._is_expired(entry)]:
+            self._remove(key, expired=True)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "weight": self.weight,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _is_expired(self, entry: list) -> bool:
+        return self.ttl_seconds is not None and time.monotonic() - entry[2] > self.ttl_seconds
+
+    def _enforce_limits(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries
+            or (self.max_weight is not None and self.weight > self.max_weight and len(self._entries) > 1)
+        ):
+            self._remove(next(iter(self._entries)), expired=False)
+
+    def _remove(self, key: Hashable, expired: bool):
+        value, weight, _ = self._entries.pop(key)
+        self.weight -= weight
+        if expired:
+            self.expirations += 1
+        else:
+            self.evictions += 1
+        if self.on_evict is not None:
+            self.on_evict(key, value)
@@ -0,0 +1,332 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+import httpx
+import openai
+from openai import AsyncAzureOpenAI
+from telemetry import openai_queue_depth, openai_queue_wait
+
+logger = logging.getLogger(__name__)
+
+# lower runs first: the tool-calling turn an advocate is waiting on, then classifications, then shadow checks
+PRIORITY_COMPLETION = 0
+PRIORITY_CLASSIFICATION = 1
+PRIORITY_BACKGROUND = 2
+PRIORITY_NAMES = {PRIORITY_COMPLETION: "completion", PRIORITY_CLASSIFICATION: "classification", PRIORITY_BACKGROUND: "background"}
+
+# priority of the model requests made by the current task; IntentService and QuestionGate lower it
+current_priority: ContextVar[int] = ContextVar("current_priority", default=PRIORITY_COMPLETION)
+
+
+@contextmanager
+def request_priority(priority: int):
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+class RequestShedError(openai.OpenAIError):
+    """A model request waited in the queue past ``max_queue_seconds`` and was dropped unsent."""
+
+
+def was_shed(error: BaseException) -> bool:
+    # Semantic Kernel wraps the client's errors in its own exceptions
+    while error is not None:
+        if isinstance(error, RequestShedError):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class TokenBucket:
+    """``per_minute`` units refilled continuously, up to a minute's worth; 0 disables the limit."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_seconds(self, amount: float, now: float) -> float:
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        # a request larger than the whole budget runs once the bucket is full
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) * 60 / self.capacity
+
+    def take(self, amount: float, now: float):
+        if self.capacity:
+            self._refill(now)
+            self.level -= min(amount, self.capacity)
+
+    def observe_remaining(self, remaining: float, now: float):
+        # the service's count includes the other workers and instances sharing the deployment
+        if self.capacity:
+            self._refill(now)
+            self.level = min(self.level, remaining)
+
+
+class _Waiter:
+    def __init__(self, priority: int, tokens: int, enqueued_at: float, future: asyncio.Future):
+        self.priority = priority
+        self.tokens = tokens
+        self.enqueued_at = enqueued_at
+        self.future = future
+        self.shed_handle: asyncio.TimerHandle = None
+
+
+class OpenAIRequestScheduler:
+    """Process-wide admission control for the requests sent to the chat deployment.
+
+    A request is admitted once fewer than ``max_concurrency`` are in flight and the request and token
+    budgets (per minute, as assigned to the deployment) have room for it; until then it waits in a
+    priority queue, so main completions overtake intent and question classifications. A ``retry-after``
+    from a throttled response pauses every admission for that long and the request is queued again, at
+    most ``max_throttle_retries`` times. The ``x-ratelimit-remaining-*`` headers of every response
+    bring the local budgets down to what the service reports. Requests still queued after
+    ``max_queue_seconds`` (including the time spent throttled) are shed: the advocate has moved on by then.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 32,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        max_queue_seconds: float = 10,
+        max_throttle_retries: int = 3,
+    ):
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_queue_seconds = max_queue_seconds
+        self.max_throttle_retries = max_throttle_retries
+
+        self._queue: list[tuple[int, int, _Waiter]] = []
+        self._sequence = itertools.count()
+        self._wakeup: asyncio.TimerHandle = None
+        self.paused_until = 0.0
+        self.in_flight = 0
+
+        self.queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.admitted = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.shed = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.wait_ms = {name: 0.0 for name in PRIORITY_NAMES.values()}
+        self.throttled = 0
+
+    async def aacquire(self, tokens: int, priority: int = None, enqueued_at: float = None):
+        """Wait for a slot for a request of about ``tokens`` tokens; ``release`` it when the response is done."""
+        priority = current_priority.get() if priority is None else priority
+        enqueued_at = time.monotonic() if enqueued_at is None else enqueued_at
+        future = asyncio.get_running_loop().create_future()
+        waiter = _Waiter(priority, tokens, enqueued_at, future)
+        heapq.heappush(self._queue, (priority, next(self._sequence), waiter))
+        self._enter_queue(waiter)
+        self._dispatch()
+        if not future.done():
+            waiter.shed_handle = asyncio.get_running_loop().call_later(
+                max(0.0, enqueued_at + self.max_queue_seconds - time.monotonic()), self._shed, waiter
+            )
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # admitted just as the caller gave up
+                self.release()
+            elif not future.done():
+                future.cancel()
+                self._leave_queue(waiter, "cancelled")
+            raise
+        finally:
+            if waiter.shed_handle is not None:
+                waiter.shed_handle.cancel()
+
+    def release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def throttle(self, retry_after_seconds: float):
+        self.throttled += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + retry_after_seconds)
+        logger.warning("chat deployment throttled; holding requests for %.1f s", retry_after_seconds)
+
+    def observe_headers(self, headers: httpx.Headers):
+        now = time.monotonic()
+        for bucket, header in ((self.requests, "x-ratelimit-remaining-requests"), (self.tokens, "x-ratelimit-remaining-tokens")):
+            value = headers.get(header)
+            if value is not None:
+                try:
+                    bucket.observe_remaining(float(value), now)
+                except ValueError:
+                    pass
+
+    def _enter_queue(self, waiter: _Waiter):
+        name = PRIORITY_NAMES[waiter.priority]
+        self.queued[name] += 1
+        openai_queue_depth.add(1, {"priority": name})
+
+    def _leave_queue(self, waiter: _Waiter, outcome: str):
+        name = PRIORITY_NAMES[waiter.priority]
+        self.queued[name] -= 1
+        openai_queue_depth.add(-1, {"priority": name})
+        waited_ms = (time.monotonic() - waiter.enqueued_at) * 1000
+        openai_queue_wait.record(waited_ms, {"priority": name, "outcome": outcome})
+        if outcome == "admitted":
+            self.admitted[name] += 1
+            self.wait_ms[name] += waited_ms
+
+    def _shed(self, waiter: _Waiter):
+        if waiter.future.done():
+            return
+        name = PRIORITY_NAMES[waiter.priority]
+        self.shed[name] += 1
+        self._leave_queue(waiter, "shed")
+        waiter.future.set_exception(RequestShedError(f"{name} request shed after {self.max_queue_seconds} s in the queue"))
+        # the shed waiter may have been the one holding up the rest
+        self._dispatch()
+
+    def _admission_delay(self, tokens: int, now: float) -> float:
+        """Seconds until a request can be admitted, or None while it waits for a request to finish."""
+        if self.max_concurrency and self.in_flight >= self.max_concurrency:
+            return None
+        return max(self.paused_until - now, self.requests.wait_seconds(1, now), self.tokens.wait_seconds(tokens, now))
+
+    def _dispatch(self):
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        now = time.monotonic()
+        while self._queue:
+            waiter = self._queue[0][2]
+            if waiter.future.done():
+                # shed or cancelled
+                heapq.heappop(self._queue)
+                continue
+            delay = self._admission_delay(waiter.tokens, now)
+            if delay is None:
+                return
+            if delay > 0:
+                # strict priority: nothing overtakes the head of the queue
+                self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._queue)
+            self.in_flight += 1
+            self.requests.take(1, now)
+            self.tokens.take(waiter.tokens, now)
+            self._leave_queue(waiter, "admitted")
+            waiter.future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": dict(self.queued),
+            "admitted": dict(self.admitted),
+            "shed": dict(self.shed),
+            "avg_wait_ms": {
+                name: self.wait_ms[name] / self.admitted[name] if self.admitted[name] else 0.0 for name in self.admitted
+            },
+            "throttled": self.throttled,
+            "paused_for_s": max(0.0, self.paused_until - time.monotonic()),
+        }
+
+
+def estimate_request_tokens(request: httpx.Request) -> int:
+    # roughly four bytes of the JSON body per prompt token, plus the completion the request reserves
+    tokens = len(request.content) // 4
+    try:
+        body = json.loads(request.content)
+        tokens += int(body.get("max_completion_tokens") or body.get("max_tokens") or 0)
+    except (ValueError, AttributeError, TypeError):
+        pass
+    return tokens
+
+
+def _retry_after_seconds(headers: httpx.Headers) -> float:
+    for header, scale in (("retry-after-ms", 1000), ("retry-after", 1)):
+        value = headers.get(header)
+        if value is not None:
+            try:
+                return float(value) / scale
+            except ValueError:
+                pass
+    return 1.0
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that gives the scheduler slot back once it has been read or closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self.stream = stream
+        self.release = release
+        self.released = False
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            if not self.released:
+                self.released = True
+                self.release()
+
+
+class ScheduledTransport(httpx.AsyncBaseTransport):
+    """httpx transport that sends every request through the scheduler; throttled requests are queued again.
+
+    Only 429s are handled here. The client's own retries still cover timeouts, connection errors and
+    5xx responses, and each of them is admitted by the scheduler again. A 429 that is still throttled
+    after ``max_throttle_retries`` is marked ``x-should-retry: false``, so the client does not retry
+    it again on top of the scheduler's retries.
+    """
+
+    def __init__(self, scheduler: OpenAIRequestScheduler, transport: httpx.AsyncBaseTransport = None):
+        self.scheduler = scheduler
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        tokens = estimate_request_tokens(request)
+        enqueued_at = time.monotonic()
+        for attempt in itertools.count():
+            await self.scheduler.aacquire(tokens, enqueued_at=enqueued_at)
+            try:
+                response = await self.transport.handle_async_request(request)
+            except BaseException:
+                self.scheduler.release()
+                raise
+            self.scheduler.observe_headers(response.headers)
+            headers = response.headers
+            if response.status_code == 429:
+                if attempt < self.scheduler.max_throttle_retries:
+                    await response.aclose()
+                    self.scheduler.release()
+                    self.scheduler.throttle(_retry_after_seconds(response.headers))
+                    continue
+                headers = headers.copy()
+                headers["x-should-retry"] = "false"
+            return httpx.Response(
+                status_code=response.status_code,
+                headers=headers,
+                stream=_ReleasingStream(response.stream, self.scheduler.release),
+                extensions=response.extensions,
+            )
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def scheduled_async_client(scheduler: OpenAIRequestScheduler, **client_args) -> AsyncAzureOpenAI:
+    """Azure OpenAI client whose requests go through ``scheduler``, which also takes over its 429 retries."""
+    return AsyncAzureOpenAI(http_client=httpx.AsyncClient(transport=ScheduledTransport(scheduler)), **client_args)
@@ -0,0 +1,16 @@
+import re
+import unicodedata
+
+# spoken filler that does not change what is being asked
+FILLER_WORDS = {"um", "umm", "uh", "uhh", "er", "ah", "hmm", "please", "okay", "ok", "so", "well"}
+
+_JOINERS = re.compile(r"['’-]")
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a question used as a cache key: "How much is my co-pay, please?" -> "how much is my copay"."""
+    text = unicodedata.normalize("NFKC", query or "").lower()
+    text = _JOINERS.sub("", text)
+    words = _NON_WORD.sub(" ", text).split()
+    return " ".join(word for word in words if word not in FILLER_WORDS)
@@ -0,0 +1,151 @@
+import logging
+import os
+import re
+import unicodedata
+from semantic_kernel import Kernel
+from semantic_kernel.functions.kernel_arguments import KernelArguments
+from services.keyword_intent_classifier import KeywordIntentClassifier
+from services.openai_scheduler import PRIORITY_CLASSIFICATION, request_priority
+
+logger = logging.getLogger(__name__)
+
+PLUGINS_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "plugins")
+
+QUESTION = "question"
+NO_QUESTION = "no_question"
+UNCERTAIN = "uncertain"
+
+GATE_MODES = ("off", "shadow", "heuristic", "llm")
+
+INTERROGATIVES = {
+    "what", "how", "why", "when", "where", "which", "who", "whom", "whose",
+    "can", "could", "would", "will", "should", "may", "might", "shall",
+    "do", "does", "did", "is", "are", "am", "was", "were", "have", "has",
+}
+# statements that still ask for something: "I want to know if...", "I'm having trouble with..."
+NEED_PHRASES = (
+    "want to know", "need to know", "like to know", "wondering", "wonder if", "question about", "question on",
+    "questions about", "tell me", "find out", "help me", "help with", "looking for", "not sure", "dont know",
+    "do not know", "dont understand", "confused", "trouble", "problem", "issue with", "explain", "i need",
+    "i want", "id like", "i would like", "how much", "how many",
+)
+# leading words that do not change whether a clause is a question: "so, how much...", "and what about..."
+LEADING_WORDS = {"and", "but", "so", "also", "then", "oh", "um", "umm", "uh", "uhh", "er", "ah", "hmm", "well", "okay", "ok", "alright"}
+
+_CLAUSE_BREAK = re.compile(r"[.!;,:\n]+")
+_NON_WORD = re.compile(r"[^a-z0-9 ]+")
+
+
+def _clauses(utterance: str) -> list[list[str]]:
+    text = unicodedata.normalize("NFKC", utterance or "").lower().replace("’", "'")
+    clauses = []
+    for clause in _CLAUSE_BREAK.split(text):
+        words = _NON_WORD.sub("", clause.replace("'", "")).split()
+        while words and words[0] in LEADING_WORDS:
+            words.pop(0)
+        if words:
+            clauses.append(words)
+    return clauses
+
+
+def heuristic_verdict(utterance: str, classifier: KeywordIntentClassifier = None, min_words: int = 3) -> str:
+    """Local first tier: QUESTION, NO_QUESTION, or UNCERTAIN when only intent keywords hint at a need."""
+    if "?" in (utterance or ""):
+        return QUESTION
+    clauses = _clauses(utterance)
+    words = [word for clause in clauses for word in clause]
+    if len(words) < min_words:
+        return NO_QUESTION
+    if any(clause[0] in INTERROGATIVES for clause in clauses):
+        return QUESTION
+    text = " " + " ".join(words) + " "
+    if any(f" {phrase} " in text for phrase in NEED_PHRASES):
+        return QUESTION
+    if classifier is not None:
+        category, confidence = classifier.classify(utterance)
+        if category != "Conversation" and confidence > 0:
+            return UNCERTAIN
+    # a plain statement without any benefits vocabulary: introductions, thanks, member ids...
+    return NO_QUESTION
+
+
+class QuestionGate:
+    """Decides whether a customer utterance needs the full tool-calling completion.
+
+    Local heuristics run first. In ``llm`` mode, utterances they are unsure about are sent alone (no
+    transcript) to the QuestionDetector prompt; in ``heuristic`` mode they are let through. ``shadow``
+    mode never skips a turn but records what the gate would have done, so false negatives can be
+    measured against the real completions before the gate is switched on.
+    """
+
+    def __init__(self, mode: str = "shadow", kernel: Kernel = None, classifier: KeywordIntentClassifier = None, min_words: int = 3):
+        self.mode = (mode or "off").strip().lower()
+        if self.mode not in GATE_MODES:
+            raise ValueError(f"Unsupported question gate mode {self.mode}; use one of {', '.join(GATE_MODES)}")
+        if self.mode == "llm" and kernel is None:
+            raise ValueError("The llm question gate mode needs a kernel")
+        self.kernel = kernel
+        self.classifier = classifier
+        self.min_words = min_words
+
+        self.evaluated = 0
+        self.skipped_by_heuristic = 0
+        self.skipped_by_llm = 0
+        self.llm_checks = 0
+        self.shadow_skips = 0
+        self.shadow_false_negatives = 0
+
+    @property
+    def enforcing(self) -> bool:
+        return self.mode in ("heuristic", "llm")
+
+    async def ahas_question(self, utterance: str) -> bool:
+        """False when the gate finds no question; only ``enforcing`` modes should act on that."""
+        if self.mode == "off":
+            return True
+        self.evaluated += 1
+        verdict = heuristic_verdict(utterance, self.classifier, self.min_words)
+        checked_by_llm = verdict == UNCERTAIN and self.mode == "llm"
+        if checked_by_llm:
+            verdict = await self._allm_verdict(utterance)
+        if verdict != NO_QUESTION:
+            return True
+        if self.mode == "shadow":
+            self.shadow_skips += 1
+        elif checked_by_llm:
+            self.skipped_by_llm += 1
+        else:
+            self.skipped_by_heuristic += 1
+        return False
+
+    def record_shadow_false_negative(self):
+        # shadow mode: the gate would have skipped this turn but the full completion found a question
+        self.shadow_false_negatives += 1
+
+    async def _allm_verdict(self, utterance: str) -> str:
+        self.llm_checks += 1
+        plugin = self.kernel.plugins.get("QuestionPlugin")
+        if plugin is None:
+            plugin = self.kernel.add_plugin(parent_directory=PLUGINS_DIRECTORY, plugin_name="QuestionPlugin")
+        try:
+            with request_priority(PRIORITY_CLASSIFICATION):
+                result = await self.kernel.invoke(plugin["QuestionDetector"], KernelArguments(input=utterance))
+        except Exception:
+            # the full completion is the safe fallback when the cheap check is unavailable
+            logger.exception("question detector failed; processing the utterance")
+            return QUESTION
+        answer = str(result.value[0].content if result.value else "").strip().upper()
+        return NO_QUESTION if answer.startswith("NO") else QUESTION
+
+    def stats(self) -> dict:
+        skipped = self.skipped_by_heuristic + self.skipped_by_llm + self.shadow_skips
+        return {
+            "mode": self.mode,
+            "evaluated": self.evaluated,
+            "skipped_by_heuristic": self.skipped_by_heuristic,
+            "skipped_by_llm": self.skipped_by_llm,
+            "gate_hit_rate": skipped / self.evaluated if self.evaluated else 0.0,
+            "llm_checks": self.llm_checks,
+            "shadow_skips": self.shadow_skips,
+            "shadow_false_negatives": self.shadow_false_negatives,
+        }
@@ -0,0 +1,202 @@
+import ast
+import json
+import logging
+import math
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.function_call_content import FunctionCallContent
+from semantic_kernel.contents.function_result_content import FunctionResultContent
+from services.keyword_intent_classifier import tokenize
+from services.lru_ttl_cache import LruTtlCache
+from services.query_normalizer import normalize_query
+
+logger = logging.getLogger(__name__)
+
+KNOWLEDGE_PLUGIN = "KnowledgePlugin"
+KC_FUNCTION = "retrieve_kc_response"
+BENEFITS_FUNCTION = "retrieve_benefits_response"
+
+# ledger of the turn being processed; set by UtteranceService, read by KnowledgePlugin
+current_ledger: ContextVar["QuestionLedger"] = ContextVar("current_ledger", default=None)
+
+
+@dataclass
+class LedgerEntry:
+    question: str
+    function: str
+    # the tool result as it was returned to the model (a string once it has been persisted)
+    information: object
+    features: dict[str, float]
+
+    @property
+    def intent(self) -> str:
+        information = self.information
+        if isinstance(information, str):
+            # persisted results are the repr of the plugin's dict
+            try:
+                information = ast.literal_eval(information)
+            except (ValueError, SyntaxError):
+                return None
+        return information.get("intent") if isinstance(information, dict) else None
+
+
+def _features(question: str) -> dict[str, float]:
+    counts = Counter(tokenize(question))
+    norm = math.sqrt(sum(count * count for count in counts.values()))
+    return {feature: count / norm for feature, count in counts.items()} if norm else {}
+
+
+def _similarity(a: dict[str, float], b: dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(feature, 0.0) for feature, weight in a.items())
+
+
+def _user_query(call: FunctionCallContent) -> str:
+    arguments = call.arguments
+    if isinstance(arguments, str):
+        try:
+            arguments = json.loads(arguments)
+        except ValueError:
+            return None
+    return (arguments or {}).get("user_query")
+
+
+class QuestionLedger:
+    """Questions already answered by KnowledgePlugin in one call, with the information retrieved for them.
+
+    The ledger is rebuilt from the tool call and tool result messages of the call's history, so it is
+    persisted with the history itself and needs no writes of its own. A question matches an entry when
+    their keyword features are at least ``similarity_threshold`` alike (1.0 is an exact match after
+    normalization). Benefits results also answer general questions, but not the other way around.
+    Results that include a source reported as "none found" are not reused.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.9, information_max_chars: int = 800):
+        self.similarity_threshold = similarity_threshold
+        # length of each entry's information quoted in the instructions
+        self.information_max_chars = information_max_chars
+        # normalized question -> entry
+        self.entries: dict[str, LedgerEntry] = {}
+        # tool invocations of this turn answered from the ledger
+        self.tool_calls_saved = 0
+
+    @classmethod
+    def from_chat_history(
+        cls, chat_history: ChatHistory, similarity_threshold: float = 0.9, information_max_chars: int = 800
+    ) -> "QuestionLedger":
+        ledger = cls(similarity_threshold, information_max_chars)
+        calls: dict[str, FunctionCallContent] = {}
+        for msg in chat_history.messages:
+            for item in msg.items:
+                if isinstance(item, FunctionCallContent) and item.plugin_name == KNOWLEDGE_PLUGIN:
+                    calls[item.id] = item
+                elif isinstance(item, FunctionResultContent) and item.id in calls:
+                    call = calls.pop(item.id)
+                    question = _user_query(call)
+                    if question:
+                        ledger.add(question, call.function_name, item.result)
+        return ledger
+
+    def add(self, question: str, function: str, information):
+        if function not in (KC_FUNCTION, BENEFITS_FUNCTION) or information is None:
+            return
+        if "none found" in str(information).lower():
+            # a source timed out or failed; ask again next time
+            return
+        key = normalize_query(question)
+        existing = self.entries.get(key)
+        if existing is not None and existing.function == BENEFITS_FUNCTION and function == KC_FUNCTION:
+            # keep the more complete answer
+            return
+        self.entries[key] = LedgerEntry(question, function, information, _features(question))
+
+    def lookup(self, function: str, question: str) -> LedgerEntry:
+        key = normalize_query(question)
+        features = _features(question)
+        best, best_score = None, self.similarity_threshold
+        for entry_key, entry in self.entries.items():
+            if function == BENEFITS_FUNCTION and entry.function != BENEFITS_FUNCTION:
+                continue
+            score = 1.0 if entry_key == key else _similarity(features, entry.features)
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def answer(self, function: str, question: str):
+        """The earlier information for the question, or None when the tool has to run."""
+        entry = self.lookup(function, question)
+        if entry is None:
+            return None
+        self.tool_calls_saved += 1
+        return entry.information
+
+    def instructions(self) -> str:
+        """Prompt addition with the answered questions and their information, so the model does not search again.
+
+        The information is quoted here because the earlier tool results may no longer be in the history the
+        model sees: the history reducer drops old tool call/result pairs.
+        """
+        if not self.entries:
+            return None
+        lines = []
+        for entry in self.entries.values():
+            information = str(entry.information)
+            if len(information) > self.information_max_chars:
+                information = information[: self.information_max_chars] + "... [truncated]"
+            lines.append(f"- {entry.question} (Intent: {entry.intent or 'unknown'})\n  Information: {information}")
+        return (
+            "These customer questions were already answered earlier in this call, with the information below. "
+            "Answer them from this information instead of calling a tool again. Only call tools for questions that "
+            "are not in this list.\n" + "\n".join(lines)
+        )
+
+
+class QuestionLedgerService:
+    """Builds each turn's ledger and keeps per-call totals of the tool invocations it saved."""
+
+    def __init__(
+        self,
+        similarity_threshold: float = 0.9,
+        max_calls: int = 1000,
+        idle_ttl_seconds: float = 900,
+        information_max_chars: int = 800,
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.information_max_chars = information_max_chars
+        # (callAgent, callId) -> tool calls saved over the call so far
+        self.calls = LruTtlCache(max_entries=max_calls, ttl_seconds=idle_ttl_seconds)
+
+        self.turns = 0
+        self.turns_with_ledger = 0
+        self.tool_calls_saved = 0
+
+    def build(self, chat_history: ChatHistory) -> QuestionLedger:
+        self.turns += 1
+        ledger = QuestionLedger.from_chat_history(chat_history, self.similarity_threshold, self.information_max_chars)
+        if ledger.entries:
+            self.turns_with_ledger += 1
+        return ledger
+
+    def record(self, call_agent: str, call_id: str, ledger: QuestionLedger):
+        key = (call_agent, call_id)
+        saved = self.calls.peek(key, 0) + ledger.tool_calls_saved
+        self.calls.set(key, saved)
+        self.tool_calls_saved += ledger.tool_calls_saved
+        if ledger.tool_calls_saved:
+            logger.info(
+                "call %s: %d tool calls answered from the ledger this turn, %d so far", call_id, ledger.tool_calls_saved, saved
+            )
+
+    def stats(self) -> dict:
+        per_call = [saved for _, saved in self.calls.items()]
+        return {
+            "turns": self.turns,
+            "turns_with_ledger": self.turns_with_ledger,
+            "tool_calls_saved": self.tool_calls_saved,
+            "active_calls": len(per_call),
+            "avg_tool_calls_saved_per_call": sum(per_call) / len(per_call) if per_call else 0.0,
+            "max_tool_calls_saved_per_call": max(per_call, default=0),
+        }
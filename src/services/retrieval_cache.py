@@ -0,0 +1,378 @@
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Awaitable, Callable, Protocol
+import numpy as np
+from azure.cosmos import exceptions
+from azure.cosmos.aio import ContainerProxy, CosmosClient
+from services.aisearch_service import AiSearchService
+from services.benefits_search_service import BenefitsSearchService
+from services.credential_manager import CredentialManager
+from services.lru_ttl_cache import LruTtlCache
+from services.query_normalizer import normalize_query
+from services.vector_index import HashingEmbedder
+
+logger = logging.getLogger(__name__)
+
+
+class RetrievalCacheBackend(Protocol):
+    """Where cached retrieval results live: ``aget`` returns None on a miss or an expired entry."""
+
+    async def aget(self, key: str) -> str: ...
+
+    async def aset(self, key: str, value: str): ...
+
+    def stats(self) -> dict: ...
+
+    async def aclose(self): ...
+
+
+class MemoryRetrievalCacheBackend:
+    """Per-process backend: LRU order, a TTL counted from when the result was stored, and a size cap."""
+
+    def __init__(self, max_entries: int = 5000, ttl_seconds: float = 3600):
+        self.ttl_seconds = ttl_seconds
+        # key -> (stored at, value); the LRU cache's own idle TTL would keep frequently read entries forever
+        self.cache = LruTtlCache(max_entries=max_entries)
+
+    async def aget(self, key: str) -> str:
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+            self.cache.pop(key)
+            return None
+        return value
+
+    async def aset(self, key: str, value: str):
+        self.cache.set(key, (time.monotonic(), value))
+
+    def stats(self) -> dict:
+        return {"backend": "memory", **self.cache.stats()}
+
+    async def aclose(self):
+        pass
+
+
+class CosmosRetrievalCacheBackend:
+    """Backend shared by every worker and instance: one item per key in a Cosmos container.
+
+    Every item carries a ``ttl`` of ``ttl_seconds``, so Cosmos deletes it on its own once that has passed
+    since it was written; the container's size is bounded by the TTL rather than a count. The container
+    (partitioned on ``/id``, with a default TTL so item TTLs apply) is provisioned by infra/app/db.bicep:
+    creating it is a control-plane operation the app's data-plane role does not allow. Lookups that fail
+    are reported as misses so a cache outage never fails a retrieval.
+    """
+
+    def __init__(self, cosmos_client: CosmosClient, db_name: str, container_name: str, ttl_seconds: float = 3600):
+        self.cosmos_client = cosmos_client
+        self.db_name = db_name
+        self.container_name = container_name
+        self.ttl_seconds = ttl_seconds
+        self._container: ContainerProxy = None
+        self._container_lock = asyncio.Lock()
+
+        self.reads = 0
+        self.writes = 0
+        self.errors = 0
+        self.request_charge = 0.0
+
+    async def aget_container(self) -> ContainerProxy:
+        if self._container is None:
+            async with self._container_lock:
+                if self._container is None:
+                    self._container = self.cosmos_client.get_database_client(self.db_name).get_container_client(
+                        self.container_name
+                    )
+        return self._container
+
+    @staticmethod
+    def item_id(key: str) -> str:
+        # ids are limited in length and characters; the key itself is kept in the item for inspection
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _record_charge(self, headers: dict, _):
+        self.request_charge += float(headers.get("x-ms-request-charge", 0))
+
+    async def aget(self, key: str) -> str:
+        self.reads += 1
+        item_id = self.item_id(key)
+        try:
+            container = await self.aget_container()
+            item = await container.read_item(item=item_id, partition_key=item_id, response_hook=self._record_charge)
+        except exceptions.CosmosResourceNotFoundError:
+            return None
+        except Exception:
+            self.errors += 1
+            logger.exception("retrieval cache read failed")
+            return None
+        return item.get("value")
+
+    async def aset(self, key: str, value: str):
+        self.writes += 1
+        item_id = self.item_id(key)
+        try:
+            container = await self.aget_container()
+            await container.upsert_item(
+                {"id": item_id, "key": key, "value": value, "ttl": int(self.ttl_seconds)}, response_hook=self._record_charge
+            )
+        except Exception:
+            self.errors += 1
+            logger.exception("retrieval cache write failed")
+
+    def stats(self) -> dict:
+        return {
+            "backend": "cosmos",
+            "reads": self.reads,
+            "writes": self.writes,
+            "errors": self.errors,
+            "request_charge": self.request_charge,
+        }
+
+    async def aclose(self):
+        # the client belongs to the chat history service, which closes it
+        pass
+
+
+class KeywordEmbedder:
+    """Local embedding: the keyword intent classifier's unigrams and bigrams, hashed into ``dimensions`` buckets."""
+
+    def __init__(self, dimensions: int = 1024):
+        self.hashing = HashingEmbedder(dimensions)
+
+    async def aembed(self, text: str) -> np.ndarray:
+        return self.hashing.embed([text])[0]
+
+
+class AzureOpenAIEmbedder:
+    """Dense embeddings from an Azure OpenAI embedding deployment; one request per uncached question."""
+
+    def __init__(self, embedding_service):
+        # a semantic_kernel EmbeddingGeneratorBase, e.g. AzureTextEmbedding
+        self.embedding_service = embedding_service
+
+    @classmethod
+    def from_deployment(
+        cls, deployment: str, endpoint: str, api_version: str, key: str = None, credentials: CredentialManager = None
+    ) -> "AzureOpenAIEmbedder":
+        # same authentication as the chat completion service in KernelService
+        from semantic_kernel.connectors.ai.open_ai import AzureTextEmbedding
+
+        auth = {"api_key": key}
+        if key is None or key.strip() == "":
+            if credentials is None:
+                raise ValueError("Azure OpenAI needs an API key or a CredentialManager")
+            auth = {"ad_token_provider": credentials.token_provider()}
+        return cls(AzureTextEmbedding(deployment_name=deployment, endpoint=endpoint, api_version=api_version, **auth))
+
+    async def aembed(self, text: str) -> np.ndarray:
+        vectors = await self.embedding_service.generate_embeddings([text])
+        vector = np.asarray(vectors[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class _ScopeIndex:
+    """Unit-length embeddings of one scope's questions as the rows of a matrix, searched with one product."""
+
+    def __init__(self, dimensions: int):
+        self.vectors = np.zeros((16, dimensions), dtype=np.float32)
+        # row -> key; rows of removed keys are zeroed and reused
+        self.keys: list[str] = []
+        self.rows: dict[str, int] = {}
+        self.free: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def add(self, key: str, embedding: np.ndarray):
+        row = self.rows.get(key)
+        if row is None:
+            if self.free:
+                row = self.free.pop()
+            else:
+                row = len(self.keys)
+                self.keys.append(None)
+                if row == len(self.vectors):
+                    self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+            self.keys[row] = key
+            self.rows[key] = row
+        self.vectors[row] = embedding
+
+    def remove(self, key: str):
+        row = self.rows.pop(key, None)
+        if row is not None:
+            self.keys[row] = None
+            self.vectors[row] = 0
+            self.free.append(row)
+
+    def closest(self, embedding: np.ndarray, threshold: float) -> str:
+        if not self.rows:
+            return None
+        scores = self.vectors[: len(self.keys)] @ embedding
+        row = int(np.argmax(scores))
+        # free rows score 0, below any threshold that enables the lookup
+        return self.keys[row] if scores[row] >= threshold else None
+
+
+class RetrievalCache:
+    """Results of the knowledge sources keyed by source, normalized query and lookup parameters.
+
+    An exact key match is looked up in the backend first. With an ``embedder`` and a
+    ``similarity_threshold`` above 0, a miss is retried with the closest earlier question of the same
+    source and parameters, so paraphrases of a question already answered reuse its result. The
+    embeddings of recently stored questions are kept in process (``max_entries``, ``ttl_seconds``).
+    Concurrent misses for the same key wait for the first one's lookup instead of fetching again.
+    """
+
+    def __init__(
+        self,
+        backend: RetrievalCacheBackend,
+        embedder=None,
+        similarity_threshold: float = 0.0,
+        max_entries: int = 5000,
+        ttl_seconds: float = 3600,
+    ):
+        self.backend = backend
+        self.embedder = embedder if similarity_threshold > 0 else None
+        self.similarity_threshold = similarity_threshold
+        # key -> scope of the questions whose embeddings are in the scope's index; bounds and expires them
+        self.index = LruTtlCache(max_entries=max_entries, ttl_seconds=ttl_seconds, on_evict=self._on_evict)
+        self.scopes: dict[str, _ScopeIndex] = {}
+        # lookups currently running, so concurrent misses for the same key share one fetch
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+        self.source_stats: dict[str, dict[str, int]] = {}
+
+    @staticmethod
+    def scope(source: str, params: tuple) -> str:
+        return "|".join([source, *(str(param) for param in params)])
+
+    async def aget_or_fetch(self, source: str, query: str, params: tuple, fetch: Callable[[], Awaitable[str]]) -> str:
+        normalized = normalize_query(query)
+        scope = self.scope(source, params)
+        key = f"{scope}|{normalized}"
+        stats = self.source_stats.setdefault(source, {"hits": 0, "semantic_hits": 0, "shared_fetches": 0, "misses": 0})
+
+        value = await self.backend.aget(key)
+        if value is not None:
+            stats["hits"] += 1
+            return value
+
+        while key in self._in_flight:
+            future = self._in_flight[key]
+            try:
+                value = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # the caller that owned the lookup was cancelled (e.g. by its source timeout), not us:
+                # join or start another lookup instead of surfacing its cancellation
+                if asyncio.current_task().cancelling() or not future.cancelled():
+                    raise
+                continue
+            stats["shared_fetches"] += 1
+            return value
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await self._alookup_similar_or_fetch(scope, key, normalized, fetch, stats)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # nobody may be waiting on it; don't let asyncio log the exception as never retrieved
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def _alookup_similar_or_fetch(
+        self, scope: str, key: str, normalized: str, fetch: Callable[[], Awaitable[str]], stats: dict[str, int]
+    ) -> str:
+        embedding = None
+        if self.embedder is not None and normalized:
+            embedding = await self.embedder.aembed(normalized)
+            similar_key = self._closest(scope, embedding)
+            if similar_key is not None:
+                value = await self.backend.aget(similar_key)
+                if value is not None:
+                    stats["semantic_hits"] += 1
+                    return value
+
+        stats["misses"] += 1
+        # failures propagate to the caller and are not cached
+        value = await fetch()
+        await self.backend.aset(key, value)
+        if embedding is not None:
+            self.index.set(key, scope)
+            self.scopes.setdefault(scope, _ScopeIndex(len(embedding))).add(key, embedding)
+        return value
+
+    def _closest(self, scope: str, embedding: np.ndarray) -> str:
+        scope_index = self.scopes.get(scope)
+        if scope_index is None:
+            return None
+        key = scope_index.closest(embedding, self.similarity_threshold)
+        if key is not None and key not in self.index:
+            # idle entries only leave the index when looked up; drop them all and search again
+            self.index.expire()
+            key = scope_index.closest(embedding, self.similarity_threshold)
+        return key
+
+    def _on_evict(self, key: str, scope: str):
+        scope_index = self.scopes[scope]
+        scope_index.remove(key)
+        if not scope_index:
+            del self.scopes[scope]
+
+    def stats(self) -> dict:
+        sources = {}
+        for source, stats in self.source_stats.items():
+            served = stats["hits"] + stats["semantic_hits"] + stats["shared_fetches"]
+            lookups = served + stats["misses"]
+            hit_rate = served / lookups if lookups else 0.0
+            sources[source] = {**stats, "hit_rate": hit_rate}
+        return {
+            "backend": self.backend.stats(),
+            "semantic_index_entries": len(self.index),
+            "sources": sources,
+        }
+
+    async def aclose(self):
+        await self.backend.aclose()
+
+
+class CachedAiSearchService:
+    """AiSearchService with its results served from a RetrievalCache."""
+
+    def __init__(self, aisearch_service: AiSearchService, cache: RetrievalCache):
+        self.aisearch_service = aisearch_service
+        self.cache = cache
+
+    async def get_data(self, user_query):
+        return await self.cache.aget_or_fetch(
+            "aisearch", user_query, (), lambda: self.aisearch_service.get_data(user_query)
+        )
+
+
+class CachedBenefitsSearchService:
+    """BenefitsSearchService with its results served from a RetrievalCache, keyed by the plan parameters too."""
+
+    def __init__(self, benefits_search_service: BenefitsSearchService, cache: RetrievalCache):
+        self.benefits_search_service = benefits_search_service
+        self.cache = cache
+
+    async def get_data(self, user_query, plan_type, plan_system_type_id, benefit_plan_id, date_of_service):
+        return await self.cache.aget_or_fetch(
+            "benefits",
+            user_query,
+            (plan_type, plan_system_type_id, benefit_plan_id, date_of_service),
+            lambda: self.benefits_search_service.get_data(
+                user_query, plan_type, plan_system_type_id, benefit_plan_id, date_of_service
+            ),
+        )
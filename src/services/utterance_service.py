@@ -0,0 +1,333 @@
+import asyncio
+import logging
+import time
+from typing import Callable
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+from telemetry import history_messages, stage
+from services.call_context import CallContextService, current_call
+from services.call_debouncer import CallDebouncer
+from services.chat_history_cache_service import CachedChatHistoryService
+from services.chat_history_cosmos_service import ChatHistoryCosmosService
+from services.keyed_locks import KeyedLocks
+from services.kernel_service import KernelService
+from services.openai_scheduler import was_shed
+from services.question_gate import QuestionGate
+from services.question_ledger import QuestionLedgerService, current_ledger
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_MESSAGE = f"""You are a silent observer in a phone conversation between a human health plan benefits assistant and a customer.
+    In the conversation history provided to you, the USER is the customer, and the ASSISTANT is the human assistant.
+    You are not allowed to interact with the customer USER directly, and you are not completing the conversation.
+    Your purpose is to extract all searchable questions uttered by the customer USER, and the intent category for each, returing helpful information to be used by the human ASSISTANT as they continue to talk with the customer USER.
+    If no well formed customer user question or need is found in the conversation, return only "no questions found".
+    For each USER question or need identified, use the tools available to you to search for helpful information and determine intent for each identified question and then combine the results into a single response.
+    In the "Information" returned, only include information retrieved from your tools; not from your general knowledge or from utterances in the conversation.
+    If no supporting information is found for a user question with your tools, provide "none found" for the information related to that item.
+    Always format your response like the examples below.
+    ###Example 1###
+    No questions found
+    ###Example 2###
+    User question: How does the Monthly Challenge work?
+    Information: [Details about monthly challenge from retrieve_kc_response function]
+    Intent: General
+    ###Example 3###
+    User question: How much would a CGM cost?
+    Information: [Details about CGM cost from retrieve_benefits_response function]
+    Intent: Plan
+    ###Example 4###
+    User question: What is the best CGM for me?
+    Information: none found
+    Intent: General
+    """
+
+NO_QUESTIONS_FOUND = "No questions found"
+
+
+def is_no_questions_found(content: str) -> bool:
+    return (content or "").strip().lower().startswith(NO_QUESTIONS_FOUND.lower())
+
+
+class InvalidSpeakerError(ValueError):
+    pass
+
+
+def normalize_speaker(speaker: str) -> str:
+    speaker = (speaker or "").strip().lower()
+    if speaker not in ("customer", "advocate"):
+        raise InvalidSpeakerError("Invalid speaker role")
+    return speaker
+
+
+class UtteranceService:
+    # Shared across requests; everything specific to a call (the ChatHistory) lives on the stack of
+    # aprocess_utterance so concurrent calls never see each other's state.
+    def __init__(
+        self,
+        chat_history_service: ChatHistoryCosmosService | CachedChatHistoryService,
+        kernel_service: KernelService,
+        question_gate: QuestionGate = None,
+        debouncer: CallDebouncer = None,
+        batch_concurrency: int = 16,
+        call_context: CallContextService = None,
+        question_ledger_service: QuestionLedgerService = None,
+    ):
+        self.chat_history_service = chat_history_service
+        self.kernel_service = kernel_service
+        self.question_gate = question_gate
+        self.debouncer = debouncer
+        # turns of the same call are processed one at a time, in arrival order; other calls run in parallel.
+        # Writes from other workers or instances are caught by the conditional save and merged.
+        self.call_locks = KeyedLocks()
+        # calls of one batch processed at the same time
+        self.batch_concurrency = batch_concurrency
+        # CRM plan context, prefetched from a call's first utterance and reused by its benefits lookups
+        self.call_context = call_context
+        # questions already answered in the call are not searched again
+        self.question_ledger_service = question_ledger_service
+
+        # streamed turns keep running (and get saved) after their client disconnects
+        self._streamed_turns: set[asyncio.Task] = set()
+        self.streams = 0
+        self.stream_ttft_ms = 0.0
+        self.stream_total_ms = 0.0
+        self.shed_turns = 0
+
+    async def aprocess_utterance(self, call_agent: str, call_id: str, speaker: str, utterance: str) -> str:
+        speaker = normalize_speaker(speaker)
+        if self.call_context is not None:
+            self.call_context.prefetch(call_agent, call_id)
+
+        with stage("utterance", speaker=speaker) as span:
+            span.set_attribute("call.id", call_id)
+            if speaker == "advocate":
+                if self.debouncer is not None:
+                    # customer fragments still waiting out their window were said before this
+                    await self.debouncer.aflush((call_agent, call_id))
+                # appended as-is: no history read, no completion
+                async with self.call_locks.hold((call_agent, call_id)):
+                    with stage("advocate_append"):
+                        await self.chat_history_service.aappend_message(
+                            call_agent, call_id, ChatMessageContent(role=AuthorRole.ASSISTANT, content=utterance)
+                        )
+                return NO_QUESTIONS_FOUND
+
+            if self.debouncer is None:
+                return await self._aprocess_customer_turn(call_agent, call_id, [utterance])
+            # fragments of one spoken question arriving close together share a single run
+            return await self.debouncer.asubmit(
+                (call_agent, call_id),
+                utterance,
+                lambda fragments, begin_commit: self._aprocess_customer_turn(call_agent, call_id, fragments, begin_commit),
+            )
+
+    async def aprocess_batch(self, events: list[dict]) -> list[dict]:
+        """Process utterance events for any number of calls and return one result per event, in input order.
+
+        Events are grouped by call and each call's events are processed in their original order, with up to
+        ``batch_concurrency`` calls at a time. When fragment coalescing is enabled, consecutive customer
+        events of a call become one turn, as they would if they had arrived within the debounce window.
+        A failing event yields ``{"status": 400 or 500, "error": ...}`` without affecting the others.
+        """
+        results: list[dict] = [None] * len(events)
+        calls: dict[tuple[str, str], list[tuple[int, str, str]]] = {}
+        for index, event in enumerate(events):
+            try:
+                key = (event["callAgent"], event["callId"])
+                calls.setdefault(key, []).append((index, normalize_speaker(event["speaker"]), event["utterance"]))
+            except (KeyError, TypeError, InvalidSpeakerError) as e:
+                results[index] = {"status": 400, "error": str(e) if isinstance(e, InvalidSpeakerError) else f"malformed event: {e!r}"}
+
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+
+        async def aprocess_call(call_agent: str, call_id: str, call_events: list[tuple[int, str, str]]):
+            async with semaphore:
+                for turn in self._batch_turns(call_events):
+                    indexes = [index for index, _, _ in turn]
+                    speaker = turn[0][1]
+                    try:
+                        if speaker == "advocate":
+                            content = await self.aprocess_utterance(call_agent, call_id, speaker, turn[0][2])
+                        else:
+                            content = await self._aprocess_customer_turn(call_agent, call_id, [utterance for _, _, utterance in turn])
+                        result = {"status": 200, "content": content}
+                    except Exception as e:
+                        logger.exception("batch event for call %s failed", call_id)
+                        result = {"status": 500, "error": str(e)}
+                    for index in indexes:
+                        results[index] = {"callId": call_id, **result}
+
+        await asyncio.gather(*(aprocess_call(call_agent, call_id, call_events) for (call_agent, call_id), call_events in calls.items()))
+        return results
+
+    def _batch_turns(self, call_events: list[tuple[int, str, str]]) -> list[list[tuple[int, str, str]]]:
+        turns = []
+        for event in call_events:
+            coalesce = self.debouncer is not None and event[1] == "customer"
+            if coalesce and turns and turns[-1][-1][1] == "customer":
+                turns[-1].append(event)
+            else:
+                turns.append([event])
+        return turns
+
+    async def astream_utterance(self, call_agent: str, call_id: str, speaker: str, utterance: str):
+        """Like ``aprocess_utterance`` but yields the answer as it is generated.
+
+        Yields ``{"type": "token", "text": ...}`` events and finally ``{"type": "done", "content": ...,
+        "ttft_ms": ..., "total_ms": ...}`` once the turn has been saved. Streamed turns are not debounced.
+        """
+        speaker = normalize_speaker(speaker)
+        started = time.perf_counter()
+        if speaker == "advocate":
+            yield {"type": "token", "text": NO_QUESTIONS_FOUND}
+            content = await self.aprocess_utterance(call_agent, call_id, speaker, utterance)
+            yield {"type": "done", "content": content, "ttft_ms": 0.0, "total_ms": (time.perf_counter() - started) * 1000}
+            return
+
+        queue: asyncio.Queue = asyncio.Queue()
+        first_token_at = None
+
+        def on_text(text: str):
+            nonlocal first_token_at
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            queue.put_nowait(text)
+
+        # the turn runs as its own task so a disconnecting client never cancels it before it is saved
+        turn = asyncio.create_task(self._aprocess_customer_turn(call_agent, call_id, [utterance], on_text=on_text))
+        self._streamed_turns.add(turn)
+        turn.add_done_callback(self._streamed_turns.discard)
+        turn.add_done_callback(lambda _: queue.put_nowait(None))
+
+        while (text := await queue.get()) is not None:
+            yield {"type": "token", "text": text}
+        content = await turn
+
+        total_ms = (time.perf_counter() - started) * 1000
+        ttft_ms = ((first_token_at or time.perf_counter()) - started) * 1000
+        self.streams += 1
+        self.stream_ttft_ms += ttft_ms
+        self.stream_total_ms += total_ms
+        logger.info("streamed turn for %s: first token after %.0f ms, done after %.0f ms", call_id, ttft_ms, total_ms)
+        yield {"type": "done", "content": content, "ttft_ms": ttft_ms, "total_ms": total_ms}
+
+    def stats(self) -> dict:
+        return {
+            "streams": self.streams,
+            "avg_ttft_ms": self.stream_ttft_ms / self.streams if self.streams else 0.0,
+            "avg_total_ms": self.stream_total_ms / self.streams if self.streams else 0.0,
+            "shed_turns": self.shed_turns,
+        }
+
+    async def _aload_chat_history(self, call_agent: str, call_id: str) -> tuple[ChatHistory, int, str]:
+        """The call's history, how many of its messages are already persisted, and the ETag to save with."""
+        with stage("history_load"):
+            chat_history, etag = await self.chat_history_service.aread_chat_history(call_agent, call_id)
+        history_messages.record(len(chat_history.messages) if chat_history is not None else 0)
+        if chat_history is None:
+            chat_history = ChatHistory()
+            chat_history.add_system_message(SYSTEM_MESSAGE)
+            return chat_history, 0, None
+        if not chat_history.messages or chat_history.messages[0].role != AuthorRole.SYSTEM:
+            # the call was started by advocate messages appended without the prompt; it is added back on
+            # every load until a whole-document save stores it
+            chat_history.messages.insert(0, ChatMessageContent(role=AuthorRole.SYSTEM, content=SYSTEM_MESSAGE))
+        return chat_history, len(chat_history.messages), etag
+
+    async def _aprocess_customer_turn(
+        self,
+        call_agent: str,
+        call_id: str,
+        fragments: list[str],
+        begin_commit: Callable[[], None] = None,
+        on_text: Callable[[str], None] = None,
+    ) -> str:
+        """Run one customer turn and save it; with ``on_text`` the answer is streamed to it as it is generated."""
+        if self.call_context is not None:
+            self.call_context.prefetch(call_agent, call_id)
+        # the plugins invoked by the completion look up the call's context through it
+        call_token = current_call.set((call_agent, call_id))
+        try:
+            with stage("customer_turn", streaming=on_text is not None) as span:
+                span.set_attribute("call.id", call_id)
+                span.set_attribute("fragments", len(fragments))
+                return await self._arun_customer_turn(call_agent, call_id, fragments, begin_commit, on_text)
+        finally:
+            current_call.reset(call_token)
+
+    async def _acomplete(
+        self, call_agent: str, call_id: str, chat_history: ChatHistory, on_text: Callable[[str], None] = None
+    ) -> str:
+        ledger = instructions = None
+        if self.question_ledger_service is not None:
+            ledger = self.question_ledger_service.build(chat_history)
+            instructions = ledger.instructions()
+        ledger_token = current_ledger.set(ledger)
+        try:
+            with stage("completion", streaming=on_text is not None) as span:
+                span.set_attribute("history.messages", len(chat_history.messages))
+                if on_text is not None:
+                    parts = []
+                    async for text in self.kernel_service.astream_chat(chat_history, instructions=instructions):
+                        parts.append(text)
+                        on_text(text)
+                    return "".join(parts)
+                result = await self.kernel_service.achat(chat_history, instructions=instructions)
+                return result.content
+        finally:
+            current_ledger.reset(ledger_token)
+            if ledger is not None:
+                self.question_ledger_service.record(call_agent, call_id, ledger)
+
+    async def _arun_customer_turn(
+        self,
+        call_agent: str,
+        call_id: str,
+        fragments: list[str],
+        begin_commit: Callable[[], None],
+        on_text: Callable[[str], None],
+    ) -> str:
+        async with self.call_locks.hold((call_agent, call_id)):
+            chat_history, persisted_count, etag = await self._aload_chat_history(call_agent, call_id)
+            for fragment in fragments:
+                chat_history.add_user_message(fragment)
+
+            # cheap check of the utterance on its own before running the tool-calling completion over the transcript
+            utterance = " ".join(fragments)
+            with stage("question_gate"):
+                has_question = self.question_gate is None or await self.question_gate.ahas_question(utterance)
+            if not has_question and self.question_gate.enforcing:
+                content = NO_QUESTIONS_FOUND
+                if on_text is not None:
+                    on_text(content)
+            else:
+                try:
+                    content = await self._acomplete(call_agent, call_id, chat_history, on_text)
+                except Exception as e:
+                    if not was_shed(e):
+                        raise
+                    content = None
+                if content is None:
+                    # the deployment was too busy to answer in time; the fragments are still saved, so the
+                    # call's next completion picks the question up
+                    self.shed_turns += 1
+                    logger.warning("completion for call %s shed by the OpenAI scheduler", call_id)
+                    if on_text is not None:
+                        on_text(NO_QUESTIONS_FOUND)
+                elif not has_question and not is_no_questions_found(content):
+                    self.question_gate.record_shadow_false_negative()
+
+            if content is not None:
+                chat_history.add_assistant_message(content)
+
+            if begin_commit is not None:
+                # from here on a newer fragment of the call waits for this run instead of cancelling it
+                begin_commit()
+            with stage("history_save"):
+                await self.chat_history_service.aappend_chat_history(
+                    call_agent, call_id, chat_history, start_index=persisted_count, etag=etag
+                )
+
+        return NO_QUESTIONS_FOUND if content is None else content
@@ -0,0 +1,449 @@
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import os
+import time
+from dataclasses import dataclass
+from typing import Iterable, Protocol
+import numpy as np
+from services.aisearch_service import AiSearchService
+from services.credential_manager import CredentialManager
+from services.keyword_intent_classifier import tokenize
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+DOCUMENT_EXTENSIONS = (".md", ".txt")
+# rows multiplied against the queries at a time, so a search never holds more than a block of scores
+SEARCH_BLOCK_ROWS = 65536
+
+
+class VectorEmbedder(Protocol):
+    """Embedding function of an index; ``name`` is recorded in the index so queries are embedded the same way."""
+
+    name: str
+
+    async def aembed(self, texts: list[str]) -> np.ndarray: ...
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class HashingEmbedder:
+    """Deterministic local embedding: the keyword classifier's unigrams and bigrams hashed into signed buckets.
+
+    Needs no service and gives the same vectors in every process, so an index can be built and queried
+    offline. Only questions that share words with a document match it.
+    """
+
+    def __init__(self, dimensions: int = 512):
+        self.dimensions = dimensions
+        self.name = f"hashing-{dimensions}"
+
+    def _bucket(self, feature: str) -> tuple[int, float]:
+        # a stable hash, unlike hash() which is salted per process
+        digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        return digest % self.dimensions, 1.0 if digest >> 63 else -1.0
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in tokenize(text):
+                bucket, sign = self._bucket(feature)
+                vectors[row, bucket] += sign
+        return _normalize_rows(vectors)
+
+    async def aembed(self, texts: list[str]) -> np.ndarray:
+        return self.embed(texts)
+
+
+class AzureOpenAIBatchEmbedder:
+    """Dense embeddings from an Azure OpenAI embedding deployment, ``batch_size`` texts per request."""
+
+    def __init__(self, embedding_service, deployment: str, batch_size: int = 64):
+        # a semantic_kernel EmbeddingGeneratorBase, e.g. AzureTextEmbedding
+        self.embedding_service = embedding_service
+        self.name = f"azure-openai-{deployment}"
+        self.batch_size = batch_size
+
+    @classmethod
+    def from_deployment(
+        cls, deployment: str, endpoint: str, api_version: str, key: str = None, credentials: CredentialManager = None
+    ) -> "AzureOpenAIBatchEmbedder":
+        # same authentication as the retrieval cache's embedder
+        from services.retrieval_cache import AzureOpenAIEmbedder
+
+        embedder = AzureOpenAIEmbedder.from_deployment(
+            deployment=deployment, endpoint=endpoint, api_version=api_version, key=key, credentials=credentials
+        )
+        return cls(embedder.embedding_service, deployment)
+
+    async def aembed(self, texts: list[str]) -> np.ndarray:
+        batches = [
+            await self.embedding_service.generate_embeddings(texts[start : start + self.batch_size])
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        return _normalize_rows(np.concatenate(batches)) if batches else np.zeros((0, 0), dtype=np.float32)
+
+
+def build_embedder(
+    deployment: str = None,
+    endpoint: str = None,
+    api_version: str = None,
+    key: str = None,
+    dimensions: int = 512,
+    credentials: CredentialManager = None,
+) -> VectorEmbedder:
+    """The deployment's embeddings when one is named, the local hashing embedder otherwise."""
+    if deployment:
+        return AzureOpenAIBatchEmbedder.from_deployment(
+            deployment=deployment, endpoint=endpoint, api_version=api_version, key=key, credentials=credentials
+        )
+    return HashingEmbedder(dimensions)
+
+
+def chunk_text(text: str, max_chars: int = 1200) -> list[str]:
+    """Paragraphs packed into chunks of at most ``max_chars``; longer paragraphs are cut at word boundaries."""
+    chunks, current = [], ""
+    for paragraph in (p.strip() for p in text.split("\n\n")):
+        while len(paragraph) > max_chars:
+            if current:
+                # the pieces of a long paragraph follow the text before it
+                chunks.append(current)
+                current = ""
+            cut = paragraph.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            chunks.append(paragraph[:cut].strip())
+            paragraph = paragraph[cut:].strip()
+        if not paragraph:
+            continue
+        if current and len(current) + 2 + len(paragraph) > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def iter_documents(directory: str, extensions: tuple[str, ...] = DOCUMENT_EXTENSIONS) -> Iterable[tuple[str, str]]:
+    """(path relative to ``directory``, text) of every document under it, in a stable order."""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(extensions):
+                path = os.path.join(root, name)
+                with open(path, encoding="utf-8") as f:
+                    yield os.path.relpath(path, directory).replace(os.sep, "/"), f.read()
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _write_json(path: str, data: dict):
+    # write-then-rename so readers never see a truncated manifest
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+
+def _map_file(path: str, size: int) -> mmap.mmap:
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) if size else None
+
+
+@dataclass
+class _IndexFiles:
+    """One generation of an index mapped into memory; replaced as a whole when the manifest changes."""
+
+    manifest: dict
+    vectors: np.ndarray
+    offsets: np.ndarray
+    chunks: mmap.mmap
+
+
+class VectorIndex:
+    """Top-k cosine search over an embedding matrix that lives in a memory-mapped file.
+
+    The index directory holds ``manifest.json`` and, per generation, the float32 row-normalized
+    ``vectors`` matrix, the ``chunks`` JSON lines (source document and text of each row) and their
+    byte ``offsets``. Every file is mapped read-only, so the workers of a host share one copy through
+    the page cache. Rows are appended to the current generation and published by rewriting the
+    manifest; a rebuild writes a new generation and swaps the manifest. Readers pick either up within
+    ``refresh_interval_seconds`` and only ever map the rows the manifest they read covers.
+    """
+
+    def __init__(self, path: str, refresh_interval_seconds: float = 5):
+        self.path = path
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self._manifest_mtime = None
+        self._checked_at = 0.0
+        self._files: _IndexFiles = None
+        self.refresh(force=True)
+
+    @staticmethod
+    def manifest_path(path: str) -> str:
+        return os.path.join(path, "manifest.json")
+
+    @staticmethod
+    def read_manifest(path: str) -> dict:
+        try:
+            with open(VectorIndex.manifest_path(path), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def generation_files(path: str, generation: int) -> dict[str, str]:
+        return {name: os.path.join(path, f"{name}-{generation}.{ext}") for name, ext in (("vectors", "f32"), ("offsets", "u64"), ("chunks", "jsonl"))}
+
+    @property
+    def manifest(self) -> dict:
+        return self._files.manifest if self._files is not None else None
+
+    @property
+    def count(self) -> int:
+        return self.manifest["count"] if self.manifest else 0
+
+    def refresh(self, force: bool = False) -> bool:
+        """Map the generation and rows of the current manifest if it changed; True when it did."""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_interval_seconds:
+            return False
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.manifest_path(self.path)).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._manifest_mtime:
+            return False
+        manifest = self.read_manifest(self.path)
+        files = self.generation_files(self.path, manifest["generation"])
+        count, dimensions = manifest["count"], manifest["dimensions"]
+        try:
+            self._files = _IndexFiles(
+                manifest=manifest,
+                vectors=np.memmap(files["vectors"], dtype=np.float32, mode="r", shape=(count, dimensions))
+                if count
+                else np.zeros((0, dimensions), dtype=np.float32),
+                offsets=np.memmap(files["offsets"], dtype=np.uint64, mode="r", shape=(count + 1,)),
+                chunks=_map_file(files["chunks"], manifest["chunks_bytes"]),
+            )
+        except FileNotFoundError:
+            # a rebuild replaced the generation after the manifest was read; the next check maps the new one
+            return False
+        self._manifest_mtime = mtime
+        logger.info("vector index %s: generation %s, %d rows", self.path, manifest["generation"], count)
+        return True
+
+    def search(self, queries: np.ndarray, k: int = 5) -> list[list[tuple[int, float]]]:
+        """Top ``k`` (row, cosine) per row-normalized query vector, best first."""
+        self.refresh()
+        return self._search(self._files, queries, k)
+
+    def lookup(self, queries: np.ndarray, k: int = 5) -> list[list[dict]]:
+        """Like ``search`` but with the {"row", "score", "source", "text"} of each hit."""
+        self.refresh()
+        # rows are resolved against the generation that was searched, even if a refresh swaps it meanwhile
+        files = self._files
+        return [
+            [{"row": row, "score": score, **self._chunk(files, row)} for row, score in hits]
+            for hits in self._search(files, queries, k)
+        ]
+
+    @staticmethod
+    def _search(files: _IndexFiles, queries: np.ndarray, k: int) -> list[list[tuple[int, float]]]:
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if files is None or not files.manifest["count"] or k <= 0:
+            return [[] for _ in range(len(queries))]
+        if queries.shape[1] != files.manifest["dimensions"]:
+            raise ValueError(f"query vectors have {queries.shape[1]} dimensions, the index {files.manifest['dimensions']}")
+
+        count = files.manifest["count"]
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, count, SEARCH_BLOCK_ROWS):
+            scores = queries @ files.vectors[start : start + SEARCH_BLOCK_ROWS].T
+            take = min(k, scores.shape[1])
+            top = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+            best_rows = np.concatenate([best_rows, top + start], axis=1)
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            if best_rows.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        return [
+            [(int(rows[i]), float(scores[i])) for i in ranking]
+            for rows, scores, ranking in zip(best_rows, best_scores, order)
+        ]
+
+    @staticmethod
+    def _chunk(files: _IndexFiles, row: int) -> dict:
+        start, end = int(files.offsets[row]), int(files.offsets[row + 1])
+        return json.loads(files.chunks[start:end])
+
+
+async def aadd_documents(path: str, documents: list[tuple[str, str]], embedder: VectorEmbedder, chunk_chars: int = 1200, rebuild: bool = False) -> dict:
+    """Chunk, embed and append ``documents`` ((source, text) pairs) to the index; ``rebuild`` starts a new generation.
+
+    Only one writer may run against an index at a time. Returns the new manifest.
+    """
+    os.makedirs(path, exist_ok=True)
+    manifest = VectorIndex.read_manifest(path)
+    if manifest is not None and manifest["embedder"] != embedder.name and not rebuild:
+        raise ValueError(f"index {path} was built with {manifest['embedder']}; rebuild it to use {embedder.name}")
+    previous = manifest
+    if manifest is None or rebuild:
+        manifest = {
+            "version": INDEX_FORMAT_VERSION,
+            "embedder": embedder.name,
+            "dimensions": None,
+            "generation": previous["generation"] + 1 if previous else 1,
+            "count": 0,
+            "chunks_bytes": 0,
+            "documents": {},
+        }
+
+    rows = [(source, chunk) for source, text in documents for chunk in chunk_text(text, chunk_chars)]
+    vectors = await embedder.aembed([chunk for _, chunk in rows]) if rows else None
+    if vectors is not None:
+        if not manifest["count"]:
+            manifest["dimensions"] = int(vectors.shape[1])
+        elif vectors.shape[1] != manifest["dimensions"]:
+            raise ValueError(f"{embedder.name} returned {vectors.shape[1]} dimensions, the index has {manifest['dimensions']}")
+    manifest["dimensions"] = manifest["dimensions"] or 0
+
+    files = VectorIndex.generation_files(path, manifest["generation"])
+    new_generation = previous is None or manifest["generation"] != previous["generation"]
+    mode = "wb" if new_generation else "r+b"
+    with open(files["vectors"], mode) as vectors_file, open(files["offsets"], mode) as offsets_file, open(files["chunks"], mode) as chunks_file:
+        # rows past the manifest's count are leftovers of an interrupted write; overwrite them
+        vectors_file.seek(manifest["count"] * manifest["dimensions"] * 4)
+        offsets_file.seek(manifest["count"] * 8)
+        chunks_file.seek(manifest["chunks_bytes"])
+        offset = manifest["chunks_bytes"]
+        offsets = [offset]
+        for source, chunk in rows:
+            line = (json.dumps({"source": source, "text": chunk}) + "\n").encode("utf-8")
+            chunks_file.write(line)
+            offset += len(line)
+            offsets.append(offset)
+        offsets_file.write(np.asarray(offsets, dtype=np.uint64).tobytes())
+        if vectors is not None:
+            vectors_file.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+        for f in (vectors_file, offsets_file, chunks_file):
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+
+    manifest["count"] += len(rows)
+    manifest["chunks_bytes"] = offset
+    for source, text in documents:
+        manifest["documents"][source] = _content_hash(text)
+    _write_json(VectorIndex.manifest_path(path), manifest)
+
+    if new_generation and previous is not None:
+        # processes still mapping the old generation keep reading it until they refresh
+        for old_file in VectorIndex.generation_files(path, previous["generation"]).values():
+            if os.path.exists(old_file):
+                os.remove(old_file)
+    return manifest
+
+
+async def aindex_directory(path: str, directory: str, embedder: VectorEmbedder, chunk_chars: int = 1200, rebuild: bool = False) -> dict:
+    """Bring the index up to date with ``directory``: new documents are appended, and the index is rebuilt
+    when a document was changed or removed (or when ``rebuild`` is set)."""
+    documents = dict(iter_documents(directory))
+    manifest = VectorIndex.read_manifest(path)
+    indexed = manifest["documents"] if manifest is not None else {}
+    changed = [source for source, digest in indexed.items() if source not in documents or _content_hash(documents[source]) != digest]
+    if changed and not rebuild:
+        logger.info("%d documents changed or removed since the index was built; rebuilding it", len(changed))
+        rebuild = True
+    if manifest is not None and manifest["embedder"] != embedder.name:
+        rebuild = True
+    pending = list(documents.items()) if rebuild else [(source, text) for source, text in documents.items() if source not in indexed]
+    if not pending and not rebuild:
+        return manifest
+    return await aadd_documents(path, pending, embedder, chunk_chars=chunk_chars, rebuild=rebuild)
+
+
+class LocalVectorSearchService(AiSearchService):
+    """Knowledge-center search answered from a local VectorIndex instead of a remote search service.
+
+    Questions arriving while a search runs are embedded and searched together in one batch, and the
+    matrix product runs in a worker thread so the event loop keeps serving other calls.
+    """
+
+    def __init__(self, index: VectorIndex, embedder: VectorEmbedder, top_k: int = 5):
+        if index.manifest is not None and index.manifest["embedder"] != embedder.name:
+            raise ValueError(f"index {index.path} was built with {index.manifest['embedder']}, not {embedder.name}")
+        self.index = index
+        self.embedder = embedder
+        self.top_k = top_k
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._flush_task: asyncio.Task = None
+
+        self.queries = 0
+        self.batches = 0
+        self.search_ms = 0.0
+
+    async def get_data(self, user_query):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((user_query, future))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._aflush())
+        hits = await future
+        if not hits:
+            return "none found"
+        return "\n\n".join(f"[{rank}] {chunk['source']}: {chunk['text']}" for rank, chunk in enumerate(hits, 1))
+
+    async def _aflush(self):
+        try:
+            while self._pending:
+                batch, self._pending = self._pending, []
+                # callers that gave up (source timeout) are dropped before any work is done for them
+                batch = [(query, future) for query, future in batch if not future.done()]
+                if not batch:
+                    continue
+                start = time.perf_counter()
+                try:
+                    vectors = await self.embedder.aembed([query for query, _ in batch])
+                    results = await asyncio.to_thread(self._search, vectors)
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                            # the caller may have timed out meanwhile; don't log it as never retrieved
+                            future.exception()
+                    continue
+                finally:
+                    self.batches += 1
+                    self.queries += len(batch)
+                    self.search_ms += (time.perf_counter() - start) * 1000
+                for (_, future), hits in zip(batch, results):
+                    if not future.done():
+                        future.set_result(hits)
+        finally:
+            self._flush_task = None
+
+    def _search(self, vectors: np.ndarray) -> list[list[dict]]:
+        # a zero score shares nothing with the question
+        return [[hit for hit in hits if hit["score"] > 0] for hits in self.index.lookup(vectors, self.top_k)]
+
+    def stats(self) -> dict:
+        return {
+            "rows": self.index.count,
+            "queries": self.queries,
+            "batches": self.batches,
+            "avg_batch_size": self.queries / self.batches if self.batches else 0.0,
+            "avg_batch_ms": self.search_ms / self.batches if self.batches else 0.0,
+        }
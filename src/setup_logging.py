@@ -1,4 +1,5 @@
 import logging
+import telemetry
 from config import AppConfig
 from azure.monitor.opentelemetry.exporter import (
     AzureMonitorLogExporter,
@@ -10,17 +11,26 @@ from opentelemetry.metrics import set_meter_provider
 from opentelemetry.sdk._logs import LoggerProvider, LoggingHandler
 from opentelemetry.sdk._logs.export import BatchLogRecordProcessor
 from opentelemetry.sdk.metrics import MeterProvider
-from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+from opentelemetry.sdk.metrics.export import (
+    ConsoleMetricExporter,
+    InMemoryMetricReader,
+    MetricReader,
+    PeriodicExportingMetricReader,
+)
 from opentelemetry.sdk.metrics.view import DropAggregation, View
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SpanExporter
 from opentelemetry.semconv.resource import ResourceAttributes
 from opentelemetry.trace import set_tracer_provider
 
 # Create a resource to represent the service/sample
 resource = Resource.create({ResourceAttributes.SERVICE_NAME: "telemetry-application-insights-quickstart"})
 
+# azure_monitor sends to Application Insights; console prints spans and metrics; memory keeps the
+# metrics in process for GET /stats; none installs nothing
+TELEMETRY_EXPORTERS = ("azure_monitor", "console", "memory", "none")
+
 def set_up_logging(config: AppConfig):
     exporter = AzureMonitorLogExporter(connection_string=config.app_insights_connstr)
 
@@ -43,8 +53,9 @@ def set_up_logging(config: AppConfig):
     logger.setLevel(logging.INFO)
 
 
-def set_up_tracing(config: AppConfig):
-    exporter = AzureMonitorTraceExporter(connection_string=config.app_insights_connstr)
+def set_up_tracing(config: AppConfig, exporter: SpanExporter = None):
+    if exporter is None:
+        exporter = AzureMonitorTraceExporter(connection_string=config.app_insights_connstr)
 
     # Initialize a trace provider for the application. This is a factory for creating tracers.
     tracer_provider = TracerProvider(resource=resource)
@@ -55,18 +66,55 @@ def set_up_tracing(config: AppConfig):
     set_tracer_provider(tracer_provider)
 
 
-def set_up_metrics(config: AppConfig):
-    exporter = AzureMonitorMetricExporter(connection_string=config.app_insights_connstr)
+def set_up_metrics(config: AppConfig, reader: MetricReader = None):
+    if reader is None:
+        exporter = AzureMonitorMetricExporter(connection_string=config.app_insights_connstr)
+        reader = PeriodicExportingMetricReader(exporter, export_interval_millis=5000)
 
     # Initialize a metric provider for the application. This is a factory for creating meters.
     meter_provider = MeterProvider(
-        metric_readers=[PeriodicExportingMetricReader(exporter, export_interval_millis=5000)],
+        metric_readers=[reader],
         resource=resource,
         views=[
             # Dropping all instrument names except for those starting with "semantic_kernel"
+            # and the pipeline stage instruments defined in telemetry.py
             View(instrument_name="*", aggregation=DropAggregation()),
             View(instrument_name="semantic_kernel*"),
+            View(instrument_name=f"{telemetry.INSTRUMENT_PREFIX}.*"),
         ],
     )
     # Sets the global default meter provider
     set_meter_provider(meter_provider)
+
+
+def set_up_telemetry(config: AppConfig):
+    """Everything both serving modes (app.py for Flask, asgi.py for ASGI) run once per worker at import."""
+    mode = (config.telemetry_exporter or "azure_monitor").strip().lower()
+    if mode not in TELEMETRY_EXPORTERS:
+        raise ValueError(f"Unsupported telemetry exporter {mode}; use one of {', '.join(TELEMETRY_EXPORTERS)}")
+    if mode == "none":
+        return
+    telemetry.enabled = True
+
+    # local profiling: no Application Insights connection string needed
+    if mode == "console":
+        logging.basicConfig(level=logging.INFO)
+        set_up_tracing(config=config, exporter=ConsoleSpanExporter())
+        set_up_metrics(
+            config=config,
+            reader=PeriodicExportingMetricReader(ConsoleMetricExporter(), export_interval_millis=config.telemetry_export_interval_ms),
+        )
+        return
+    if mode == "memory":
+        telemetry.memory_reader = InMemoryMetricReader()
+        set_up_metrics(config=config, reader=telemetry.memory_reader)
+        return
+
+    # setup SK logging, metrics, and tracing
+    set_up_logging(config=config)
+    set_up_tracing(config=config)
+    set_up_metrics(config=config)
+
+    # Configure OpenTelemetry to use Azure Monitor, this is the auto instrumentation
+    from azure.monitor.opentelemetry import configure_azure_monitor
+    configure_azure_monitor(connection_string=config.app_insights_connstr)
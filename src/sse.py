@@ -0,0 +1,10 @@
+import json
+
+# keep proxies (App Service front ends, nginx) from buffering the stream
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def format_sse_event(event: dict) -> str:
+    """``{"type": "token", "text": "..."}`` -> ``event: token`` plus the remaining fields as JSON data."""
+    data = {key: value for key, value in event.items() if key != "type"}
+    return f"event: {event['type']}\ndata: {json.dumps(data)}\n\n"
@@ -0,0 +1,92 @@
+"""Spans and histograms for the stages of the utterance pipeline.
+
+Instruments are named ``pipeline.*``, which the metric views in setup_logging.py let through next to
+``semantic_kernel*``. They are created against the global OpenTelemetry providers, so nothing is
+recorded until ``set_up_telemetry`` has installed them (the benchmarks and tools run without it).
+"""
+
+import json
+import time
+from contextlib import contextmanager
+from opentelemetry import metrics, trace
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+
+INSTRUMENT_PREFIX = "pipeline"
+
+# set by set_up_telemetry; measurements that cost work of their own are skipped until then
+enabled = False
+# the reader of the "memory" exporter mode, summarized by snapshot()
+memory_reader: InMemoryMetricReader = None
+
+tracer = trace.get_tracer(INSTRUMENT_PREFIX)
+meter = metrics.get_meter(INSTRUMENT_PREFIX)
+
+stage_duration = meter.create_histogram(
+    f"{INSTRUMENT_PREFIX}.stage.duration", unit="ms", description="Time spent in one stage of an utterance"
+)
+history_messages = meter.create_histogram(
+    f"{INSTRUMENT_PREFIX}.history.messages", unit="{message}", description="Messages in a call's history when it is loaded"
+)
+prompt_tokens = meter.create_histogram(
+    f"{INSTRUMENT_PREFIX}.prompt.tokens", unit="{token}", description="Prompt tokens of a completion as reported by the model"
+)
+document_size = meter.create_histogram(
+    f"{INSTRUMENT_PREFIX}.document.size", unit="By", description="Serialized size of a chat history write"
+)
+token_acquisition = meter.create_histogram(
+    f"{INSTRUMENT_PREFIX}.credential.token.duration", unit="ms", description="Time to acquire an Azure AD token"
+)
+openai_queue_depth = meter.create_up_down_counter(
+    f"{INSTRUMENT_PREFIX}.openai.queue.depth", unit="{request}", description="Model requests waiting for admission"
+)
+openai_queue_wait = meter.create_histogram(
+    f"{INSTRUMENT_PREFIX}.openai.queue.wait", unit="ms", description="Time a model request waited for admission"
+)
+
+
+@contextmanager
+def stage(name: str, **attributes):
+    """Span ``pipeline.<name>`` around the block, and its duration in the stage histogram.
+
+    ``attributes`` go on both and should have few distinct values (no call ids); per-call details can
+    be set on the yielded span.
+    """
+    start = time.perf_counter()
+    with tracer.start_as_current_span(f"{INSTRUMENT_PREFIX}.{name}", attributes=attributes) as span:
+        try:
+            yield span
+        finally:
+            stage_duration.record((time.perf_counter() - start) * 1000, {"stage": name, **attributes})
+
+
+def record_document_size(operation: str, document):
+    if not enabled:
+        return
+    # the SDK serializes the body again when it sends it; this measures the same compact JSON
+    document_size.record(len(json.dumps(document, separators=(",", ":"))), {"operation": operation})
+
+
+def snapshot() -> dict:
+    """{instrument: {attributes: count, avg, min, max}} of the pipeline histograms (``value`` for the
+    counters), in the memory exporter mode."""
+    if memory_reader is None:
+        return None
+    summary = {}
+    data = memory_reader.get_metrics_data()
+    for resource_metrics in data.resource_metrics if data is not None else []:
+        for scope_metrics in resource_metrics.scope_metrics:
+            for metric in scope_metrics.metrics:
+                if not metric.name.startswith(INSTRUMENT_PREFIX):
+                    continue
+                for point in metric.data.data_points:
+                    label = ",".join(f"{key}={value}" for key, value in sorted(point.attributes.items())) or "all"
+                    if not hasattr(point, "count"):
+                        summary.setdefault(metric.name, {})[label] = {"value": point.value}
+                        continue
+                    summary.setdefault(metric.name, {})[label] = {
+                        "count": point.count,
+                        "avg": point.sum / point.count if point.count else 0.0,
+                        "min": point.min,
+                        "max": point.max,
+                    }
+    return summary
@@ -0,0 +1,198 @@
+import asyncio
+import pytest
+from services.call_debouncer import CallDebouncer, looks_complete
+
+
+class Recorder:
+    """A ProcessFragments that records each run's fragments and can be held before it commits."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.runs: list[list[str]] = []
+        self.committed: list[list[str]] = []
+
+    async def __call__(self, fragments, begin_commit):
+        self.runs.append(fragments)
+        await asyncio.sleep(self.delay)
+        begin_commit()
+        self.committed.append(fragments)
+        return " ".join(fragments)
+
+
+def test_fragments_within_the_window_share_one_run():
+    async def run():
+        debouncer = CallDebouncer(window_seconds=0.05)
+        process = Recorder()
+        first = asyncio.create_task(debouncer.asubmit("call", "what is", process))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(debouncer.asubmit("call", "my copay", process))
+        results = await asyncio.gather(first, second)
+        return debouncer, process, results
+
+    debouncer, process, results = asyncio.run(run())
+    assert results == ["what is my copay", "what is my copay"]
+    assert process.runs == [["what is", "my copay"]]
+    stats = debouncer.stats()
+    assert stats["fragments"] == 2 and stats["runs"] == 1 and stats["llm_invocations_saved"] == 1
+
+
+def test_calls_are_debounced_separately():
+    async def run():
+        debouncer = CallDebouncer(window_seconds=0.02)
+        process = Recorder()
+        return await asyncio.gather(
+            debouncer.asubmit("a", "one", process), debouncer.asubmit("b", "two", process)
+        )
+
+    assert asyncio.run(run()) == ["one", "two"]
+
+
+def test_fragment_cancels_a_run_that_has_not_committed():
+    async def run():
+        debouncer = CallDebouncer(window_seconds=0.01)
+        process = Recorder(delay=0.05)
+        first = asyncio.create_task(debouncer.asubmit("call", "what is", process))
+        # past the window: the first run is waiting on the model
+        await asyncio.sleep(0.03)
+        assert process.runs == [["what is"]]
+        second = asyncio.create_task(debouncer.asubmit("call", "my copay", process))
+        results = await asyncio.gather(first, second)
+        return debouncer, process, results
+
+    debouncer, process, results = asyncio.run(run())
+    assert results == ["what is my copay", "what is my copay"]
+    assert process.committed == [["what is", "my copay"]]
+    stats = debouncer.stats()
+    assert stats["runs"] == 2 and stats["runs_cancelled"] == 1
+
+
+def test_fragment_after_commit_starts_the_next_batch():
+    async def run():
+        debouncer = CallDebouncer(window_seconds=0.01)
+        committing = asyncio.Event()
+        release = asyncio.Event()
+        runs = []
+
+        async def process(fragments, begin_commit):
+            runs.append(fragments)
+            begin_commit()
+            if len(runs) == 1:
+                committing.set()
+                await release.wait()
+            return " ".join(fragments)
+
+        first = asyncio.create_task(debouncer.asubmit("call", "one", process))
+        await committing.wait()
+        second = asyncio.create_task(debouncer.asubmit("call", "two", process))
+        await asyncio.sleep(0.03)
+        # the second batch waits for the committing run of the call
+        assert runs == [["one"]]
+        release.set()
+        return debouncer, runs, await asyncio.gather(first, second)
+
+    debouncer, runs, results = asyncio.run(run())
+    assert results == ["one", "two"]
+    assert runs == [["one"], ["two"]]
+    assert debouncer.stats()["runs_cancelled"] == 0
+
+
+def test_flush_runs_pending_fragments_without_waiting_out_the_window():
+    async def run():
+        debouncer = CallDebouncer(window_seconds=10)
+        process = Recorder()
+        pending = asyncio.create_task(debouncer.asubmit("call", "what is", process))
+        await asyncio.sleep(0)
+        await asyncio.wait_for(debouncer.aflush("call"), timeout=1)
+        assert process.committed == [["what is"]]
+        result = await pending
+
+        # later fragments start a new batch instead of joining the flushed one
+        later = asyncio.create_task(debouncer.asubmit("call", "my copay", process))
+        await asyncio.sleep(0)
+        await debouncer.aflush("call")
+        return debouncer, process, result, await later
+
+    debouncer, process, result, later = asyncio.run(run())
+    assert result == "what is"
+    assert later == "my copay"
+    assert process.committed == [["what is"], ["my copay"]]
+    assert debouncer.stats()["flushes"] == 2
+
+
+def test_flush_without_pending_fragments_does_nothing():
+    async def run():
+        debouncer = CallDebouncer(window_seconds=0.01)
+        await debouncer.aflush("call")
+        return debouncer
+
+    assert asyncio.run(run()).stats()["flushes"] == 0
+
+
+def test_failed_run_reaches_every_fragment():
+    async def run():
+        debouncer = CallDebouncer(window_seconds=0.02)
+
+        async def process(fragments, begin_commit):
+            raise ValueError("model unavailable")
+
+        results = await asyncio.gather(
+            debouncer.asubmit("call", "one", process),
+            debouncer.asubmit("call", "two", process),
+            return_exceptions=True,
+        )
+        # the failed batch is gone; the next fragment gets a fresh run
+        retried = await debouncer.asubmit("call", "three", Recorder())
+        return results, retried
+
+    results, retried = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert retried == "three"
+
+
+@pytest.mark.parametrize(
+    "fragment,complete",
+    [("What is my copay?", True), ("Hi, this is Erin.", True), ('He said "done."', True), ("What is my", False), ("so um", False)],
+)
+def test_looks_complete(fragment, complete):
+    assert looks_complete(fragment) == complete
+
+
+def test_complete_fragment_runs_without_waiting_out_the_window():
+    async def run():
+        debouncer = CallDebouncer(window_seconds=10)
+        process = Recorder()
+        result = await asyncio.wait_for(debouncer.asubmit("call", "What is my copay?", process), timeout=1)
+        return debouncer, result
+
+    debouncer, result = asyncio.run(run())
+    assert result == "What is my copay?"
+    assert debouncer.stats()["immediate"] == 1
+
+
+def test_complete_fragment_ends_the_wait_of_earlier_fragments():
+    async def run():
+        debouncer = CallDebouncer(window_seconds=10)
+        process = Recorder()
+        first = asyncio.create_task(debouncer.asubmit("call", "what is", process))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(debouncer.asubmit("call", "my copay?", process))
+        return process, await asyncio.wait_for(asyncio.gather(first, second), timeout=1)
+
+    process, results = asyncio.run(run())
+    assert results == ["what is my copay?"] * 2
+    assert process.committed == [["what is", "my copay?"]]
+
+
+def test_fragment_after_a_complete_one_still_cancels_its_run():
+    async def run():
+        debouncer = CallDebouncer(window_seconds=0.01)
+        process = Recorder(delay=0.05)
+        first = asyncio.create_task(debouncer.asubmit("call", "What is my copay?", process))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(debouncer.asubmit("call", "For a specialist.", process))
+        return debouncer, process, await asyncio.gather(first, second)
+
+    debouncer, process, results = asyncio.run(run())
+    assert results == ["What is my copay? For a specialist."] * 2
+    assert process.committed == [["What is my copay?", "For a specialist."]]
+    assert debouncer.stats()["runs_cancelled"] == 1
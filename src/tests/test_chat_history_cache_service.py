@@ -0,0 +1,165 @@
+import asyncio
+from semantic_kernel.contents.chat_history import ChatHistory
+from services.chat_history_cache_service import CachedChatHistoryService
+
+
+class FakeStore:
+    """Document-mode stand-in for ChatHistoryCosmosService with a version counter as ETag."""
+
+    history_mode = "document"
+
+    def __init__(self):
+        self.messages: list[str] = []
+        self.etag = 0
+        self.reads = 0
+        self.conditional_reads = 0
+        self.writes = []
+
+    def history(self) -> ChatHistory:
+        chat_history = ChatHistory()
+        for content in self.messages:
+            chat_history.add_user_message(content)
+        return chat_history
+
+    def external_write(self, content: str):
+        self.messages.append(content)
+        self.etag += 1
+
+    async def aread_version(self, call_agent, call_id):
+        return str(self.etag) if self.messages else None
+
+    async def aread_chat_history_if_modified(self, call_agent, call_id, etag):
+        self.conditional_reads += 1
+        if not self.messages:
+            return True, None, None
+        if etag == str(self.etag):
+            return False, None, etag
+        return True, self.history(), str(self.etag)
+
+    async def aread_chat_history(self, call_agent, call_id):
+        self.reads += 1
+        if not self.messages:
+            return None, None
+        return self.history(), str(self.etag)
+
+    async def aappend_chat_history(self, call_agent, call_id, chat_history, start_index=0, etag=None):
+        self.writes.append(etag)
+        if etag is not None and etag != str(self.etag):
+            # the conditional write lost; merge on top of the stored history like the Cosmos service does
+            self.messages.extend(msg.content for msg in chat_history.messages[start_index:])
+            self.etag += 1
+            return self.history(), {"_etag": str(self.etag)}
+        self.messages = self.messages[:start_index] + [msg.content for msg in chat_history.messages[start_index:]]
+        self.etag += 1
+        return chat_history, {"_etag": str(self.etag)}
+
+
+def contents(chat_history: ChatHistory) -> list[str]:
+    return [msg.content for msg in chat_history.messages]
+
+
+async def asave_turn(cache: CachedChatHistoryService, content: str):
+    chat_history, etag = await cache.aread_chat_history("agent", "call")
+    chat_history = chat_history or ChatHistory()
+    start = len(chat_history.messages)
+    chat_history.add_user_message(content)
+    await cache.aappend_chat_history("agent", "call", chat_history, start_index=start, etag=etag)
+
+
+def test_cached_reads_are_served_without_contacting_the_store():
+    async def arun():
+        store = FakeStore()
+        cache = CachedChatHistoryService(store)
+        for content in ("one", "two", "three"):
+            await asave_turn(cache, content)
+        chat_history, _ = await cache.aread_chat_history("agent", "call")
+        return store, cache, chat_history
+
+    store, cache, chat_history = asyncio.run(arun())
+    assert contents(chat_history) == ["one", "two", "three"]
+    assert store.reads == 1
+    assert store.conditional_reads == 0
+    assert cache.stats()["stale_reloads"] == 0
+
+
+def test_write_by_another_worker_is_merged_without_revalidation():
+    async def arun():
+        store = FakeStore()
+        cache = CachedChatHistoryService(store)
+        await asave_turn(cache, "one")
+        store.external_write("other worker")
+        # the cached copy is served as it is, and the conditional write merges
+        await asave_turn(cache, "two")
+        chat_history, _ = await cache.aread_chat_history("agent", "call")
+        return store, cache, chat_history
+
+    store, cache, chat_history = asyncio.run(arun())
+    assert store.messages == ["one", "other worker", "two"]
+    assert contents(chat_history) == ["one", "other worker", "two"]
+    assert cache.stats()["conflicts"] == 1
+
+
+def test_revalidation_is_a_conditional_read_while_unchanged():
+    async def arun():
+        store = FakeStore()
+        cache = CachedChatHistoryService(store, revalidate=True)
+        for content in ("one", "two", "three"):
+            await asave_turn(cache, content)
+        return store, cache
+
+    store, cache = asyncio.run(arun())
+    assert store.reads == 1
+    assert store.conditional_reads == 2
+    assert cache.stats()["stale_reloads"] == 0
+
+
+def test_revalidation_picks_up_a_write_by_another_worker():
+    async def arun():
+        store = FakeStore()
+        cache = CachedChatHistoryService(store, revalidate=True)
+        await asave_turn(cache, "one")
+        store.external_write("other worker")
+        chat_history, etag = await cache.aread_chat_history("agent", "call")
+        return store, cache, chat_history, etag
+
+    store, cache, chat_history, etag = asyncio.run(arun())
+    assert contents(chat_history) == ["one", "other worker"]
+    assert etag == str(store.etag)
+    # the conditional read returned the new document; no second read
+    assert store.reads == 1
+    assert cache.stats()["stale_reloads"] == 1
+
+
+def test_turn_of_an_evicted_entry_is_written_with_the_callers_etag():
+    async def arun():
+        store = FakeStore()
+        cache = CachedChatHistoryService(store)
+        await asave_turn(cache, "one")
+        chat_history, etag = await cache.aread_chat_history("agent", "call")
+        # evicted while the turn runs, and another writer gets in first
+        cache.cache.clear()
+        store.external_write("other worker")
+        chat_history.add_user_message("two")
+        await cache.aappend_chat_history("agent", "call", chat_history, start_index=1, etag=etag)
+        return store, etag
+
+    store, etag = asyncio.run(arun())
+    assert store.writes[-1] == etag
+    assert store.messages == ["one", "other worker", "two"]
+
+
+def test_evicted_entry_without_an_etag_is_merged_onto_the_stored_history():
+    async def arun():
+        store = FakeStore()
+        store.external_write("one")
+        store.external_write("other worker")
+        cache = CachedChatHistoryService(store)
+        chat_history = ChatHistory()
+        chat_history.add_user_message("one")
+        chat_history.add_user_message("two")
+        await cache.aappend_chat_history("agent", "call", chat_history, start_index=1)
+        return store
+
+    store = asyncio.run(arun())
+    assert store.writes[-1] is not None
+    assert store.messages == ["one", "other worker", "two"]
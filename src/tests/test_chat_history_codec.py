@@ -0,0 +1,93 @@
+import json
+import pytest
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.function_call_content import FunctionCallContent
+from semantic_kernel.contents.function_result_content import FunctionResultContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+from services.chat_history_codec import (
+    CODEC_VERSION,
+    decode_message,
+    decode_messages,
+    encode_message,
+    encode_messages,
+    message_count,
+    to_chat_history,
+)
+
+
+def transcript(tool_result: str = "copay is $30") -> list[dict]:
+    chat_history = ChatHistory()
+    chat_history.add_system_message("You are a silent observer.")
+    chat_history.add_user_message("How much is a specialist copay?")
+    chat_history.add_message(
+        ChatMessageContent(
+            role=AuthorRole.ASSISTANT,
+            items=[
+                FunctionCallContent(
+                    id="call_1",
+                    name="KnowledgePlugin-retrieve_benefits_response",
+                    arguments='{"user_query": "specialist copay"}',
+                )
+            ],
+        )
+    )
+    chat_history.add_message(
+        ChatMessageContent(
+            role=AuthorRole.TOOL,
+            items=[FunctionResultContent(id="call_1", name="KnowledgePlugin-retrieve_benefits_response", result=tool_result)],
+        )
+    )
+    chat_history.add_assistant_message("User question: How much is a specialist copay?")
+    return [msg.to_dict() for msg in chat_history.messages]
+
+
+def test_version_1_is_the_default_and_stores_the_messages_as_they_are():
+    messages = transcript()
+    assert CODEC_VERSION == 1
+    assert encode_messages(messages) is messages
+    assert decode_messages(messages) is messages
+
+
+@pytest.mark.parametrize("compress_threshold", [0, 16, 1024])
+def test_version_2_round_trips_through_json(compress_threshold):
+    messages = transcript(tool_result="deductible details " * 200)
+    stored = json.loads(json.dumps(encode_messages(messages, version=2, compress_threshold=compress_threshold)))
+    assert stored["v"] == 2
+    assert decode_messages(stored) == messages
+    assert message_count(stored) == len(messages)
+
+
+def test_version_2_compresses_long_contents_only():
+    long_result = "benefit text " * 200
+    messages = transcript(tool_result=long_result)
+    encoded = encode_messages(messages, version=2, compress_threshold=1024)["m"]
+    assert [("z" in msg) for msg in encoded] == [False, False, False, True, False]
+    assert len(json.dumps(encoded)) < len(json.dumps(messages)) / 2
+
+
+def test_unexpected_fields_and_roles_round_trip():
+    message = {"role": "developer", "content": "note", "metadata": {"source": "x"}}
+    assert decode_message(encode_message(message)) == message
+    tool_call = {"id": "call_1", "type": "function", "function": {"name": "f", "arguments": "{}", "strict": True}}
+    message = {"role": "assistant", "tool_calls": [tool_call]}
+    assert decode_message(encode_message(message)) == message
+
+
+def test_unknown_version_is_rejected():
+    with pytest.raises(ValueError):
+        encode_messages([], version=3)
+    with pytest.raises(ValueError):
+        decode_messages({"v": 3, "m": []})
+
+
+def test_rebuilt_tool_results_resolve_their_function_names():
+    chat_history = to_chat_history(decode_messages(encode_messages(transcript(), version=2)))
+    roles = [msg.role for msg in chat_history.messages]
+    assert roles == [AuthorRole.SYSTEM, AuthorRole.USER, AuthorRole.ASSISTANT, AuthorRole.TOOL, AuthorRole.ASSISTANT]
+    call = chat_history.messages[2].items[0]
+    result = chat_history.messages[3].items[0]
+    assert isinstance(result, FunctionResultContent)
+    assert result.id == call.id == "call_1"
+    assert result.function_name == call.function_name == "retrieve_benefits_response"
+    assert result.result == "copay is $30"
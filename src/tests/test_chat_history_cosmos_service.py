@@ -0,0 +1,237 @@
+import asyncio
+import copy
+import re
+import pytest
+from azure.core import MatchConditions
+from azure.cosmos import exceptions
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+from services.chat_history_codec import encode_messages
+from services import chat_history_cosmos_service as cosmos_module
+from services.chat_history_cosmos_service import ChatHistoryCosmosService, chat_history_document
+
+
+def _field(item: dict, path: str):
+    value = item
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _matches(item: dict, filter_predicate: str) -> bool:
+    # the two forms of predicate the service uses
+    match = re.fullmatch(r"FROM c WHERE (IS_ARRAY|IS_DEFINED)\(c\.([\w.]+)\)", filter_predicate)
+    assert match, filter_predicate
+    value = _field(item, match.group(2))
+    return isinstance(value, list) if match.group(1) == "IS_ARRAY" else value is not None
+
+
+class FakeContainer:
+    """The Cosmos container operations the service uses, with the service's patch semantics.
+
+    Like Cosmos, an "add" to ``/chat/-`` appends when ``chat`` is an array but sets a property named "-"
+    when it is an object, and a path through a missing property or into an array is a bad request.
+    """
+
+    def __init__(self):
+        self.items: dict[str, dict] = {}
+
+    @staticmethod
+    def _error(cls, status_code: int):
+        return cls(status_code=status_code, message=f"{status_code}")
+
+    async def read_item(self, item, partition_key, etag=None, match_condition=None, **kwargs):
+        if item not in self.items:
+            raise self._error(exceptions.CosmosResourceNotFoundError, 404)
+        if match_condition == MatchConditions.IfModified and self.items[item].get("_etag") == etag:
+            # 304 Not Modified: no body
+            return {}
+        return copy.deepcopy(self.items[item])
+
+    async def create_item(self, body, **kwargs):
+        if body["id"] in self.items:
+            raise self._error(exceptions.CosmosResourceExistsError, 409)
+        self.items[body["id"]] = copy.deepcopy(body)
+        return body
+
+    async def patch_item(self, item, partition_key, patch_operations, filter_predicate=None, **kwargs):
+        if item not in self.items:
+            raise self._error(exceptions.CosmosResourceNotFoundError, 404)
+        stored = self.items[item]
+        if filter_predicate is not None and not _matches(stored, filter_predicate):
+            raise self._error(exceptions.CosmosAccessConditionFailedError, 412)
+        for operation in patch_operations:
+            *parents, last = operation["path"].strip("/").split("/")
+            target = stored
+            for part in parents:
+                if not isinstance(target, dict) or part not in target:
+                    raise self._error(exceptions.CosmosHttpResponseError, 400)
+                target = target[part]
+            if operation["op"] == "incr" and isinstance(target, dict) and last in target:
+                target[last] += operation["value"]
+            elif isinstance(target, list) and last == "-":
+                target.append(operation["value"])
+            elif isinstance(target, dict):
+                target[last] = operation["value"]
+            else:
+                raise self._error(exceptions.CosmosHttpResponseError, 400)
+        return copy.deepcopy(stored)
+
+    def query_items(self, query, parameters, partition_key, **kwargs):
+        call_id = parameters[0]["value"]
+
+        matching = [item for item in self.items.values() if item["id"] == call_id or item.get("callId") == call_id]
+        if "c.type = 'turn'" in query:
+            matching = [item for item in matching if item.get("type", "turn") == "turn"]
+
+        async def results():
+            if query.startswith("SELECT VALUE COUNT(1)"):
+                yield len(matching)
+                return
+            for item in matching:
+                yield copy.deepcopy(item)
+
+        return results()
+
+
+def service(codec_version: int = 1, history_mode: str = "document") -> ChatHistoryCosmosService:
+    chat_history_service = ChatHistoryCosmosService(
+        endpoint="https://localhost:8081/",
+        db_name="db",
+        container_name="chathistory",
+        key="a2V5",
+        history_mode=history_mode,
+        codec_version=codec_version,
+    )
+    chat_history_service._container = FakeContainer()
+    return chat_history_service
+
+
+def history(*contents: str) -> ChatHistory:
+    chat_history = ChatHistory()
+    chat_history.add_system_message("You are a silent observer.")
+    for content in contents:
+        chat_history.add_user_message(content)
+    return chat_history
+
+
+def store_document(chat_history_service: ChatHistoryCosmosService, chat_history: ChatHistory, version: int):
+    chat = encode_messages([msg.to_dict() for msg in chat_history.messages], version=version)
+    document = chat_history_document("agent", "call", chat)
+    chat_history_service._container.items[document["id"]] = document
+
+
+def contents(chat_history: ChatHistory) -> list[str]:
+    return [msg.content for msg in chat_history.messages]
+
+
+@pytest.mark.parametrize("stored_version,writer_version", [(1, 1), (2, 2), (2, 1), (1, 2)])
+def test_append_message_follows_the_stored_layout(stored_version, writer_version):
+    chat_history_service = service(codec_version=writer_version)
+    store_document(chat_history_service, history("what is my copay"), stored_version)
+    advocate = ChatMessageContent(role=AuthorRole.ASSISTANT, content="Advocate: It is $30.")
+
+    async def run():
+        await chat_history_service.aappend_message("agent", "call", advocate)
+        return await chat_history_service.aget_chat_history("agent", "call")
+
+    loaded = asyncio.run(run())
+    assert contents(loaded) == ["You are a silent observer.", "what is my copay", "Advocate: It is $30."]
+    stored = chat_history_service._container.items["call"]["chat"]
+    # the document keeps the layout it was written with
+    assert isinstance(stored, list) if stored_version == 1 else "-" not in stored
+
+
+def test_append_message_creates_the_document_of_a_new_call():
+    chat_history_service = service(codec_version=1)
+    advocate = ChatMessageContent(role=AuthorRole.ASSISTANT, content="Advocate: Hello.")
+
+    async def run():
+        await chat_history_service.aappend_message("agent", "call", advocate)
+        return await chat_history_service.aget_chat_history("agent", "call")
+
+    assert contents(asyncio.run(run())) == ["Advocate: Hello."]
+
+
+def test_conditional_read_returns_the_history_only_when_the_etag_changed():
+    chat_history_service = service()
+    store_document(chat_history_service, history("what is my copay"), 1)
+    document = chat_history_service._container.items["call"]
+    document["_etag"] = "1"
+
+    async def run():
+        unchanged = await chat_history_service.aread_chat_history_if_modified("agent", "call", "1")
+        document["chat"].append({"role": "user", "content": "and my deductible"})
+        document["_etag"] = "2"
+        changed = await chat_history_service.aread_chat_history_if_modified("agent", "call", "1")
+        gone = await chat_history_service.aread_chat_history_if_modified("agent", "other call", "1")
+        return unchanged, changed, gone
+
+    unchanged, (modified, chat_history, etag), gone = asyncio.run(run())
+    assert unchanged == (False, None, "1")
+    assert modified and etag == "2"
+    assert contents(chat_history)[-1] == "and my deductible"
+    assert gone == (True, None, None)
+
+
+def test_turn_items_are_ordered_by_sequence_not_by_the_writers_clock(monkeypatch):
+    chat_history_service = service(history_mode="turns")
+    # each write comes from a host whose clock is further behind than the previous one
+    clock = iter(range(10_000, 0, -1000))
+    monkeypatch.setattr(cosmos_module.time, "time_ns", lambda: next(clock))
+
+    async def run():
+        chat_history = history("what is my copay")
+        await chat_history_service.asave_chat_history("agent", "call", chat_history)
+        for content in ("Advocate: Let me check.", "Advocate: It is $30."):
+            await chat_history_service.aappend_message(
+                "agent", "call", ChatMessageContent(role=AuthorRole.ASSISTANT, content=content)
+            )
+        loaded = await chat_history_service.aget_chat_history("agent", "call")
+        start_index = len(loaded.messages)
+        loaded.add_user_message("and my deductible")
+        await chat_history_service.asave_chat_history("agent", "call", loaded, start_index=start_index)
+        await chat_history_service.aappend_message(
+            "agent", "call", ChatMessageContent(role=AuthorRole.ASSISTANT, content="Advocate: $500.")
+        )
+        return await chat_history_service.aget_chat_history("agent", "call"), await chat_history_service.aread_version(
+            "agent", "call"
+        )
+
+    loaded, version = asyncio.run(run())
+    assert contents(loaded) == [
+        "You are a silent observer.",
+        "what is my copay",
+        "Advocate: Let me check.",
+        "Advocate: It is $30.",
+        "and my deductible",
+        "Advocate: $500.",
+    ]
+    items = chat_history_service._container.items
+    assert items["call:seq"]["value"] == 5
+    # the counter is not a turn item
+    assert version == "5"
+
+
+def test_turn_items_written_before_sequences_keep_their_order():
+    chat_history_service = service(history_mode="turns")
+    store_document(chat_history_service, history("what is my copay"), 1)
+    items = chat_history_service._container.items
+    legacy = [("Advocate: It is $30.", 2), ("and my deductible", 1)]
+    for ts, (content, start) in enumerate(legacy, start=1):
+        chat = encode_messages([{"role": "user", "content": content}], version=1)
+        item = cosmos_module.chat_turn_document("agent", "call", start + 10, chat)
+        del item["seq"]
+        item["ts"] = ts
+        items[item["id"]] = item
+
+    async def run():
+        await chat_history_service.aappend_message(
+            "agent", "call", ChatMessageContent(role=AuthorRole.ASSISTANT, content="Advocate: $500.")
+        )
+        return await chat_history_service.aget_chat_history("agent", "call")
+
+    assert contents(asyncio.run(run()))[2:] == ["Advocate: It is $30.", "and my deductible", "Advocate: $500."]
@@ -0,0 +1,153 @@
+import asyncio
+import time
+import pytest
+from azure.core.credentials import AccessToken
+from services.credential_manager import COGNITIVE_SERVICES_SCOPE, CredentialManager
+
+SCOPE = "https://cosmos.azure.com/.default"
+
+
+class FakeCredential:
+    """Issues numbered tokens valid for ``lifetime`` seconds; queued errors are raised by the next requests."""
+
+    def __init__(self, lifetime: float = 3600):
+        self.lifetime = lifetime
+        self.errors: list[Exception] = []
+        self.requests = []
+        self.release = asyncio.Event()
+        self.release.set()
+        self.closed = False
+
+    async def get_token(self, *scopes, **kwargs) -> AccessToken:
+        self.requests.append((scopes, kwargs))
+        await self.release.wait()
+        if self.errors:
+            raise self.errors.pop(0)
+        # fractional expiry times, so the tests can work with lifetimes of a fraction of a second
+        return AccessToken(f"token-{len(self.requests)}", time.time() + self.lifetime)
+
+    async def close(self):
+        self.closed = True
+
+
+def manager(credential: FakeCredential, **kwargs) -> CredentialManager:
+    return CredentialManager(credential=credential, **kwargs)
+
+
+def test_tokens_are_served_from_the_cache():
+    credential = FakeCredential()
+
+    async def run():
+        async with manager(credential) as credentials:
+            await credentials.astartup(COGNITIVE_SERVICES_SCOPE)
+            provide = credentials.token_provider()
+            tokens = [await provide(), await provide(), (await credentials.get_token(SCOPE)).token]
+            return tokens, credentials.stats()
+
+    tokens, stats = asyncio.run(run())
+    assert tokens == ["token-1", "token-1", "token-2"]
+    assert stats["acquisitions"] == 2 and stats["cache_hits"] == 2 and stats["on_demand"] == 1
+    assert set(stats["scopes"]) == {COGNITIVE_SERVICES_SCOPE, SCOPE}
+    assert credential.closed
+
+
+def test_claims_challenges_bypass_the_cache():
+    credential = FakeCredential()
+
+    async def run():
+        async with manager(credential) as credentials:
+            cached = await credentials.get_token(SCOPE)
+            challenged = await credentials.get_token(SCOPE, claims='{"access_token": {}}')
+            return cached, challenged, await credentials.get_token(SCOPE)
+
+    cached, challenged, again = asyncio.run(run())
+    assert challenged.token != cached.token and again.token == cached.token
+    assert credential.requests[1][1]["claims"] == '{"access_token": {}}'
+
+
+def test_concurrent_misses_share_one_fetch_that_outlives_a_cancelled_caller():
+    credential = FakeCredential()
+
+    async def run():
+        async with manager(credential) as credentials:
+            credential.release.clear()
+            callers = [asyncio.create_task(credentials.get_token(SCOPE)) for _ in range(3)]
+            await asyncio.sleep(0)
+            callers[0].cancel()
+            await asyncio.sleep(0)
+            credential.release.set()
+            results = await asyncio.gather(*callers, return_exceptions=True)
+            return results, credentials.stats()
+
+    (cancelled, *tokens), stats = asyncio.run(run())
+    assert isinstance(cancelled, asyncio.CancelledError)
+    assert [token.token for token in tokens] == ["token-1", "token-1"]
+    assert len(credential.requests) == 1
+    assert stats["acquisitions"] == 1 and stats["on_demand"] == 3
+
+
+def test_the_token_is_refreshed_in_the_background_before_it_expires():
+    credential = FakeCredential(lifetime=10)
+
+    async def run():
+        # each token is refreshed 0.2 s after it was issued
+        async with manager(credential, refresh_margin_seconds=9.8, retry_seconds=60) as credentials:
+            first = await credentials.get_token(SCOPE)
+            await asyncio.sleep(0.3)
+            refreshed = await credentials.get_token(SCOPE)
+            return first, refreshed, credentials.stats()
+
+    first, refreshed, stats = asyncio.run(run())
+    assert (first.token, refreshed.token) == ("token-1", "token-2")
+    # the request after the refresh was served from the cache
+    assert stats["on_demand"] == 1 and stats["cache_hits"] == 1 and stats["acquisitions"] == 2
+
+
+def test_an_expired_token_is_fetched_on_demand():
+    credential = FakeCredential(lifetime=0.05)
+
+    async def run():
+        # no refresh before it expires
+        async with manager(credential, refresh_margin_seconds=0, retry_seconds=60) as credentials:
+            await credentials.astartup(SCOPE)
+            credentials._refresh_tasks[(SCOPE,)].cancel()
+            await asyncio.sleep(0.1)
+            return await credentials.get_token(SCOPE), credentials.stats()
+
+    token, stats = asyncio.run(run())
+    assert token.token == "token-2" and stats["on_demand"] == 1 and stats["cache_hits"] == 0
+
+
+def test_a_failed_fetch_is_raised_and_not_cached():
+    credential = FakeCredential()
+    credential.errors.append(RuntimeError("no identity available"))
+
+    async def run():
+        async with manager(credential) as credentials:
+            with pytest.raises(RuntimeError):
+                await credentials.get_token(SCOPE)
+            return await credentials.get_token(SCOPE), credentials.stats()
+
+    token, stats = asyncio.run(run())
+    assert token.token == "token-2"
+    assert stats["acquisition_errors"] == 1 and stats["acquisitions"] == 2
+
+
+def test_a_failed_refresh_keeps_the_cached_token_and_retries():
+    credential = FakeCredential(lifetime=10)
+
+    async def run():
+        # the refresh at 0.1 s fails and is retried at 0.3 s
+        async with manager(credential, refresh_margin_seconds=9.9, retry_seconds=0.2) as credentials:
+            first = await credentials.get_token(SCOPE)
+            credential.errors.append(RuntimeError("token endpoint unavailable"))
+            await asyncio.sleep(0.2)
+            # requests keep the cached token until the retry succeeds
+            during = await credentials.get_token(SCOPE)
+            await asyncio.sleep(0.15)
+            return first, during, await credentials.get_token(SCOPE), credentials.stats()
+
+    first, during, after, stats = asyncio.run(run())
+    assert during.token == first.token == "token-1"
+    assert after.token == "token-3"
+    assert stats["acquisition_errors"] == 1 and stats["on_demand"] == 1
@@ -0,0 +1,134 @@
+import pytest
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.function_call_content import FunctionCallContent
+from semantic_kernel.contents.function_result_content import FunctionResultContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+from services.history_reducer import SUMMARY_HEADER, HistoryReducer, TokenBudgetHistoryReducer
+
+
+def count_chars(message: ChatMessageContent) -> int:
+    # one "token" per character of text and tool results, so budgets are easy to reason about
+    total = len(message.content or "")
+    for item in message.items:
+        if isinstance(item, FunctionResultContent):
+            total += len(str(item.result))
+    return total
+
+
+def conversation(turns: int, tool_result: str = "r" * 100) -> ChatHistory:
+    chat_history = ChatHistory()
+    chat_history.add_system_message("You are a silent observer.")
+    for turn in range(turns):
+        name = "KnowledgePlugin-retrieve_kc_response"
+        call_id = f"call_{turn}"
+        chat_history.add_user_message(f"question {turn}")
+        chat_history.add_message(
+            ChatMessageContent(
+                role=AuthorRole.ASSISTANT,
+                items=[FunctionCallContent(id=call_id, name=name, arguments=f'{{"user_query": "question {turn}"}}')],
+            )
+        )
+        chat_history.add_message(
+            ChatMessageContent(role=AuthorRole.TOOL, items=[FunctionResultContent(id=call_id, name=name, result=tool_result)])
+        )
+        chat_history.add_assistant_message(f"answer {turn}")
+    return chat_history
+
+
+def tool_results(chat_history: ChatHistory) -> list[str]:
+    return [
+        str(item.result)
+        for msg in chat_history.messages
+        for item in msg.items
+        if isinstance(item, FunctionResultContent)
+    ]
+
+
+def test_history_under_the_budget_is_sent_unchanged():
+    chat_history = conversation(3)
+    reducer = TokenBudgetHistoryReducer(token_budget=10_000, token_counter=count_chars)
+    reduction = reducer.reduce(chat_history)
+    assert reduction.chat_history is chat_history
+    assert not reduction.reduced
+    assert reducer.stats()["reductions"] == 0
+
+
+def test_older_turns_become_a_summary_without_their_tool_calls():
+    chat_history = conversation(6)
+    reducer = TokenBudgetHistoryReducer(token_budget=600, keep_turns=2, token_counter=count_chars)
+    reduction = reducer.reduce(chat_history)
+    messages = reduction.chat_history.messages
+
+    assert reduction.reduced and reduction.tokens_after <= 600
+    assert messages[0].content == "You are a silent observer."
+    summary = messages[1]
+    assert summary.role == AuthorRole.SYSTEM
+    assert summary.content == "\n".join(
+        [SUMMARY_HEADER, *(line for turn in range(4) for line in (f"USER: question {turn}", f"ASSISTANT: answer {turn}"))]
+    )
+    # the last two turns are kept verbatim
+    assert messages[2].content == "question 4"
+    # every tool call still sent has its result
+    calls = {item.id for msg in messages for item in msg.items if isinstance(item, FunctionCallContent)}
+    results = {item.id for msg in messages for item in msg.items if isinstance(item, FunctionResultContent)}
+    assert calls == results == {"call_4", "call_5"}
+    # the persisted history is untouched
+    assert len(chat_history.messages) == 1 + 6 * 4
+
+
+def test_tool_results_outside_the_newest_turn_are_truncated():
+    chat_history = conversation(3, tool_result="r" * 1000)
+    reducer = TokenBudgetHistoryReducer(
+        token_budget=1500, keep_turns=3, tool_result_max_chars=50, token_counter=count_chars
+    )
+    reduction = reducer.reduce(chat_history)
+    assert tool_results(reduction.chat_history) == ["r" * 50 + "...[truncated]"] * 2 + ["r" * 1000]
+    assert tool_results(chat_history) == ["r" * 1000] * 3
+
+
+def test_fewer_turns_are_kept_when_the_budget_still_is_not_met():
+    chat_history = conversation(4, tool_result="r" * 1000)
+    reducer = TokenBudgetHistoryReducer(
+        token_budget=1600, keep_turns=4, tool_result_max_chars=300, token_counter=count_chars
+    )
+    reduction = reducer.reduce(chat_history)
+    assert reduction.tokens_after <= 1600
+    user_messages = [msg.content for msg in reduction.chat_history.messages if msg.role == AuthorRole.USER]
+    assert user_messages == ["question 2", "question 3"]
+
+
+def test_earlier_summary_is_folded_into_the_new_one_and_capped():
+    reducer = TokenBudgetHistoryReducer(token_budget=400, keep_turns=1, token_counter=count_chars)
+    first = reducer.reduce(conversation(4)).chat_history
+
+    # the next turns are appended to the reduced history, which is then reduced again
+    for turn in range(4, 8):
+        first.add_user_message(f"question {turn}")
+        first.add_assistant_message(f"answer {turn}")
+    second = reducer.reduce(first).chat_history
+    summaries = [msg.content for msg in second.messages if msg.content and msg.content.startswith(SUMMARY_HEADER)]
+    assert len(summaries) == 1
+    assert "USER: question 0" in summaries[0] and "USER: question 6" in summaries[0]
+
+    capped = TokenBudgetHistoryReducer(token_budget=400, keep_turns=1, summary_max_chars=40, token_counter=count_chars)
+    summary = capped.reduce(conversation(6)).chat_history.messages[1].content
+    # the oldest lines fall off first
+    assert summary.splitlines()[1:] == ["USER: question 4", "ASSISTANT: answer 4"]
+
+
+def test_long_utterances_are_trimmed_in_the_summary():
+    chat_history = ChatHistory()
+    chat_history.add_user_message("q" * 500)
+    chat_history.add_assistant_message("answer")
+    chat_history.add_user_message("latest question")
+    reducer = TokenBudgetHistoryReducer(
+        token_budget=100, keep_turns=1, utterance_max_chars=10, token_counter=count_chars
+    )
+    summary = reducer.reduce(chat_history).chat_history.messages[0].content
+    assert f"USER: {'q' * 10}...[truncated]" in summary.splitlines()
+
+
+def test_history_reducer_is_abstract():
+    with pytest.raises(TypeError):
+        HistoryReducer()
@@ -0,0 +1,94 @@
+import asyncio
+from services.keyed_locks import KeyedLocks
+
+
+def test_holders_of_a_key_run_one_at_a_time_in_arrival_order():
+    async def run():
+        locks = KeyedLocks()
+        order = []
+
+        async def hold(name):
+            async with locks.hold("call"):
+                order.append(f"{name} in")
+                await asyncio.sleep(0.01)
+                order.append(f"{name} out")
+
+        tasks = [asyncio.create_task(hold(name)) for name in ("a", "b", "c")]
+        await asyncio.sleep(0)
+        assert locks.waiting("call") == 3
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["a in", "a out", "b in", "b out", "c in", "c out"]
+
+
+def test_different_keys_do_not_wait_on_each_other():
+    async def run():
+        locks = KeyedLocks()
+
+        async def enter(key):
+            async with locks.hold(key):
+                pass
+
+        async with locks.hold("a"):
+            # would time out if "b" shared the lock of "a"
+            await asyncio.wait_for(enter("b"), timeout=1)
+
+    asyncio.run(run())
+
+
+def test_lock_is_dropped_once_unused():
+    async def run():
+        locks = KeyedLocks()
+        async with locks.hold("call"):
+            assert len(locks) == 1
+            assert locks.waiting("call") == 1
+        assert len(locks) == 0
+        assert locks.waiting("call") == 0
+
+    asyncio.run(run())
+
+
+def test_lock_is_released_when_the_holder_raises():
+    async def run():
+        locks = KeyedLocks()
+        try:
+            async with locks.hold("call"):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+        assert len(locks) == 0
+        async with locks.hold("call"):
+            pass
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_does_not_leak_the_lock():
+    async def run():
+        locks = KeyedLocks()
+        entered = asyncio.Event()
+        release = asyncio.Event()
+
+        async def holder():
+            async with locks.hold("call"):
+                entered.set()
+                await release.wait()
+
+        async def waiter():
+            async with locks.hold("call"):
+                pass
+
+        holding = asyncio.create_task(holder())
+        await entered.wait()
+        waiting = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+        assert locks.waiting("call") == 2
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert locks.waiting("call") == 1
+        release.set()
+        await holding
+        assert len(locks) == 0
+
+    asyncio.run(run())
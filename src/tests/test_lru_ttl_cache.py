@@ -0,0 +1,78 @@
+import time
+from services.lru_ttl_cache import LruTtlCache
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    evicted = []
+    cache = LruTtlCache(max_entries=2, on_evict=lambda key, value: evicted.append(key))
+    cache.set("a", 1)
+    cache.set("b", 2)
+    # reading "a" makes "b" the least recently used
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert evicted == ["b"]
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_peek_does_not_touch_recency_or_counters():
+    cache = LruTtlCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.peek("a") == 1
+    cache.set("c", 3)
+    assert "a" not in cache
+    assert cache.stats()["hits"] == 0 and cache.stats()["misses"] == 0
+
+
+def test_weight_cap_evicts_until_under_the_limit():
+    cache = LruTtlCache(max_entries=10, max_weight=10, weigher=len)
+    cache.set("a", "xxxx")
+    cache.set("b", "xxxx")
+    cache.set("c", "xxxx")
+    assert "a" not in cache
+    assert cache.weight == 8
+    # replacing an entry replaces its weight
+    cache.set("b", "x")
+    assert cache.weight == 5
+
+
+def test_single_entry_over_the_weight_cap_is_kept():
+    cache = LruTtlCache(max_entries=10, max_weight=2, weigher=len)
+    cache.set("a", "xxxx")
+    assert cache.get("a") == "xxxx"
+
+
+def test_idle_entries_expire():
+    expired = []
+    cache = LruTtlCache(max_entries=10, ttl_seconds=0.05, on_evict=lambda key, value: expired.append(key))
+    cache.set("a", 1)
+    cache.set("b", 2)
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert "b" not in cache
+    cache.expire()
+    assert expired == ["a", "b"]
+    assert len(cache) == 0
+    stats = cache.stats()
+    assert stats["expirations"] == 2 and stats["misses"] == 1
+
+
+def test_reads_keep_an_entry_alive():
+    cache = LruTtlCache(max_entries=10, ttl_seconds=0.1)
+    cache.set("a", 1)
+    for _ in range(3):
+        time.sleep(0.04)
+        assert cache.get("a") == 1
+
+
+def test_pop_and_clear_do_not_call_on_evict():
+    evicted = []
+    cache = LruTtlCache(max_entries=10, on_evict=lambda key, value: evicted.append(key))
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.pop("a") == 1
+    assert cache.pop("missing", "default") == "default"
+    cache.clear()
+    assert evicted == [] and len(cache) == 0 and cache.weight == 0
@@ -0,0 +1,164 @@
+import asyncio
+import httpx
+import pytest
+from services.openai_scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_CLASSIFICATION,
+    PRIORITY_COMPLETION,
+    OpenAIRequestScheduler,
+    RequestShedError,
+    ScheduledTransport,
+    TokenBucket,
+    request_priority,
+    was_shed,
+)
+
+
+def test_token_bucket_disabled_never_waits():
+    bucket = TokenBucket(0)
+    bucket.take(1_000_000, now=0)
+    assert bucket.wait_seconds(1_000_000, now=0) == 0
+
+
+def test_token_bucket_refills_continuously():
+    bucket = TokenBucket(60)
+    bucket.updated = 0
+    bucket.take(60, now=0)
+    # one unit per second
+    assert bucket.wait_seconds(10, now=0) == pytest.approx(10)
+    assert bucket.wait_seconds(10, now=4) == pytest.approx(6)
+    assert bucket.wait_seconds(10, now=10) == 0
+
+
+def test_token_bucket_caps_requests_larger_than_the_budget():
+    bucket = TokenBucket(60)
+    bucket.updated = 0
+    # a request over a minute's budget runs once the bucket is full instead of never
+    assert bucket.wait_seconds(1000, now=0) == 0
+    bucket.take(1000, now=0)
+    assert bucket.level == 0
+
+
+def test_token_bucket_follows_remaining_reported_by_the_service():
+    bucket = TokenBucket(100)
+    bucket.updated = 0
+    bucket.observe_remaining(5, now=0)
+    assert bucket.level == 5
+    # a higher count never raises the local level
+    bucket.observe_remaining(80, now=0)
+    assert bucket.level == 5
+
+
+def test_queued_requests_are_admitted_by_priority():
+    async def arun():
+        scheduler = OpenAIRequestScheduler(max_concurrency=1)
+        await scheduler.aacquire(1)
+        admitted = []
+
+        async def arequest(name: str, priority: int):
+            await scheduler.aacquire(1, priority=priority)
+            admitted.append(name)
+            scheduler.release()
+
+        tasks = [
+            asyncio.create_task(arequest("background", PRIORITY_BACKGROUND)),
+            asyncio.create_task(arequest("classification", PRIORITY_CLASSIFICATION)),
+            asyncio.create_task(arequest("completion", PRIORITY_COMPLETION)),
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queued"] == {"completion": 1, "classification": 1, "background": 1}
+        scheduler.release()
+        await asyncio.gather(*tasks)
+        return admitted, scheduler.stats()
+
+    admitted, stats = asyncio.run(arun())
+    assert admitted == ["completion", "classification", "background"]
+    assert stats["in_flight"] == 0
+    assert stats["admitted"] == {"completion": 2, "classification": 1, "background": 1}
+
+
+def test_priority_defaults_to_the_current_context():
+    async def arun():
+        scheduler = OpenAIRequestScheduler(max_concurrency=0)
+        with request_priority(PRIORITY_CLASSIFICATION):
+            await scheduler.aacquire(1)
+        await scheduler.aacquire(1)
+        return scheduler.stats()["admitted"]
+
+    assert asyncio.run(arun()) == {"completion": 1, "classification": 1, "background": 0}
+
+
+def test_request_waiting_past_max_queue_seconds_is_shed():
+    async def arun():
+        scheduler = OpenAIRequestScheduler(max_concurrency=1, max_queue_seconds=0.05)
+        await scheduler.aacquire(1)
+        with pytest.raises(RequestShedError):
+            await scheduler.aacquire(1, priority=PRIORITY_BACKGROUND)
+        # the slot holder is unaffected and the next request is admitted once it is released
+        scheduler.release()
+        await asyncio.wait_for(scheduler.aacquire(1), timeout=1)
+        return scheduler.stats()
+
+    stats = asyncio.run(arun())
+    assert stats["shed"]["background"] == 1
+    assert stats["queued"]["background"] == 0
+
+
+def test_was_shed_finds_the_error_through_wrappers():
+    try:
+        try:
+            raise RequestShedError("shed")
+        except RequestShedError as e:
+            raise RuntimeError("service failed") from e
+    except RuntimeError as wrapped:
+        assert was_shed(wrapped)
+    assert not was_shed(RuntimeError("other"))
+
+
+def test_throttle_pauses_admissions():
+    async def arun():
+        scheduler = OpenAIRequestScheduler()
+        scheduler.throttle(0.1)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await scheduler.aacquire(1)
+        return loop.time() - started
+
+    assert asyncio.run(arun()) >= 0.09
+
+
+def test_transport_requeues_429_and_marks_the_last_one_final():
+    responses = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        responses.append(request)
+        return httpx.Response(429, headers={"retry-after-ms": "1"})
+
+    async def arun():
+        scheduler = OpenAIRequestScheduler(max_throttle_retries=2)
+        transport = ScheduledTransport(scheduler, httpx.MockTransport(handler))
+        async with httpx.AsyncClient(transport=transport) as client:
+            response = await client.post("https://example.test/chat", content=b"{}")
+        return response, scheduler.stats()
+
+    response, stats = asyncio.run(arun())
+    assert len(responses) == 3
+    assert stats["throttled"] == 2
+    assert stats["in_flight"] == 0
+    # the OpenAI client must not retry on top of the scheduler
+    assert response.headers["x-should-retry"] == "false"
+
+
+def test_transport_leaves_server_errors_to_the_client_retries():
+    async def arun():
+        scheduler = OpenAIRequestScheduler()
+        transport = ScheduledTransport(scheduler, httpx.MockTransport(lambda request: httpx.Response(503)))
+        async with httpx.AsyncClient(transport=transport) as client:
+            response = await client.post("https://example.test/chat", content=b"{}")
+        return response, scheduler.stats()
+
+    response, stats = asyncio.run(arun())
+    assert response.status_code == 503
+    assert "x-should-retry" not in response.headers
+    assert stats["in_flight"] == 0
+    assert stats["throttled"] == 0
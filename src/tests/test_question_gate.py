@@ -0,0 +1,118 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from services.keyword_intent_classifier import KeywordIntentClassifier
+from services.question_gate import NO_QUESTION, QUESTION, UNCERTAIN, QuestionGate, heuristic_verdict
+
+
+@pytest.fixture(scope="module")
+def classifier() -> KeywordIntentClassifier:
+    return KeywordIntentClassifier.from_prompt_file()
+
+
+class FakeKernel:
+    """Answers the QuestionDetector prompt with a fixed reply, or fails."""
+
+    def __init__(self, answer: str = "NO", error: Exception = None):
+        self.answer = answer
+        self.error = error
+        self.inputs = []
+        self.plugins = {"QuestionPlugin": {"QuestionDetector": "QuestionDetector"}}
+
+    async def invoke(self, function, arguments):
+        self.inputs.append(arguments["input"])
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(value=[SimpleNamespace(content=self.answer)])
+
+
+@pytest.mark.parametrize(
+    "utterance,verdict",
+    [
+        ("Is this covered?", QUESTION),
+        ("what is my deductible", QUESTION),
+        ("So, how much is an MRI", QUESTION),
+        ("I want to know if acupuncture is covered", QUESTION),
+        ("Hi, this is Erin Smith.", NO_QUESTION),
+        ("Thanks so much", NO_QUESTION),
+        ("ok", NO_QUESTION),
+        ("my member id is 12345", UNCERTAIN),
+        ("my specialist copay for the gold plan", UNCERTAIN),
+        # a service request phrased as a statement: why enforcing modes are opt-in
+        ("my card hasn't arrived", NO_QUESTION),
+    ],
+)
+def test_heuristic_verdict(utterance, verdict, classifier):
+    assert heuristic_verdict(utterance, classifier) == verdict
+
+
+def test_heuristic_verdict_without_a_classifier_has_no_uncertain_tier():
+    assert heuristic_verdict("my member id is 12345") == NO_QUESTION
+
+
+def test_utterances_under_min_words_have_no_question_unless_asked(classifier):
+    assert heuristic_verdict("specialist copay", classifier, min_words=3) == NO_QUESTION
+    assert heuristic_verdict("specialist copay", classifier, min_words=2) == UNCERTAIN
+    assert heuristic_verdict("copay?", classifier, min_words=3) == QUESTION
+
+
+def run_gate(gate: QuestionGate, utterances: list[str]) -> list[bool]:
+    async def run():
+        return [await gate.ahas_question(utterance) for utterance in utterances]
+
+    return asyncio.run(run())
+
+
+UTTERANCES = ["Hi, this is Erin Smith.", "what is my deductible", "my member id is 12345", "my card hasn't arrived"]
+
+
+def test_shadow_is_the_default_and_only_counts(classifier):
+    gate = QuestionGate(classifier=classifier)
+    assert gate.mode == "shadow" and not gate.enforcing
+    results = run_gate(gate, UTTERANCES)
+    # the verdicts are reported, but the caller does not act on them in shadow mode
+    assert results == [False, True, True, False]
+    gate.record_shadow_false_negative()
+    stats = gate.stats()
+    assert stats["evaluated"] == 4
+    assert stats["shadow_skips"] == 2 and stats["shadow_false_negatives"] == 1
+    assert stats["skipped_by_heuristic"] == 0 and stats["skipped_by_llm"] == 0
+    assert stats["gate_hit_rate"] == 0.5
+
+
+def test_heuristic_mode_lets_uncertain_utterances_through(classifier):
+    gate = QuestionGate(mode="heuristic", classifier=classifier)
+    assert gate.enforcing
+    assert run_gate(gate, UTTERANCES) == [False, True, True, False]
+    stats = gate.stats()
+    assert stats["skipped_by_heuristic"] == 2
+    assert stats["llm_checks"] == 0 and stats["shadow_skips"] == 0
+
+
+def test_llm_mode_checks_only_uncertain_utterances(classifier):
+    kernel = FakeKernel(answer="NO")
+    gate = QuestionGate(mode="llm", kernel=kernel, classifier=classifier)
+    assert run_gate(gate, UTTERANCES) == [False, True, False, False]
+    assert kernel.inputs == ["my member id is 12345"]
+    stats = gate.stats()
+    assert stats["llm_checks"] == 1
+    assert stats["skipped_by_llm"] == 1 and stats["skipped_by_heuristic"] == 2
+
+
+def test_llm_mode_processes_the_utterance_when_the_detector_fails(classifier):
+    gate = QuestionGate(mode="llm", kernel=FakeKernel(error=RuntimeError("unavailable")), classifier=classifier)
+    assert run_gate(gate, ["my member id is 12345"]) == [True]
+    assert gate.stats()["skipped_by_llm"] == 0
+
+
+def test_off_mode_evaluates_nothing(classifier):
+    gate = QuestionGate(mode="off", classifier=classifier)
+    assert run_gate(gate, UTTERANCES) == [True] * 4
+    assert gate.stats()["evaluated"] == 0
+
+
+def test_invalid_configurations_are_rejected():
+    with pytest.raises(ValueError):
+        QuestionGate(mode="strict")
+    with pytest.raises(ValueError):
+        QuestionGate(mode="llm")
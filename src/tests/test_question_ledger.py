@@ -0,0 +1,112 @@
+from semantic_kernel.contents.chat_history import ChatHistory
+from semantic_kernel.contents.chat_message_content import ChatMessageContent
+from semantic_kernel.contents.function_call_content import FunctionCallContent
+from semantic_kernel.contents.function_result_content import FunctionResultContent
+from semantic_kernel.contents.utils.author_role import AuthorRole
+from services.question_ledger import BENEFITS_FUNCTION, KC_FUNCTION, QuestionLedger, QuestionLedgerService
+
+BENEFITS_RESULT = "{'intent': 'Benefits', 'information': 'Specialist copay is $30'}"
+KC_RESULT = "{'intent': 'General', 'information': 'Call the nurse line at 555-0100'}"
+
+
+def add_tool_turn(chat_history: ChatHistory, call_id: str, function: str, question: str, result: str):
+    name = f"KnowledgePlugin-{function}"
+    chat_history.add_message(
+        ChatMessageContent(
+            role=AuthorRole.ASSISTANT,
+            items=[FunctionCallContent(id=call_id, name=name, arguments=f'{{"user_query": "{question}"}}')],
+        )
+    )
+    chat_history.add_message(
+        ChatMessageContent(role=AuthorRole.TOOL, items=[FunctionResultContent(id=call_id, name=name, result=result)])
+    )
+
+
+def test_exact_question_matches_after_normalization():
+    ledger = QuestionLedger(similarity_threshold=1.0)
+    ledger.add("How much is my specialist co-pay?", BENEFITS_FUNCTION, BENEFITS_RESULT)
+    assert ledger.answer(BENEFITS_FUNCTION, "how much is my specialist copay") == BENEFITS_RESULT
+    assert ledger.answer(BENEFITS_FUNCTION, "how much is my specialist visit copay") is None
+    assert ledger.tool_calls_saved == 1
+
+
+def test_similar_question_matches_at_the_threshold():
+    ledger = QuestionLedger(similarity_threshold=0.6)
+    ledger.add("what is the copay for a specialist visit", BENEFITS_FUNCTION, BENEFITS_RESULT)
+    assert ledger.answer(BENEFITS_FUNCTION, "copay for specialist visits") == BENEFITS_RESULT
+    assert ledger.answer(BENEFITS_FUNCTION, "is my dental cleaning covered") is None
+
+
+def test_benefits_entries_answer_general_questions_but_not_the_other_way_around():
+    ledger = QuestionLedger(similarity_threshold=1.0)
+    ledger.add("specialist copay", BENEFITS_FUNCTION, BENEFITS_RESULT)
+    ledger.add("nurse line number", KC_FUNCTION, KC_RESULT)
+    assert ledger.answer(KC_FUNCTION, "specialist copay") == BENEFITS_RESULT
+    assert ledger.answer(BENEFITS_FUNCTION, "nurse line number") is None
+    assert ledger.answer(KC_FUNCTION, "nurse line number") == KC_RESULT
+
+
+def test_general_answer_does_not_replace_a_benefits_answer():
+    ledger = QuestionLedger(similarity_threshold=1.0)
+    ledger.add("specialist copay", BENEFITS_FUNCTION, BENEFITS_RESULT)
+    ledger.add("specialist copay", KC_FUNCTION, KC_RESULT)
+    assert ledger.answer(BENEFITS_FUNCTION, "specialist copay") == BENEFITS_RESULT
+
+
+def test_results_with_a_missing_source_and_other_functions_are_not_recorded():
+    ledger = QuestionLedger()
+    ledger.add("specialist copay", BENEFITS_FUNCTION, "{'intent': 'Benefits', 'information': 'None found'}")
+    ledger.add("specialist copay", "get_member_plan", BENEFITS_RESULT)
+    ledger.add("specialist copay", KC_FUNCTION, None)
+    assert ledger.entries == {}
+    assert ledger.instructions() is None
+
+
+def test_ledger_is_rebuilt_from_the_tool_calls_in_the_history():
+    chat_history = ChatHistory()
+    chat_history.add_system_message("You are a silent observer.")
+    chat_history.add_user_message("How much is a specialist copay?")
+    add_tool_turn(chat_history, "call_1", BENEFITS_FUNCTION, "specialist copay", BENEFITS_RESULT)
+    add_tool_turn(chat_history, "call_2", KC_FUNCTION, "nurse line number", KC_RESULT)
+    # an unanswered call is not an entry
+    chat_history.add_message(
+        ChatMessageContent(
+            role=AuthorRole.ASSISTANT,
+            items=[
+                FunctionCallContent(
+                    id="call_3", name=f"KnowledgePlugin-{KC_FUNCTION}", arguments='{"user_query": "claim status"}'
+                )
+            ],
+        )
+    )
+
+    ledger = QuestionLedger.from_chat_history(chat_history, similarity_threshold=1.0)
+    assert {key: entry.function for key, entry in ledger.entries.items()} == {
+        "specialist copay": BENEFITS_FUNCTION,
+        "nurse line number": KC_FUNCTION,
+    }
+    assert ledger.entries["specialist copay"].intent == "Benefits"
+
+
+def test_instructions_quote_the_information_up_to_the_limit():
+    ledger = QuestionLedger(information_max_chars=20)
+    ledger.add("specialist copay", BENEFITS_FUNCTION, BENEFITS_RESULT)
+    ledger.add("nurse line number", KC_FUNCTION, "short")
+    instructions = ledger.instructions()
+    assert "- specialist copay (Intent: Benefits)" in instructions
+    assert f"Information: {BENEFITS_RESULT[:20]}... [truncated]" in instructions
+    assert "- nurse line number (Intent: unknown)\n  Information: short" in instructions
+
+
+def test_service_totals_the_tool_calls_saved_per_call():
+    service = QuestionLedgerService(similarity_threshold=1.0)
+    chat_history = ChatHistory()
+    add_tool_turn(chat_history, "call_1", BENEFITS_FUNCTION, "specialist copay", BENEFITS_RESULT)
+    for _ in range(2):
+        ledger = service.build(chat_history)
+        ledger.answer(BENEFITS_FUNCTION, "specialist copay")
+        service.record("agent", "call", ledger)
+    stats = service.stats()
+    assert stats["turns"] == 2 and stats["turns_with_ledger"] == 2
+    assert stats["tool_calls_saved"] == 2
+    assert stats["active_calls"] == 1 and stats["max_tool_calls_saved_per_call"] == 2
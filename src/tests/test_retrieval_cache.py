@@ -0,0 +1,204 @@
+import asyncio
+import numpy as np
+import pytest
+from services.retrieval_cache import MemoryRetrievalCacheBackend, RetrievalCache, _ScopeIndex
+
+
+def unit(*values: float) -> np.ndarray:
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class FakeEmbedder:
+    """Fixed embeddings per normalized question."""
+
+    def __init__(self, vectors: dict[str, np.ndarray]):
+        self.vectors = vectors
+        self.calls = []
+
+    async def aembed(self, text: str) -> np.ndarray:
+        self.calls.append(text)
+        return self.vectors[text]
+
+
+class Fetcher:
+    """A knowledge source that counts its calls and can be held open or made to fail."""
+
+    def __init__(self, value: str = "result", error: Exception = None):
+        self.value = value
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return f"{self.value} {self.calls}"
+
+
+VECTORS = {
+    "what is my copay": unit(1, 0, 0),
+    "how much is my copay": unit(0.95, 0.3, 0),
+    "what is my deductible": unit(0, 1, 0),
+}
+
+
+def cache(**kwargs) -> RetrievalCache:
+    return RetrievalCache(MemoryRetrievalCacheBackend(), **kwargs)
+
+
+def test_exact_hits_match_the_normalized_question_and_parameters():
+    retrieval_cache = cache()
+    fetch = Fetcher()
+
+    async def run():
+        return [
+            await retrieval_cache.aget_or_fetch("benefits", "What is my co-pay?", ("gold",), fetch),
+            await retrieval_cache.aget_or_fetch("benefits", "um, what is my copay", ("gold",), fetch),
+            await retrieval_cache.aget_or_fetch("benefits", "What is my co-pay?", ("silver",), fetch),
+            await retrieval_cache.aget_or_fetch("aisearch", "What is my co-pay?", ("gold",), fetch),
+        ]
+
+    assert asyncio.run(run()) == ["result 1", "result 1", "result 2", "result 3"]
+    stats = retrieval_cache.stats()["sources"]
+    assert stats["benefits"]["hits"] == 1 and stats["benefits"]["misses"] == 2
+    assert stats["benefits"]["hit_rate"] == pytest.approx(1 / 3)
+
+
+def test_failures_are_not_cached():
+    retrieval_cache = cache()
+    failing = Fetcher(error=RuntimeError("search unavailable"))
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await retrieval_cache.aget_or_fetch("aisearch", "what is my copay", (), failing)
+        return await retrieval_cache.aget_or_fetch("aisearch", "what is my copay", (), Fetcher())
+
+    assert asyncio.run(run()) == "result 1"
+
+
+def test_semantic_hits_reuse_the_closest_question_of_the_same_scope():
+    embedder = FakeEmbedder(VECTORS)
+    retrieval_cache = cache(embedder=embedder, similarity_threshold=0.9)
+    fetch = Fetcher()
+
+    async def run():
+        return [
+            await retrieval_cache.aget_or_fetch("aisearch", "What is my copay?", (), fetch),
+            # a paraphrase close enough to the first question
+            await retrieval_cache.aget_or_fetch("aisearch", "How much is my copay?", (), fetch),
+            # below the threshold
+            await retrieval_cache.aget_or_fetch("aisearch", "What is my deductible?", (), fetch),
+            # same question under other parameters: a different scope
+            await retrieval_cache.aget_or_fetch("aisearch", "How much is my copay?", ("gold",), fetch),
+        ]
+
+    assert asyncio.run(run()) == ["result 1", "result 1", "result 2", "result 3"]
+    stats = retrieval_cache.stats()
+    assert stats["sources"]["aisearch"]["semantic_hits"] == 1
+    assert stats["semantic_index_entries"] == 3
+
+
+def test_semantic_lookups_are_disabled_without_a_threshold():
+    embedder = FakeEmbedder(VECTORS)
+    retrieval_cache = cache(embedder=embedder)
+
+    async def run():
+        await retrieval_cache.aget_or_fetch("aisearch", "what is my copay", (), Fetcher())
+        return await retrieval_cache.aget_or_fetch("aisearch", "how much is my copay", (), Fetcher("other"))
+
+    assert asyncio.run(run()) == "other 1"
+    assert embedder.calls == []
+
+
+def test_evicted_questions_leave_their_scope_index():
+    retrieval_cache = cache(embedder=FakeEmbedder(VECTORS), similarity_threshold=0.9, max_entries=1)
+
+    async def run():
+        await retrieval_cache.aget_or_fetch("aisearch", "what is my copay", (), Fetcher())
+        await retrieval_cache.aget_or_fetch("benefits", "what is my deductible", (), Fetcher())
+        # the copay question was evicted; its paraphrase is fetched
+        return await retrieval_cache.aget_or_fetch("aisearch", "how much is my copay", (), Fetcher("fresh"))
+
+    assert asyncio.run(run()) == "fresh 1"
+    assert set(retrieval_cache.scopes) == {"aisearch"}
+    assert list(retrieval_cache.scopes["aisearch"].rows) == ["aisearch|how much is my copay"]
+
+
+def test_scope_index_reuses_removed_rows_and_grows():
+    scope_index = _ScopeIndex(3)
+    scope_index.add("copay", unit(1, 0, 0))
+    scope_index.add("deductible", unit(0, 1, 0))
+    assert scope_index.closest(unit(0.9, 0.1, 0), 0.9) == "copay"
+
+    scope_index.remove("copay")
+    assert len(scope_index) == 1
+    assert scope_index.closest(unit(0.9, 0.1, 0), 0.9) is None
+    scope_index.add("coinsurance", unit(0, 0, 1))
+    assert scope_index.rows["coinsurance"] == 0
+
+    for i in range(20):
+        scope_index.add(f"question {i}", unit(1, i + 1, 0))
+    assert len(scope_index) == 22 and len(scope_index.vectors) == 32
+    assert scope_index.closest(unit(0, 0, 1), 0.99) == "coinsurance"
+
+
+def test_concurrent_misses_share_one_fetch():
+    retrieval_cache = cache()
+    fetch = Fetcher()
+
+    async def run():
+        fetch.release.clear()
+        lookups = [
+            asyncio.create_task(retrieval_cache.aget_or_fetch("aisearch", query, (), fetch))
+            for query in ("What is my copay?", "what is my copay", "So, what is my copay")
+        ]
+        await asyncio.sleep(0)
+        fetch.release.set()
+        return await asyncio.gather(*lookups)
+
+    assert asyncio.run(run()) == ["result 1"] * 3
+    assert fetch.calls == 1
+    stats = retrieval_cache.stats()["sources"]["aisearch"]
+    assert stats["misses"] == 1 and stats["shared_fetches"] == 2 and stats["hit_rate"] == pytest.approx(2 / 3)
+    assert retrieval_cache._in_flight == {}
+
+
+def test_a_failed_shared_fetch_fails_every_waiter():
+    retrieval_cache = cache()
+    fetch = Fetcher(error=RuntimeError("search unavailable"))
+
+    async def run():
+        fetch.release.clear()
+        lookups = [
+            asyncio.create_task(retrieval_cache.aget_or_fetch("aisearch", "what is my copay", (), fetch)) for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+        fetch.release.set()
+        return await asyncio.gather(*lookups, return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert fetch.calls == 1
+
+
+def test_waiters_fetch_themselves_when_the_owner_is_cancelled():
+    retrieval_cache = cache()
+    fetch = Fetcher()
+
+    async def run():
+        fetch.release.clear()
+        owner = asyncio.create_task(retrieval_cache.aget_or_fetch("aisearch", "what is my copay", (), fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(retrieval_cache.aget_or_fetch("aisearch", "what is my copay", (), fetch))
+        await asyncio.sleep(0)
+        owner.cancel()
+        await asyncio.sleep(0)
+        fetch.release.set()
+        return await waiter, owner.cancelled()
+
+    assert asyncio.run(run()) == ("result 2", True)
+    assert fetch.calls == 2
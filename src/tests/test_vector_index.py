@@ -0,0 +1,229 @@
+import asyncio
+import hashlib
+import os
+import numpy as np
+import pytest
+from services import vector_index
+from services.vector_index import (
+    HashingEmbedder,
+    LocalVectorSearchService,
+    VectorIndex,
+    aadd_documents,
+    aindex_directory,
+    chunk_text,
+)
+
+
+class FakeEmbedder:
+    """Random unit vectors that depend only on the text; records each batch it is asked to embed."""
+
+    def __init__(self, dimensions: int = 8, name: str = "fake"):
+        self.dimensions = dimensions
+        self.name = f"{name}-{dimensions}"
+        self.batches = []
+
+    def vector(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    async def aembed(self, texts: list[str]) -> np.ndarray:
+        self.batches.append(list(texts))
+        return np.stack([self.vector(text) for text in texts])
+
+
+def documents(count: int, prefix: str = "doc") -> list[tuple[str, str]]:
+    return [(f"{prefix}-{i}.md", f"{prefix} chunk {i}") for i in range(count)]
+
+
+def add(path, docs, embedder, **kwargs) -> dict:
+    return asyncio.run(aadd_documents(str(path), docs, embedder, **kwargs))
+
+
+def publish(path):
+    # manifest timestamps are only as fine as the file system's clock; make each write visibly newer
+    manifest = VectorIndex.manifest_path(str(path))
+    stat = os.stat(manifest)
+    os.utime(manifest, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_chunk_text_packs_paragraphs_and_cuts_long_ones():
+    text = "alpha beta\n\ngamma\n\n" + "word " * 30
+    chunks = chunk_text(text, max_chars=20)
+    assert chunks[0] == "alpha beta\n\ngamma"
+    assert all(len(chunk) <= 20 for chunk in chunks)
+    assert " ".join(chunks[1:]).split() == ["word"] * 30
+
+
+def test_an_empty_index_returns_no_hits(tmp_path):
+    index = VectorIndex(str(tmp_path / "index"))
+    assert index.manifest is None and index.count == 0
+    assert index.search(np.ones((2, 8), dtype=np.float32)) == [[], []]
+
+
+def test_top_k_matches_brute_force_across_search_blocks(tmp_path, monkeypatch):
+    # several blocks, the last one shorter than k
+    monkeypatch.setattr(vector_index, "SEARCH_BLOCK_ROWS", 7)
+    embedder = FakeEmbedder()
+    docs = documents(52)
+    add(tmp_path, docs, embedder)
+    index = VectorIndex(str(tmp_path))
+
+    matrix = np.stack([embedder.vector(text) for _, text in docs])
+    queries = np.stack([embedder.vector(f"question {i}") for i in range(4)])
+    for k in (1, 5, 60):
+        results = index.search(queries, k=k)
+        for query, hits in zip(queries, results):
+            scores = matrix @ query
+            expected = np.argsort(-scores)[: min(k, len(docs))]
+            assert [row for row, _ in hits] == [int(row) for row in expected]
+            assert [score for _, score in hits] == pytest.approx([float(scores[row]) for row in expected], abs=1e-6)
+
+
+def test_lookup_returns_the_source_and_text_of_each_hit(tmp_path):
+    embedder = FakeEmbedder()
+    add(tmp_path, documents(5), embedder)
+    index = VectorIndex(str(tmp_path))
+    [hits] = index.lookup(embedder.vector("doc chunk 3"), k=2)
+    assert hits[0]["row"] == 3 and hits[0]["score"] == pytest.approx(1.0)
+    assert (hits[0]["source"], hits[0]["text"]) == ("doc-3.md", "doc chunk 3")
+
+    with pytest.raises(ValueError):
+        index.search(np.ones((1, 4), dtype=np.float32))
+
+
+def test_appended_rows_are_published_to_readers_by_the_manifest(tmp_path):
+    embedder = FakeEmbedder()
+    first = add(tmp_path, documents(3), embedder)
+    index = VectorIndex(str(tmp_path), refresh_interval_seconds=3600)
+
+    second = add(tmp_path, documents(2, prefix="new"), embedder)
+    publish(tmp_path)
+    assert second["generation"] == first["generation"] and second["count"] == 5
+    # not checked again before the refresh interval
+    assert index.count == 3 and index.search(embedder.vector("new chunk 1"), k=1)[0][0][0] != 4
+
+    assert index.refresh(force=True)
+    assert index.count == 5
+    [[hit]] = index.lookup(embedder.vector("new chunk 1"), k=1)
+    assert (hit["row"], hit["source"]) == (4, "new-1.md")
+
+
+def test_a_rebuild_swaps_in_a_new_generation(tmp_path):
+    embedder = FakeEmbedder()
+    first = add(tmp_path, documents(3), embedder)
+    index = VectorIndex(str(tmp_path), refresh_interval_seconds=0)
+
+    rebuilt = add(tmp_path, documents(2, prefix="fresh"), embedder, rebuild=True)
+    publish(tmp_path)
+    assert rebuilt["generation"] == first["generation"] + 1 and rebuilt["count"] == 2
+    assert not any(os.path.exists(f) for f in VectorIndex.generation_files(str(tmp_path), first["generation"]).values())
+    assert set(rebuilt["documents"]) == {"fresh-0.md", "fresh-1.md"}
+
+    [[hit]] = index.lookup(embedder.vector("fresh chunk 0"), k=1)
+    assert index.manifest["generation"] == rebuilt["generation"]
+    assert hit["source"] == "fresh-0.md"
+
+
+def test_adding_with_another_embedder_needs_a_rebuild(tmp_path):
+    add(tmp_path, documents(2), FakeEmbedder())
+    with pytest.raises(ValueError):
+        add(tmp_path, documents(1, prefix="new"), FakeEmbedder(name="other"))
+    manifest = add(tmp_path, documents(1, prefix="new"), FakeEmbedder(dimensions=4, name="other"), rebuild=True)
+    assert (manifest["embedder"], manifest["dimensions"], manifest["count"]) == ("other-4", 4, 1)
+
+
+def test_index_directory_appends_new_documents_and_rebuilds_on_changes(tmp_path):
+    library, path = tmp_path / "library", str(tmp_path / "index")
+    (library / "plans").mkdir(parents=True)
+    (library / "copay.md").write_text("copay text", encoding="utf-8")
+    (library / "plans" / "gold.txt").write_text("gold plan text", encoding="utf-8")
+    (library / "notes.pdf").write_text("not indexed", encoding="utf-8")
+    embedder = FakeEmbedder()
+
+    def index_directory():
+        return asyncio.run(aindex_directory(path, str(library), embedder))
+
+    first = index_directory()
+    assert set(first["documents"]) == {"copay.md", "plans/gold.txt"} and first["count"] == 2
+
+    # nothing new: no embedding, no write
+    assert index_directory() == first and len(embedder.batches) == 1
+
+    (library / "deductible.md").write_text("deductible text", encoding="utf-8")
+    appended = index_directory()
+    assert appended["generation"] == first["generation"] and appended["count"] == 3
+    assert embedder.batches[-1] == ["deductible text"]
+
+    (library / "copay.md").write_text("copay text, revised", encoding="utf-8")
+    rebuilt = index_directory()
+    assert rebuilt["generation"] == first["generation"] + 1 and rebuilt["count"] == 3
+    assert len(embedder.batches[-1]) == 3
+
+
+def test_search_service_batches_concurrent_questions(tmp_path):
+    embedder = HashingEmbedder(64)
+    library = [
+        ("copay.md", "The specialist copay is $30 per visit."),
+        ("deductible.md", "The annual deductible is $500."),
+    ]
+    add(tmp_path, library, embedder)
+    service = LocalVectorSearchService(VectorIndex(str(tmp_path)), embedder, top_k=1)
+    batches = []
+    embed = embedder.aembed
+
+    async def aembed(texts):
+        batches.append(list(texts))
+        return await embed(texts)
+
+    embedder.aembed = aembed
+
+    async def run():
+        return await asyncio.gather(
+            service.get_data("what is the specialist copay"),
+            service.get_data("what is my deductible"),
+            service.get_data("zebra"),
+        )
+
+    copay, deductible, nothing = asyncio.run(run())
+    assert copay.startswith("[1] copay.md: ")
+    assert deductible.startswith("[1] deductible.md: ")
+    assert nothing == "none found"
+    assert len(batches) == 1 and len(batches[0]) == 3
+    stats = service.stats()
+    assert (stats["rows"], stats["queries"], stats["batches"], stats["avg_batch_size"]) == (2, 3, 1, 3.0)
+
+
+def test_search_service_drops_abandoned_questions_and_fails_the_batch_on_errors(tmp_path):
+    embedder = FakeEmbedder()
+    add(tmp_path, documents(3), embedder)
+    service = LocalVectorSearchService(VectorIndex(str(tmp_path)), embedder, top_k=2)
+    embedder.batches.clear()
+
+    async def abandoned():
+        waiting = asyncio.create_task(service.get_data("doc chunk 0"))
+        answered = asyncio.create_task(service.get_data("doc chunk 1"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        return await answered
+
+    assert asyncio.run(abandoned()).startswith("[1] doc-1.md: doc chunk 1")
+    assert embedder.batches == [["doc chunk 1"]]
+
+    async def failing(texts):
+        raise RuntimeError("embedding unavailable")
+
+    embedder.aembed = failing
+
+    async def run():
+        return await asyncio.gather(
+            service.get_data("doc chunk 0"), service.get_data("doc chunk 2"), return_exceptions=True
+        )
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(run()))
+
+
+def test_search_service_rejects_an_index_built_with_another_embedder(tmp_path):
+    add(tmp_path, documents(1), FakeEmbedder())
+    with pytest.raises(ValueError):
+        LocalVectorSearchService(VectorIndex(str(tmp_path)), FakeEmbedder(name="other"))
@@ -0,0 +1,64 @@
+"""Build or update the local vector index searched by the ``AISEARCH_BACKEND=local`` knowledge-center backend.
+
+Every ``.md`` and ``.txt`` document under the documents folder is split into paragraph chunks, embedded
+and appended to the memory-mapped index. Run again after adding documents and only the new ones are
+embedded; when a document was changed or removed the index is rebuilt as a new generation. Running
+workers pick up either within a few seconds, without a restart. Embeddings come from
+``LOCAL_VECTOR_INDEX_EMBEDDING_DEPLOYMENT``, or from local hashed keyword features when it is blank.
+
+Run from the src folder:
+
+    python -m tools.build_vector_index
+    python -m tools.build_vector_index --documents ../kc_export --index vector_index --rebuild
+"""
+
+import argparse
+import asyncio
+import time
+from config import AppConfig
+from services.credential_manager import CredentialManager
+from services.vector_index import aindex_directory, build_embedder
+
+
+async def abuild(args, config: AppConfig):
+    async with CredentialManager() as credentials:
+        await abuild_index(args, config, credentials)
+
+
+async def abuild_index(args, config: AppConfig, credentials: CredentialManager):
+    embedder = build_embedder(
+        deployment=config.local_vector_index_embedding_deployment,
+        endpoint=config.ai_endpoint,
+        api_version=config.ai_api_version,
+        key=config.ai_api_key,
+        dimensions=config.local_vector_index_dimensions,
+        credentials=credentials,
+    )
+    start = time.perf_counter()
+    manifest = await aindex_directory(
+        args.index, args.documents, embedder, chunk_chars=args.chunk_chars, rebuild=args.rebuild
+    )
+    if manifest is None:
+        print(f"no documents under {args.documents}")
+        return
+    print(
+        f"{args.index}: generation {manifest['generation']}, {len(manifest['documents'])} documents, "
+        f"{manifest['count']} chunks of {manifest['dimensions']} dimensions ({manifest['embedder']}), "
+        f"{time.perf_counter() - start:.1f} s"
+    )
+
+
+def main():
+    config = AppConfig()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", default=config.local_vector_index_documents_path, help="folder of .md and .txt documents")
+    parser.add_argument("--index", default=config.local_vector_index_path, help="index folder; created if missing")
+    parser.add_argument("--chunk-chars", type=int, default=config.local_vector_index_chunk_chars)
+    parser.add_argument("--rebuild", action="store_true", help="re-embed every document into a new generation")
+    args = parser.parse_args()
+
+    asyncio.run(abuild(args, config))
+
+
+if __name__ == "__main__":
+    main()
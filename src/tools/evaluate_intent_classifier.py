@@ -0,0 +1,74 @@
+"""Evaluate the local keyword intent classifier against a labeled utterance file.
+
+The input is JSON lines with ``utterance`` and ``category`` fields (the category the LLM
+CategoryDetector returns, or a human label). Reports overall accuracy, how many utterances the
+fast path would answer at each confidence threshold and how accurate those answers are, and a
+per-category breakdown at the chosen threshold. No Azure services are called.
+
+Run from the src folder:
+
+    python -m tools.evaluate_intent_classifier tools/intent_labels.sample.jsonl --threshold 0.6
+"""
+
+import argparse
+import json
+import time
+from collections import Counter
+from services.keyword_intent_classifier import KeywordIntentClassifier
+
+
+def load_labels(path: str) -> list[tuple[str, str]]:
+    labels = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                labels.append((row["utterance"], row["category"].strip()))
+    return labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="evaluate the local intent classifier on labeled utterances")
+    parser.add_argument("labels", help="JSON lines file with utterance and category fields")
+    parser.add_argument("--threshold", type=float, default=0.6, help="fast path confidence threshold to report on")
+    parser.add_argument("--sweep", type=float, nargs="+", default=[0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9])
+    parser.add_argument("--show-errors", action="store_true", help="print confident predictions that disagree with the label")
+    args = parser.parse_args()
+
+    classifier = KeywordIntentClassifier.from_prompt_file()
+    labels = load_labels(args.labels)
+
+    started = time.perf_counter()
+    predictions = [(utterance, label, *classifier.classify(utterance)) for utterance, label in labels]
+    elapsed_us = (time.perf_counter() - started) / max(len(labels), 1) * 1e6
+
+    correct = sum(1 for _, label, predicted, _ in predictions if predicted == label)
+    print(f"{len(labels)} utterances, {elapsed_us:.0f} us per classification")
+    print(f"overall accuracy (no threshold): {correct / len(labels):.1%}\n")
+
+    print(f"{'threshold':>9} {'coverage':>9} {'accuracy':>9}")
+    for threshold in sorted(set(args.sweep + [args.threshold])):
+        confident = [(label, predicted) for _, label, predicted, confidence in predictions if confidence >= threshold]
+        accuracy = sum(1 for label, predicted in confident if label == predicted) / len(confident) if confident else 0.0
+        print(f"{threshold:>9.2f} {len(confident) / len(labels):>9.1%} {accuracy:>9.1%}")
+
+    print(f"\nper category at threshold {args.threshold}:")
+    print(f"{'category':<14} {'labeled':>8} {'fast path':>10} {'correct':>8}")
+    labeled, covered, right = Counter(), Counter(), Counter()
+    for _, label, predicted, confidence in predictions:
+        labeled[label] += 1
+        if confidence >= args.threshold:
+            covered[label] += 1
+            right[label] += predicted == label
+    for category in sorted(labeled):
+        print(f"{category:<14} {labeled[category]:>8} {covered[category]:>10} {right[category]:>8}")
+
+    if args.show_errors:
+        print("\nconfident disagreements:")
+        for utterance, label, predicted, confidence in predictions:
+            if confidence >= args.threshold and predicted != label:
+                print(f"  {confidence:.2f} {predicted} (labeled {label}): {utterance}")
+
+
+if __name__ == "__main__":
+    main()
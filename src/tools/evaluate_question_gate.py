@@ -0,0 +1,149 @@
+"""Measure the question gate against recorded call transcripts.
+
+Every customer utterance in the stored chat histories is paired with the completion recorded for
+it: a reply other than "No questions found" means the full run found a question. The gate is run
+over each utterance and the report shows how many turns it would skip and how many of those were
+false negatives (skipped, but the recorded completion found a question). Replies written by the gate
+itself are "No questions found" by construction, so evaluate transcripts recorded with the gate off
+or in shadow mode.
+
+Transcripts come from JSON lines of exported chat history documents, or straight from the configured
+Cosmos container with ``--cosmos``. The default ``heuristic`` mode makes no Azure calls; ``--mode llm``
+also sends the uncertain utterances to the QuestionDetector prompt.
+
+Run from the src folder:
+
+    python -m tools.evaluate_question_gate --cosmos --show-misses
+    python -m tools.evaluate_question_gate exported_histories.jsonl
+"""
+
+import argparse
+import asyncio
+import json
+from config import AppConfig
+from services.chat_history_codec import decode_messages
+from services.keyword_intent_classifier import KeywordIntentClassifier
+from services.question_gate import QuestionGate
+from services.utterance_service import is_no_questions_found
+
+
+def labeled_turns(messages: list[dict]) -> list[tuple[str, bool]]:
+    """(customer utterance, whether the recorded completion found a question) for each answered customer turn."""
+    turns = []
+    for i, msg in enumerate(messages):
+        if msg.get("role") != "user":
+            continue
+        # the completion is the first assistant text after the utterance; tool call messages carry no content
+        reply = next((m for m in messages[i + 1:] if m.get("role") in ("assistant", "user") and "content" in m), None)
+        if reply is not None and reply["role"] == "assistant":
+            turns.append((msg["content"], not is_no_questions_found(reply["content"])))
+    return turns
+
+
+def load_documents(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+async def aload_cosmos_documents(config: AppConfig) -> list[dict]:
+    # imported here so evaluating exported files does not need the Cosmos SDK configured
+    from services.chat_history_cosmos_service import ChatHistoryCosmosService
+
+    service = ChatHistoryCosmosService(
+        endpoint=config.db_endpoint,
+        db_name=config.db_name,
+        container_name=config.db_container,
+        key=config.db_key,
+        partition_key_path=config.db_partition_key_path,
+    )
+    try:
+        container = await service.aget_container()
+        return [document async for document in container.read_all_items()]
+    finally:
+        await service.aclose()
+
+
+def build_kernel(config: AppConfig, credentials):
+    from services.aisearch_service import AiSearchService
+    from services.benefits_search_service import BenefitsSearchService
+    from services.intent_service import IntentService
+    from services.kernel_service import KernelService
+
+    return KernelService(
+        deployment=config.ai_deployment,
+        endpoint=config.ai_endpoint,
+        api_version=config.ai_api_version,
+        key=config.ai_api_key,
+        aisearch_service=AiSearchService(),
+        benefits_search_service=BenefitsSearchService(),
+        intent_service=IntentService(),
+        credentials=credentials,
+    )
+
+
+async def aevaluate(args, config: AppConfig):
+    documents = []
+    for path in args.files:
+        documents.extend(load_documents(path))
+    if args.cosmos:
+        documents.extend(await aload_cosmos_documents(config))
+
+    turns = [turn for document in documents for turn in labeled_turns(decode_messages(document.get("chat", [])))]
+    if not turns:
+        print("No answered customer turns found")
+        return
+
+    credentials = None
+    kernel_service = None
+    if args.mode == "llm":
+        from services.credential_manager import CredentialManager
+
+        credentials = CredentialManager()
+        kernel_service = build_kernel(config, credentials)
+    gate = QuestionGate(
+        mode=args.mode,
+        kernel=kernel_service.kernel if kernel_service is not None else None,
+        classifier=KeywordIntentClassifier.from_prompt_file(),
+        min_words=args.min_words,
+    )
+    misses = []
+    skipped = 0
+    try:
+        for utterance, found_question in turns:
+            if not await gate.ahas_question(utterance):
+                skipped += 1
+                if found_question:
+                    misses.append(utterance)
+    finally:
+        if kernel_service is not None:
+            await kernel_service.aclose()
+            await credentials.close()
+
+    questions = sum(1 for _, found_question in turns if found_question)
+    print(f"{len(turns)} customer turns, {questions} with a question in the recorded completion")
+    print(f"gate ({args.mode}) would skip {skipped} turns ({skipped / len(turns):.1%}), {gate.llm_checks} LLM checks")
+    print(f"false negatives: {len(misses)} ({len(misses) / questions:.1%} of questions)" if questions else "false negatives: 0")
+    if args.show_misses:
+        for utterance in misses:
+            print(f"  missed: {utterance}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="measure question gate false negatives on recorded transcripts")
+    parser.add_argument("files", nargs="*", help="JSON or JSON lines files of exported chat history documents")
+    parser.add_argument("--cosmos", action="store_true", help="also read every document in the configured container")
+    parser.add_argument("--mode", default="heuristic", choices=["heuristic", "llm"])
+    parser.add_argument("--min-words", type=int, default=3)
+    parser.add_argument("--show-misses", action="store_true", help="print the utterances the gate would have wrongly skipped")
+    args = parser.parse_args()
+    if not args.files and not args.cosmos:
+        parser.error("give transcript files or --cosmos")
+
+    asyncio.run(aevaluate(args, AppConfig()))
+
+
+if __name__ == "__main__":
+    main()
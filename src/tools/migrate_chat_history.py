@@ -0,0 +1,117 @@
+"""Copy chat history documents into a container partitioned for call lookups.
+
+Reads every document from the source container page by page and upserts it into the target
+container (created with the configured partition key if it does not exist yet) with bounded
+parallelism. After each page is fully written the read-feed continuation token is saved to a
+checkpoint file, so a failed run picks up from the last completed page when started again.
+Upserts are idempotent, so replaying a partially written page is safe.
+
+Run from the src folder:
+
+    python -m tools.migrate_chat_history --source utterances --target chathistory --partition-key /callId
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from azure.cosmos import exceptions
+from config import AppConfig
+from services.chat_history_cosmos_service import ChatHistoryCosmosService, chat_history_document
+
+SYSTEM_PROPERTIES = ("_rid", "_self", "_etag", "_attachments", "_ts")
+
+
+def migrate_document(document: dict) -> dict:
+    migrated = {k: v for k, v in document.items() if k not in SYSTEM_PROPERTIES}
+    # documents written before the partition layout change only carry PartitionKey (the call agent) and id
+    call_agent = document.get("callAgent") or document.get("PartitionKey")
+    call_id = document.get("callId") or document["id"]
+    if document.get("type") in ("turn", "sequence"):
+        # turn items and the call's sequence counter keep their own id; they only need the partitioning fields
+        migrated.update({"PartitionKey": call_agent, "callAgent": call_agent, "callId": call_id})
+    else:
+        migrated.update(chat_history_document(call_agent, call_id, document.get("chat", [])))
+    return migrated
+
+
+def load_checkpoint(path: str) -> dict:
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"continuation_token": None, "migrated": 0, "done": False}
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    # write-then-rename so a crash never leaves a truncated checkpoint behind
+    with open(path + ".tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+
+async def amigrate(args, config: AppConfig):
+    target_service = ChatHistoryCosmosService(
+        endpoint=config.db_endpoint,
+        db_name=config.db_name,
+        container_name=args.target,
+        key=config.db_key,
+        partition_key_path=args.partition_key,
+        throughput_mode=args.throughput_mode,
+        max_throughput=args.max_throughput,
+    )
+    try:
+        target = await target_service.aget_container()
+        source = target_service.cosmos_client.get_database_client(config.db_name).get_container_client(args.source)
+
+        checkpoint = load_checkpoint(args.checkpoint)
+        if checkpoint["done"]:
+            print(f"Checkpoint {args.checkpoint} says the migration already finished; delete it to run again")
+            return
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def acopy(document: dict):
+            async with semaphore:
+                await target.upsert_item(body=migrate_document(document))
+
+        start = time.perf_counter()
+        pages = source.read_all_items(max_item_count=args.page_size).by_page(checkpoint["continuation_token"])
+        async for page in pages:
+            documents = [document async for document in page]
+            await asyncio.gather(*(acopy(document) for document in documents))
+
+            checkpoint["continuation_token"] = pages.continuation_token
+            checkpoint["migrated"] += len(documents)
+            save_checkpoint(args.checkpoint, checkpoint)
+            elapsed = time.perf_counter() - start
+            print(f"migrated {checkpoint['migrated']} documents ({checkpoint['migrated'] / elapsed:.0f}/s this run)")
+
+        checkpoint["done"] = True
+        save_checkpoint(args.checkpoint, checkpoint)
+        print(f"Migration complete: {checkpoint['migrated']} documents copied from {args.source} to {args.target}")
+    except exceptions.CosmosHttpResponseError as e:
+        print(f"Migration stopped: {e.message}. Run the same command again to resume from {args.checkpoint}")
+        raise
+    finally:
+        await target_service.aclose()
+
+
+def main():
+    config = AppConfig()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", default=config.db_container, help="container to copy from")
+    parser.add_argument("--target", required=True, help="container to copy into; created if missing")
+    parser.add_argument("--partition-key", default=config.db_partition_key_path, help="e.g. /callId or /callAgent,/callId")
+    parser.add_argument("--throughput-mode", default=config.db_throughput_mode, choices=["serverless", "autoscale", "manual"])
+    parser.add_argument("--max-throughput", type=int, default=config.db_max_throughput)
+    parser.add_argument("--concurrency", type=int, default=32, help="parallel upserts")
+    parser.add_argument("--page-size", type=int, default=200, help="documents read per page")
+    parser.add_argument("--checkpoint", default="migrate_chat_history.checkpoint.json")
+    args = parser.parse_args()
+
+    asyncio.run(amigrate(args, config))
+
+
+if __name__ == "__main__":
+    main()